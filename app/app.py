@@ -1,38 +1,57 @@
+import atexit
+from concurrent.futures import ProcessPoolExecutor
 from json.decoder import JSONDecodeError
+from threading import Lock
+from typing import Optional
 
 from flask import Flask, render_template, request
 
-from constructor.main import MetaClass
-from constructor.utils import cleanup
+from constructor.main import LANGUAGES, MetaClass
 
 app = Flask(__name__)
 
+# Shared by every request, so the languages are generated in parallel without starting processes each time
+executor: Optional[ProcessPoolExecutor] = None
+executor_lock = Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Return the shared process pool, started by the first request rather than on import and shut down when the app exits
+    """
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(len(LANGUAGES))
+            atexit.register(executor.shutdown)
+        return executor
+
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    try:
-        classname = request.form.get('classname') or ''
-        jsondata = request.form.get('jsondata') or ''
-        skip_fields_with_errors = bool(request.form.get('skipFieldsWithErrors'))
-        print(request.form)
-        metaclass = None
-        errors = {}
-        if classname and jsondata:
-            try:
-                metaclass = MetaClass.from_json(classname, jsondata, skip_fields_with_errors)
-            except JSONDecodeError as e:
-                errors['JSONDecodeError'] = e
-            except NotImplementedError as e:
-                errors['NotImplementedError'] = e
-        rendered = render_template('index.html',
-                                   classname=classname,
-                                   jsondata=jsondata,
-                                   metaclass=metaclass,
-                                   errors=errors,
-                                   skip_fields_with_errors=skip_fields_with_errors)
-        return rendered
-    finally:
-        cleanup()
+    classname = request.form.get('classname') or ''
+    jsondata = request.form.get('jsondata') or ''
+    skip_fields_with_errors = bool(request.form.get('skipFieldsWithErrors'))
+    print(request.form)
+    metaclass = None
+    code = {}
+    errors = {}
+    if classname and jsondata:
+        try:
+            metaclass = MetaClass.from_json(classname, jsondata, skip_fields_with_errors)
+            code = metaclass.generate_all(executor=get_executor())
+        except JSONDecodeError as e:
+            errors['JSONDecodeError'] = e
+        except NotImplementedError as e:
+            errors['NotImplementedError'] = e
+    rendered = render_template('index.html',
+                               classname=classname,
+                               jsondata=jsondata,
+                               metaclass=metaclass,
+                               code=code,
+                               errors=errors,
+                               skip_fields_with_errors=skip_fields_with_errors)
+    return rendered
 
 
 if __name__ == '__main__':
@@ -0,0 +1,230 @@
+"""
+Rough benchmarks for the code generator, run with:
+  python -m constructor.benchmarks
+"""
+import json
+import os
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from types import ModuleType
+from typing import Dict, List, Optional
+
+from constructor.context import GenerationContext
+from constructor.main import LANGUAGES, MetaClass
+from constructor.schema import split_json_array
+
+LITERAL_LANGUAGES = ('python', 'java', 'c')
+
+
+def array_literal_seconds(value: List, repeat: int = 3) -> Dict[str, float]:
+    """
+    Return the best time taken to render an example literal of the given array for each language
+    """
+    t = MetaClass.from_dict("Benchmark", {"values": value}).fields["values"]
+    return {language: min(timeit.repeat(lambda: getattr(t, f"to_{language}_literal")(value), number=1, repeat=repeat))
+            for language in LITERAL_LANGUAGES}
+
+
+def benchmark_array_literals():
+    print("Array literals (ns per element)")
+    print("elements".rjust(10), *(language.rjust(8) for language in LITERAL_LANGUAGES))
+    for length in (125_000, 250_000, 500_000, 1_000_000):
+        for label, value in ((f"{length}", list(range(length))),
+                             (f"{length // 1000}x1000", [list(range(1000)) for _ in range(length // 1000)])):
+            seconds = array_literal_seconds(value)
+            print(label.rjust(10), *(f"{seconds[language] / length * 1e9:8.1f}" for language in LITERAL_LANGUAGES))
+
+
+def example_rendering_seconds(length: int, depth: int = 4) -> float:
+    """
+    Return the best time taken to render the example literals of an array of nested objects in every language
+    """
+    record = {"name": "leaf", "score": 1.5}
+    for level in range(depth):
+        record = {"name": f"level{level}", "count": level, "child": record}
+    meta_class = MetaClass.from_dict("Benchmark", {"records": [record] * length})
+    data = meta_class.get_example_data()
+    return min(timeit.repeat(lambda: [getattr(meta_class, f"generate_{language}_object")(data)
+                                      for language in LITERAL_LANGUAGES], number=1, repeat=3))
+
+
+def benchmark_example_rendering():
+    print("Example literals of nested objects (us per record)")
+    for length in (1000, 2000, 4000, 8000):
+        print(f"{length:10d}", f"{example_rendering_seconds(length) / length * 1e6:8.1f}")
+
+
+def inference_peak_bytes(data: str, single_pass: bool) -> int:
+    """
+    Return the peak memory taken to infer a class from the JSON, in a single pass or from the decoded data
+    """
+    tracemalloc.start()
+    try:
+        MetaClass.from_json("Benchmark", data, single_pass=single_pass)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_single_pass_inference():
+    print("Peak memory of inference (bytes per record)")
+    print("records".rjust(10), "two pass".rjust(10), "one pass".rjust(10))
+    for records in (5000, 10000, 20000):
+        data = json.dumps([{"id": i, "name": f"user{i}", "tags": ["a", "b"], "score": i / 3,
+                            "address": {"city": "Metro City", "zip": 12345}} for i in range(records)])
+        print(f"{records:10d}", *(f"{inference_peak_bytes(data, single_pass) / records:10.0f}"
+                                  for single_pass in (False, True)))
+
+
+def retained_bytes(data: str, retain_values: str) -> int:
+    """
+    Return the memory held by a class inferred from the JSON with the given values retained
+    """
+    tracemalloc.start()
+    try:
+        # Kept in a variable so the class is still held when the memory is measured
+        meta_class = MetaClass.from_json("Benchmark", data, retain_values=retain_values)
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_retained_values():
+    settings = ('all', 'sample(5)', 'none')
+    print("Memory held by inferred classes (bytes)")
+    print("records".rjust(10), *(setting.rjust(10) for setting in settings))
+    for records in (1000, 4000, 16000):
+        data = json.dumps([{"id": i, "name": f"user{i}", "tags": ["a", "b"], "score": i / 3,
+                            "address": {"city": "Metro City", "zip": 12345}} for i in range(records)])
+        print(f"{records:10d}", *(f"{retained_bytes(data, setting):10d}" for setting in settings))
+
+
+def parallel_inference_seconds(data: str, workers: int, chunk_size: int = 10000) -> float:
+    """
+    Return the time taken to infer a class from a JSON array in a pool of the given number of processes
+    """
+    with ProcessPoolExecutor(workers) as executor:
+        # Start the workers before timing
+        list(executor.map(int, range(workers)))
+        start = time.perf_counter()
+        MetaClass.from_json_parallel("Benchmark", data, executor=executor, chunk_size=chunk_size)
+        return time.perf_counter() - start
+
+
+def benchmark_parallel_inference(records: int = 400_000):
+    data = json.dumps([{"id": i, "name": f"user{i}", "score": i / 3, "tags": ["a"] * (i % 4 + 1),
+                        "address": {"city": "Metro City", "zip": i % 100000}} for i in range(records)])
+    start = time.perf_counter()
+    chunks = sum(1 for _ in split_json_array(data, 10000))
+    split_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    json.loads(data)
+    print(f"Splitting {records} records into {chunks} chunks takes {split_seconds:.3f}s in the parent, "
+          f"decoding them all {time.perf_counter() - start:.3f}s")
+    print(f"Parallel inference of {records} records (records per second)")
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        print(f"{workers:3d} workers", f"{records / parallel_inference_seconds(data, workers):12.0f}")
+        workers *= 2
+
+
+def generate_all_seconds(meta_class: MetaClass, executor: Optional[Executor] = None) -> float:
+    """
+    Return the time taken to generate code for every language, in the executor or one after another without one
+    """
+    start = time.perf_counter()
+    if executor is None:
+        for language in LANGUAGES:
+            getattr(meta_class, f"generate_{language}")()
+    else:
+        meta_class.generate_all(executor=executor)
+    return time.perf_counter() - start
+
+
+def benchmark_generate_all(records: int = 20_000):
+    meta_class = MetaClass.from_dict("Benchmark", {"users": [
+        {"id": i, "name": f"user{i}", "score": i / 3, "tags": ["a"] * (i % 4 + 1),
+         "address": {"city": "Metro City", "zip": i % 100000}} for i in range(records)]})
+    print(f"Generating every language for {records} records (seconds, {os.cpu_count()} cores)")
+    for language in LANGUAGES:
+        start = time.perf_counter()
+        getattr(meta_class, f"generate_{language}")()
+        print(f"{language:>10}", f"{time.perf_counter() - start:8.3f}")
+    print(f"{'serial':>10}", f"{generate_all_seconds(meta_class):8.3f}")
+    for label, executor_class in (("threads", ThreadPoolExecutor), ("processes", ProcessPoolExecutor)):
+        with executor_class(len(LANGUAGES)) as executor:
+            # Start the workers before timing, as a long-lived pool would have
+            list(executor.map(int, range(len(LANGUAGES))))
+            print(f"{label:>10}", f"{generate_all_seconds(meta_class, executor):8.3f}")
+
+
+def python_instance_bytes(records: List[dict], slots: bool) -> float:
+    """
+    Return the memory taken by each instance of the Python class generated for the given records, with or without
+    __slots__, including the instances of its nested classes and its lists but not the values shared with the records
+    """
+    meta_class = MetaClass.from_dict("Benchmark", records[0])
+    module = ModuleType("benchmark")
+    exec(meta_class.generate_python(GenerationContext(python_slots=slots)), module.__dict__)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [module.Benchmark.from_dict(record) for record in records]
+        return (tracemalloc.get_traced_memory()[0] - before) / len(instances)
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_python_slots(records: int = 200_000):
+    data = [{"id": i, "name": f"user{i}", "score": i / 3, "active": i % 2 == 0, "tags": ["a"] * (i % 4 + 1),
+             "address": {"city": "Metro City", "zip": i % 100000}} for i in range(records)]
+    print(f"Python instances of {records} records (bytes per record)")
+    for slots in (False, True):
+        print(("__slots__" if slots else "__dict__").ljust(9), f"{python_instance_bytes(data, slots):8.0f}")
+
+
+def benchmark_python_columns(records: int = 1_000_000):
+    data = [{"id": i, "score": i / 3, "name": f"user{i}"} for i in range(records)]
+    # Columns are sized for every value, so the types are inferred from every record
+    meta_class = MetaClass.from_jsonl("Benchmark", map(json.dumps, data), retain_values='none')
+    module = ModuleType("benchmark")
+    exec(meta_class.generate_python(GenerationContext(python_columns=True)), module.__dict__)
+    instances = [module.Benchmark.from_dict(record) for record in data]
+    columns = module.BenchmarkColumns.from_records(data)
+    print(f"Summing a field of {records} records (ns per record)")
+    for label, scan in (("instances", lambda: sum(instance.score for instance in instances)),
+                        ("columns", lambda: sum(columns.score))):
+        print(label.ljust(9), f"{min(timeit.repeat(scan, number=1, repeat=3)) / records * 1e9:8.1f}")
+
+
+def benchmark_python_lazy(records: int = 20_000):
+    data = [{"id": i, "name": f"user{i}", "friends": [{"id": j, "tags": ["a", "b"], "address": {"zip": j}}
+                                                      for j in range(20)],
+             "owner": {"id": i, "groups": [{"name": "admins", "members": list(range(10))}]}} for i in range(records)]
+    meta_class = MetaClass.from_dict("Benchmark", data[0])
+    print(f"Reading two top-level fields of {records} records (us per record)")
+    for lazy in (False, True):
+        module = ModuleType("benchmark")
+        exec(meta_class.generate_python(GenerationContext(python_lazy=lazy)), module.__dict__)
+
+        def read():
+            for record in data:
+                instance = module.Benchmark.from_dict(record)
+                instance.id_field, instance.name
+
+        seconds = min(timeit.repeat(read, number=1, repeat=3))
+        print(("lazy" if lazy else "eager").ljust(9), f"{seconds / records * 1e6:8.2f}")
+
+
+if __name__ == '__main__':
+    benchmark_example_rendering()
+    benchmark_array_literals()
+    benchmark_single_pass_inference()
+    benchmark_retained_values()
+    benchmark_parallel_inference()
+    benchmark_generate_all()
+    benchmark_python_slots()
+    benchmark_python_columns()
+    benchmark_python_lazy()
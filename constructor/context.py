@@ -0,0 +1,73 @@
+import copy
+from random import Random
+from typing import Dict, Optional, Set
+
+from constructor.retention import RetainValues
+
+
+class GenerationContext:
+    """
+    Holds the state of a single inference/generation run so that several runs can happen at once
+    """
+
+    def __init__(self, retain_values: Optional[RetainValues] = None, enum_limit: int = 0,
+                 compact_numbers: bool = False, minimize_padding: bool = False, inline_arrays: bool = False,
+                 c_arena: bool = False, c_parser: bool = False, go_json: bool = False,
+                 java_json: bool = False, python_slots: bool = False,
+                 python_columns: bool = False, python_lazy: bool = False, python_main: bool = True):
+        self.unique_classnames: Set[str] = set()
+        self.class_signatures_to_name: Dict[str, str] = {}
+        self.printed_signatures: Dict[str, Set[str]] = {}
+
+        # Sampling is seeded so the same input always gives the same examples, and every value is kept by default
+        self.retain_values = retain_values if retain_values is not None else RetainValues(None)
+        self.random = Random(0)
+
+        # String fields with at most this many distinct values are generated as enums, 0 to never generate enums
+        if enum_limit < 0:
+            raise ValueError(f"enum_limit must not be negative ({enum_limit})")
+        self.enum_limit = enum_limit
+
+        # Integers are generated as the narrowest types holding the values seen, such as uint8_t in C, instead of int
+        self.compact_numbers = compact_numbers
+
+        # The fields of C and Go structs are ordered by alignment to minimize padding, instead of their JSON order
+        self.minimize_padding = minimize_padding
+
+        # Strings and arrays are stored inside C structs in buffers sized for nearly all of the values seen, so that
+        # every struct is a single allocation, instead of pointing to memory owned by the caller
+        self.inline_arrays = inline_arrays
+
+        # C code includes an arena allocator which structs can be built in and freed with all at once
+        self.c_arena = c_arena
+
+        # C code includes a JSON parser for each struct, which reads strings as views of its input and arrays inline
+        self.c_parser = c_parser
+
+        # Go structs get MarshalJSON and UnmarshalJSON methods which do not use reflection, and the imports they need
+        self.go_json = go_json
+
+        # Java classes get fromJson and toJson methods sharing a small tokenizer, and main times them on the example
+        self.java_json = java_json
+
+        # Python classes declare __slots__, so that instances have no __dict__ and take a fraction of the memory
+        self.python_slots = python_slots
+
+        # Every Python class gets a Columns class holding many records as a list or array.array per field
+        self.python_columns = python_columns
+
+        # Python from_dict keeps the raw dict, and nested objects and lists are built from it when first read
+        self.python_lazy = python_lazy
+
+        # Python code ends with a main function printing an example, left out when the classes are only imported
+        self.python_main = python_main
+
+    def fork(self) -> 'GenerationContext':
+        """
+        Return a context with the same settings, sharing the class names of this one, but tracking printed classes
+        and sampling separately, so that its settings can be changed without changing this one
+        """
+        forked = copy.copy(self)
+        forked.printed_signatures = {}
+        forked.random = Random(0)
+        return forked
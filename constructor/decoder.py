@@ -0,0 +1,124 @@
+import json
+from json.decoder import JSONObject, JSONDecodeError, WHITESPACE, WHITESPACE_STR
+from json.scanner import py_make_scanner
+from typing import List, Tuple, Union
+
+from constructor import field_types
+from constructor.context import GenerationContext
+from constructor.utils import primitive_to_type
+
+
+class InferenceError:
+    """
+    Stands in for a value whose type could not be inferred, so the error can be raised or skipped at the top level
+    """
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class InferringDecoder(json.JSONDecoder):
+    """
+    A JSON decoder which infers types while decoding. Objects and arrays are turned into Object and Array types as
+    soon as they are decoded, so the decoded data is never held in memory all at once. Only the values retained by
+    the context are kept as examples.
+
+    The pure Python scanner is used since the C scanner does not support custom array parsing.
+    """
+
+    def __init__(self, context: GenerationContext, skip_fields_with_errors=False):
+        super().__init__(object_pairs_hook=self.infer_object)
+        self.context = context
+        self.skip_fields_with_errors = skip_fields_with_errors
+        self.depth = 0
+        self.parse_object = self.parse_object_with_depth
+        self.parse_array = self.infer_array
+        self.scan_once = py_make_scanner(self)
+
+    @staticmethod
+    def to_type(value, field_name: str, context: GenerationContext) -> field_types.Type:
+        if isinstance(value, InferenceError):
+            raise value.error
+        if isinstance(value, field_types.Type):
+            value.rename(field_name)
+            return value
+        return primitive_to_type(value, field_name=field_name, context=context)
+
+    def parse_object_with_depth(self, *args, **kwargs):
+        self.depth += 1
+        try:
+            return JSONObject(*args, **kwargs)
+        finally:
+            self.depth -= 1
+
+    def infer_object(self, pairs: List[Tuple[str, object]]) -> Union[field_types.Object, InferenceError]:
+        from constructor.main import MetaClass
+
+        fields = {}
+        for position, (key, value) in enumerate(pairs):
+            try:
+                fields[key] = self.to_type(value, key, self.context)
+                fields[key].position = position
+            except Exception as e:
+                # Errors in nested objects surface in the top-level field containing them, like with from_dict
+                if self.depth > 1:
+                    return InferenceError(e)
+                if not self.skip_fields_with_errors:
+                    raise
+                # TODO: Warnings instead
+        # Classes are named by their containing field and given unique names once the whole payload is inferred
+        object_class = MetaClass('', fields, context=self.context)
+        value = {key: t.value for key, t in fields.items()} if self.context.retain_values.keeps_any else None
+        return field_types.Object(value=value, original_name='', object_class=object_class)
+
+    def infer_array(self, s_and_end: Tuple[str, int], scan_once,
+                    _w=WHITESPACE.match, _ws=WHITESPACE_STR) -> Tuple[Union[field_types.Array, InferenceError], int]:
+        # Based on json.decoder.JSONArray, but merging each item into the item type instead of appending it
+        self.depth += 1
+        try:
+            s, end = s_and_end
+            item_type = None
+            reservoir = self.context.retain_values.reservoir(self.context.random)
+            error = None
+            nextchar = s[end:end + 1]
+            if nextchar in _ws:
+                end = _w(s, end + 1).end()
+                nextchar = s[end:end + 1]
+            while nextchar != ']':
+                try:
+                    value, end = scan_once(s, end)
+                except StopIteration as err:
+                    raise JSONDecodeError("Expecting value", s, err.value) from None
+                if error is None:
+                    try:
+                        t = self.to_type(value, '', self.context)
+                        reservoir.add(t.value)
+                        item_type = t if item_type is None else item_type.merge(t)
+                    except Exception as e:
+                        error = e
+                nextchar = s[end:end + 1]
+                if nextchar in _ws:
+                    end = _w(s, end + 1).end()
+                    nextchar = s[end:end + 1]
+                if nextchar == ']':
+                    break
+                elif nextchar != ',':
+                    raise JSONDecodeError("Expecting ',' delimiter", s, end)
+                end = _w(s, end + 1).end()
+                nextchar = s[end:end + 1]
+                if nextchar == ']':
+                    raise JSONDecodeError("Expecting value", s, end)
+            end += 1
+
+            if error is not None:
+                return InferenceError(error), end
+            if item_type is None:
+                if self.depth == 1:
+                    raise NotImplementedError("Top-level array cannot be an empty list")
+                return InferenceError(NotImplementedError("Empty lists are not supported.")), end
+            value = reservoir.items if self.context.retain_values.keeps_any else None
+            array = field_types.Array(value=value, original_name='', item_type=item_type, length=reservoir.seen)
+            array.statistics.add_length(reservoir.seen)
+            return array, end
+        finally:
+            self.depth -= 1
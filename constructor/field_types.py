@@ -25,22 +25,109 @@ For reference, here are the builtin Python types left that we may want to cover:
 """
 
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, List, Tuple, Dict, Set
+from io import StringIO
+from typing import TYPE_CHECKING, List, Tuple, Dict, Set, TextIO, Union, Iterable, Optional
+
+from constructor.statistics import Statistics, utf8_length
 
 if TYPE_CHECKING:
-    from constructor.main import MetaClass # pragma: no cover
+    from constructor.main import MetaClass  # pragma: no cover
+
+# The sizes of primitive types on 64-bit Linux and macOS, each of which is aligned to its size
+C_SIZES = {'bool': 1, 'int': 4, 'long': 8, 'long long': 8, 'double': 8, 'long double': 16, 'int8_t': 1,
+           'uint8_t': 1, 'int16_t': 2, 'uint16_t': 2, 'int32_t': 4, 'uint32_t': 4, 'int64_t': 8, 'uint64_t': 8}
+GO_SIZES = {'bool': 1, 'int': 8, 'int8': 1, 'uint8': 1, 'int16': 2, 'uint16': 2, 'int32': 4, 'uint32': 4,
+            'int64': 8, 'uint64': 8, 'float64': 8}
+POINTER_SIZE = 8
+
+
+def c_check(call: str) -> List[str]:
+    """
+    C statements returning -1 from the enclosing function unless the call returns 0
+    """
+    return [f"if ({call} != 0) {{", "    return -1;", "}"]
+
+
+def go_check(statement: str, failure: str = "return err") -> List[str]:
+    """
+    Go statements running the given simple statement, which sets err, and returning err from the enclosing function
+    unless it is nil, or running the given failure statement instead
+    """
+    return [f"if {statement}; err != nil {{", f"    {failure}", "}"]
 
 
 class Type(ABC):
+    # Stands in for the value in examples when no value was retained
+    default_value = None
+
+    # Which statistics are collected about the values of the type
+    collects_lengths = False
+    collects_distinct = True
+
+    # The percentile of lengths that buffers are sized for, so that a few outliers do not make every buffer huge
+    CAPACITY_PERCENTILE = 99.9
+
+    # The typecode of the array.array holding a column of values of the type, or None to hold them in a list
+    python_typecode: Optional[str] = None
+
+    # Whether from_dict builds objects or lists for values of the type, which lazy classes put off until they are read
+    python_lazy = False
+
     def __init__(self, value, original_name: str):
         self.value = value
         self.original_name = original_name
 
+        # How many samples of the field this type was inferred from
+        self.count = 1
+
+        # The earliest position of the field within the objects it was seen in, to keep fields in a stable order
+        self.position = 0
+
+        self.statistics = Statistics(lengths=self.collects_lengths, distinct=self.collects_distinct)
+
+    def rename(self, original_name: str):
+        self.original_name = original_name
+
+    @property
+    @abstractmethod
+    def schema_name(self) -> str:
+        pass  # pragma: no cover
+
+    def to_schema(self) -> dict:
+        """
+        Return what is known about this type without any of its values, as plain data which can be pickled, sent to
+        another process, and turned back into a type with constructor.schema.schema_to_type
+        """
+        return {"type": self.schema_name, "count": self.count, "statistics": self.statistics.to_schema()}
+
+    def merge(self, other: 'Type') -> 'Type':
+        """
+        Combine what is known from another sample of the same field into this type and return the result
+        """
+        if type(self) is not type(other):
+            raise NotImplementedError(f"Cannot merge different types ({self.to_java} vs {other.to_java})")
+        self.count += other.count
+        self.position = min(self.position, other.position)
+        self.statistics.merge(other.statistics)
+        return self
+
     def to_python_to_dict_pair(self, name) -> Tuple[str, str]:
         return self.original_name, f"self.{name}"
 
-    def to_python_from_dict_value(self) -> str:
-        return f"d[{self.original_name!r}]"
+    def to_python_from_dict_value(self, source: Optional[str] = None) -> str:
+        """
+        The Python expression building a value of this type from the given expression of its JSON value, by default
+        the field of the dict d
+        """
+        return source if source is not None else f"d[{self.original_name!r}]"
+
+    def python_signature(self, columns=False) -> list:
+        """
+        Return everything the generated Python code for a field of this type depends on besides its values, as plain
+        data which is the same in every process, see MetaClass.get_python_signature. The typecode only matters to
+        columns, and would otherwise tell apart schemas whose integers merely grew.
+        """
+        return [self.schema_name, self.to_python, self.python_typecode if columns else None, self.python_lazy]
 
     @property
     def c_includes(self) -> Set[str]:
@@ -50,6 +137,22 @@ class Type(ABC):
     def c_is_variable_length_array(self) -> bool:
         return False
 
+    @property
+    def c_layout(self) -> Tuple[int, int]:
+        """
+        The size and alignment in bytes of this type as a field of a C struct
+        """
+        if self.c_is_variable_length_array:
+            return POINTER_SIZE, POINTER_SIZE
+        return C_SIZES[self.to_c], C_SIZES[self.to_c]
+
+    @property
+    def go_layout(self) -> Tuple[int, int]:
+        """
+        The size and alignment in bytes of this type as a field of a Go struct
+        """
+        return GO_SIZES[self.to_go], GO_SIZES[self.to_go]
+
     @property
     def python_imports(self) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]], Dict[str, Set[str]]]:
         """
@@ -65,26 +168,114 @@ class Type(ABC):
     def embedded_objects(self) -> List['Object']:
         return []
 
+    @property
+    def embedded_enums(self) -> List['Enum']:
+        return []
+
+    def to_enums(self, class_name: str) -> 'Type':
+        """
+        Return this type with any strings of few enough distinct values turned into enums named after the class
+        """
+        return self
+
+    def use_compact_types(self):
+        """
+        Generate the narrowest types holding every value seen rather than the usual ones, for integers
+        """
+
+    def use_inline_storage(self):
+        """
+        Store the characters of strings and the items of arrays inside C structs rather than behind pointers, in
+        buffers of a fixed capacity
+        """
+
+    def use_c_parser(self, prefix: str):
+        """
+        Represent values the way the generated C JSON parser reads them, strings as views of the input and arrays
+        inline, using the helpers named with the given prefix
+        """
+
+    def name_c_items(self, name: str):
+        """
+        Name the C structs holding the items of arrays of arrays after the given name
+        """
+
+    def c_item_struct_lines(self) -> List[str]:
+        """
+        The C structs holding the items of arrays of arrays, innermost first, see name_c_items
+        """
+        return []
+
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        """
+        The statements of a generated C JSON parser reading a value of this type into target, which return -1 from
+        the enclosing function if the input is not valid, and set parser->truncated if target cannot hold all of it
+        """
+        return c_check(f"{prefix}_json_skip_value(parser)")
+
+    def c_declarations(self, name: str) -> List[str]:
+        """
+        The members of a C struct declared for a field of this type
+        """
+        return [f"{self.to_c} {'* ' if self.c_is_variable_length_array else ''}{name};"]
+
+    def c_parameters(self, name: str) -> List[str]:
+        """
+        The parameters of a C constructor taking a field of this type
+        """
+        return [f"{self.to_c} {name}{'[]' if self.c_is_variable_length_array else ''}"]
+
+    def c_assignments(self, name: str) -> List[str]:
+        """
+        The statements of a C constructor storing a field of this type in the struct p
+        """
+        return [f"p->{name} = {name};"]
+
     @property
     @abstractmethod
     def to_python(self) -> str:
         pass  # pragma: no cover
 
+    def or_default(self, value):
+        """
+        Return the given value, or the default value of this type if no value was retained
+        """
+        return self.default_value if value is None else value
+
     @property
-    @abstractmethod
     def to_python_value(self) -> str:
-        pass  # pragma: no cover
+        return self.to_python_literal(self.or_default(self.value))
 
     @property
-    @abstractmethod
     def to_java_value(self) -> str:
-        pass  # pragma: no cover
+        return self.to_java_literal(self.or_default(self.value))
 
     @property
-    @abstractmethod
     def to_c_value(self) -> str:
+        return self.to_c_literal(self.or_default(self.value))
+
+    @abstractmethod
+    def to_python_literal(self, value) -> str:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def to_java_literal(self, value) -> str:
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def to_c_literal(self, value) -> str:
         pass  # pragma: no cover
 
+    # Writers for literals which may be large, overridden by containers to avoid building intermediate strings
+    def write_python_literal(self, value, out: TextIO):
+        out.write(self.to_python_literal(value))
+
+    def write_java_literal(self, value, out: TextIO):
+        out.write(self.to_java_literal(value))
+
+    def write_c_literal(self, value, out: TextIO):
+        out.write(self.to_c_literal(value))
+
     @property
     @abstractmethod
     def to_java(self) -> str:
@@ -101,60 +292,521 @@ class Type(ABC):
         pass  # pragma: no cover
 
     @abstractmethod
-    def to_c_printf(self, name: str) -> str:
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        """
+        The statements of a generated C JSON writer appending target as JSON, using the helpers named with the given
+        prefix
+        """
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        """
+        The statements of a generated Go MarshalJSON appending target as JSON to buf, using the helpers named with the
+        given prefix
+        """
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        """
+        The statements of a generated Go UnmarshalJSON reading target with the reader r, which return err from the
+        enclosing function if the input is not valid
+        """
+        pass  # pragma: no cover
+
+    def go_nonzero(self, target: str) -> Optional[str]:
+        """
+        A Go condition which is true unless target is the zero value omitempty leaves out, or None if it is never left
+        out
+        """
+        return f"{target} != 0"
+
+    @abstractmethod
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        """
+        The statements of a generated Java toJson appending target as JSON to out, using the helpers of the given
+        class
+        """
+        pass  # pragma: no cover
+
+    @abstractmethod
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        """
+        The statements of a generated Java readJson assigning the next value read by the tokenizer json to target
+        """
         pass  # pragma: no cover
 
+    def java_nonnull(self, target: str) -> Optional[str]:
+        """
+        A Java condition which is true unless target is null, or None if target is a primitive which is never null
+        """
+        return None
+
 
 class String(Type):
     def __init__(self, value: str, original_name: str, length: int = 255):
         super().__init__(value=value, original_name=original_name)
+        # The longest value seen, in UTF-8 bytes like its statistics
         self.length = length
 
+        # The distinct values seen, while there are at most enum_limit of them, otherwise None
+        self.values: Optional[Set[str]] = None
+        self.enum_limit = 0
+
+        # Whether the characters are stored in a buffer inside C structs, see use_inline_storage
+        self.inline = False
+
+        # The type of views of the input of the generated C JSON parser, see use_c_parser
+        self.view_type: Optional[str] = None
+
     to_python = 'str'
     to_java = 'String'
     to_go = 'string'
-    to_c = 'char'
-    c_is_variable_length_array = True
+    default_value = ''
+    schema_name = 'string'
+    collects_lengths = True
 
     @property
-    def to_python_value(self) -> str:
-        return repr(self.value)
+    def capacity(self) -> int:
+        """
+        The length to size buffers for, the given percentile of the lengths seen or the longest if there are none
+        """
+        capacity = self.statistics.length_percentile(self.CAPACITY_PERCENTILE)
+        return capacity if capacity is not None else self.length
 
     @property
-    def to_java_value(self) -> str:
+    def go_layout(self) -> Tuple[int, int]:
+        # A pointer and a length
+        return 2 * POINTER_SIZE, POINTER_SIZE
+
+    def use_inline_storage(self):
+        self.inline = self.view_type is None
+
+    def use_c_parser(self, prefix: str):
+        # Views take the place of buffers
+        self.view_type = f"{prefix}StringView"
+        self.inline = False
+
+    @property
+    def to_c(self) -> str:
+        return self.view_type or 'char'
+
+    @property
+    def c_is_variable_length_array(self) -> bool:
+        return not self.inline and not self.view_type
+
+    @property
+    def c_includes(self) -> Set[str]:
+        return {'string.h'} if self.inline else set()
+
+    @property
+    def c_layout(self) -> Tuple[int, int]:
+        if self.inline:
+            return self.capacity + 1, 1
+        if self.view_type:
+            # A pointer and a length
+            return 2 * POINTER_SIZE, POINTER_SIZE
+        return super().c_layout
+
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        return c_check(f"{prefix}_json_parse_string(parser, &{target})")
+
+    def c_declarations(self, name: str) -> List[str]:
+        if self.inline:
+            return [f"char {name}[{self.capacity + 1}];"]
+        return super().c_declarations(name)
+
+    def c_parameters(self, name: str) -> List[str]:
+        if self.inline:
+            return [f"const char * {name}"]
+        return super().c_parameters(name)
+
+    def c_assignments(self, name: str) -> List[str]:
+        if self.inline:
+            # Longer strings are truncated to the capacity, in bytes, before any UTF-8 character which does not fit
+            return [f"strncpy(p->{name}, {name}, {self.capacity});",
+                    f"p->{name}[{self.capacity}] = '\\0';",
+                    f"if (strlen({name}) > {self.capacity}) {{",
+                    f"    size_t end = {self.capacity};",
+                    f"    while (end > 0 && ((unsigned char) {name}[end] & 0xC0) == 0x80) {{",
+                    "        end--;",
+                    "    }",
+                    f"    p->{name}[end] = '\\0';",
+                    "}"]
+        return super().c_assignments(name)
+
+    def to_schema(self) -> dict:
+        schema = {**super().to_schema(), "length": self.length}
+        if self.values is not None:
+            schema["values"] = sorted(self.values)
+            schema["enum_limit"] = self.enum_limit
+        return schema
+
+    def track_values(self, values: Iterable[str], enum_limit: int):
+        """
+        Start keeping the distinct values of this field, to generate an enum if there are at most enum_limit of them
+        """
+        self.values = set(values)
+        self.enum_limit = enum_limit
+        if len(self.values) > enum_limit:
+            self.values = None
+
+    def merge(self, other: 'String') -> 'String':
+        super().merge(other)
+        self.length = max(self.length, other.length)
+        if self.values is not None and other.values is not None:
+            self.track_values(self.values | other.values, min(self.enum_limit, other.enum_limit))
+        else:
+            self.values = None
+        return self
+
+    @property
+    def is_enum(self) -> bool:
+        """
+        Whether few enough distinct values were seen, each more than once on average, for this field to be an enum
+        """
+        return bool(self.values) and self.count > len(self.values)
+
+    def to_enums(self, class_name: str) -> Type:
+        if not self.is_enum:
+            return self
+        from constructor.utils import any_to_upper_camel, singular
+
+        return Enum(self, class_name + any_to_upper_camel(singular(self.original_name)))
+
+    def to_python_literal(self, value: str) -> str:
+        return repr(value)
+
+    def to_java_literal(self, value: str) -> str:
         import json
 
         # In Java, strings cannot be double quoted
-        return json.dumps(self.value).lstrip('[').rstrip(']')
+        return json.dumps(value).lstrip('[').rstrip(']')
 
-    @property
-    def to_c_value(self) -> str:
+    def to_c_literal(self, value: str) -> str:
         import json
 
         # In c, strings cannot be double quoted
-        return json.dumps(self.value).lstrip('[').rstrip(']')
+        if self.view_type:
+            # Views hold strings as they appear in JSON, escape sequences and all
+            escaped = json.dumps(value)[1:-1]
+            return f"({self.view_type}) {{{json.dumps(escaped)}, {len(escaped)}}}"
+        return json.dumps(value).lstrip('[').rstrip(']')
+
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        if self.view_type:
+            # Views are already escaped
+            return [f"{prefix}_json_write_char(writer, '\"');",
+                    f"{prefix}_json_write(writer, {target}.data, {target}.length);",
+                    f"{prefix}_json_write_char(writer, '\"');"]
+        return [f"{prefix}_json_write_string(writer, {target}, strlen({target}));"]
+
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"buf = {prefix}AppendJSONString(buf, {target})"]
+
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        return go_check(f"{target}, err = r.readString()")
+
+    def go_nonzero(self, target: str) -> Optional[str]:
+        return f'{target} != ""'
+
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"{json_class}.writeString(out, {target});"]
 
-    def to_c_printf(self, name: str) -> str:
-        return f'printf_s("{name}=\\"%s\\"", p->{name});'
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"{target} = json.readString();"]
+
+    def java_nonnull(self, target: str) -> Optional[str]:
+        return f"{target} != null"
+
+
+class Enum(String):
+    """
+    A string field with few distinct values, generated as an enum with an UNKNOWN member for any other value
+    """
+    c_is_variable_length_array = False
+    c_includes = {'string.h'}
+
+    def __init__(self, string: String, name: str):
+        # An enum is still a string as far as inference and partial schemas are concerned
+        self.__dict__.update(string.__dict__)
+        self.name = name
+
+    @property
+    def members(self) -> Dict[str, str]:
+        """
+        The name of the member for each value, in UPPER_SNAKE case
+        """
+        import re
+
+        members = {}
+        used = {'UNKNOWN'}
+        for value in sorted(self.values):
+            member = re.sub(r'[^0-9A-Za-z]+', '_', value).strip('_').upper() or 'EMPTY'
+            if member[0].isdigit():
+                member = 'VALUE_' + member
+            unique_member, i = member, 2
+            while unique_member in used:
+                unique_member, i = f"{member}_{i}", i + 1
+            used.add(unique_member)
+            members[value] = unique_member
+        return members
+
+    def member(self, value: Optional[str]) -> str:
+        return self.members.get(value, 'UNKNOWN')
+
+    @property
+    def embedded_enums(self) -> List['Enum']:
+        return [self]
+
+    @property
+    def c_layout(self) -> Tuple[int, int]:
+        return C_SIZES['int'], C_SIZES['int']
+
+    @property
+    def go_layout(self) -> Tuple[int, int]:
+        return GO_SIZES['int'], GO_SIZES['int']
+
+    def to_enums(self, class_name: str) -> 'Enum':
+        return self
+
+    def use_inline_storage(self):
+        pass
+
+    def use_c_parser(self, prefix: str):
+        pass
+
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        from constructor.utils import indent
+
+        return ["{",
+                indent(1) + f"{prefix}StringView value;",
+                *(indent(1) + line for line in c_check(f"{prefix}_json_parse_string(parser, &value)")),
+                indent(1) + f"{target} = {self.name}_parse_n(value.data, value.length);",
+                "}"]
+
+    @property
+    def to_python(self) -> str:
+        return self.name
+
+    @property
+    def to_java(self) -> str:
+        return self.name
+
+    @property
+    def to_go(self) -> str:
+        return self.name
+
+    @property
+    def to_c(self) -> str:
+        return self.name
+
+    @property
+    def c_prefix(self) -> str:
+        from constructor.utils import camel_to_lower_snake
+
+        return camel_to_lower_snake(self.name).upper()
+
+    @property
+    def python_imports(self) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]], Dict[str, Set[str]]]:
+        return ({"enum": {"Enum"}}, {}, {})
+
+    def to_python_to_dict_pair(self, name) -> Tuple[str, str]:
+        return self.original_name, f"self.{name}.value"
+
+    def to_python_from_dict_value(self, source: Optional[str] = None) -> str:
+        return f"{self.name}({super().to_python_from_dict_value(source)})"
+
+    def python_signature(self, columns=False) -> list:
+        return [*super().python_signature(columns), self.members]
+
+    def to_python_literal(self, value: str) -> str:
+        return f"{self.name}.{self.member(value)}"
+
+    def to_java_literal(self, value: str) -> str:
+        return f"{self.name}.{self.member(value)}"
+
+    def to_c_literal(self, value: str) -> str:
+        return f"{self.c_prefix}_{self.member(value)}"
+
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"{prefix}_json_write_string(writer, {self.name}_to_string({target}), "
+                f"strlen({self.name}_to_string({target})));"]
+
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"buf = {prefix}AppendJSONString(buf, {target}.String())"]
+
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        # The bytes are only converted to look them up, which does not copy them
+        return ["var value []byte",
+                *go_check("value, err = r.readStringBytes()"),
+                f"{target} = Parse{self.name}(string(value))"]
+
+    def go_nonzero(self, target: str) -> Optional[str]:
+        return f"{target} != {self.name}Unknown"
+
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        # UNKNOWN has no value, so is written as null
+        return [f"{json_class}.writeString(out, {target} == null ? null : {target}.getValue());"]
+
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"{target} = {self.name}.fromValue(json.readString());"]
+
+    def generate_python_lines(self) -> List[str]:
+        from constructor.utils import indent
+
+        lines = [f"class {self.name}(Enum):"]
+        lines.extend(f"{indent(1)}{member} = {value!r}" for value, member in self.members.items())
+        lines.extend([indent(1) + "UNKNOWN = None", "",
+                      indent(1) + "@classmethod",
+                      indent(1) + "def _missing_(cls, value):",
+                      indent(2) + "# Values not seen when generating get an UNKNOWN member of their own keeping them",
+                      indent(2) + "member = object.__new__(cls)",
+                      indent(2) + "member._name_ = 'UNKNOWN'",
+                      indent(2) + "member._value_ = value",
+                      indent(2) + "return member"])
+        return lines
+
+    def generate_java_lines(self) -> List[str]:
+        from constructor.utils import indent
+
+        lines = [f"enum {self.name} {{"]
+        lines.extend(f"{indent(1)}{member}({self.to_java_string(value)})," for value, member in self.members.items())
+        lines.extend([indent(1) + "UNKNOWN(null);", "",
+                      indent(1) + "private final String value;", "",
+                      f"{indent(1)}{self.name}(String value) {{",
+                      indent(2) + "this.value = value;",
+                      indent(1) + "}", "",
+                      indent(1) + "public String getValue() {",
+                      indent(2) + "return this.value;",
+                      indent(1) + "}", "",
+                      f"{indent(1)}public static {self.name} fromValue(String value) {{",
+                      indent(2) + "if (value != null) {",
+                      indent(3) + "switch (value) {"])
+        for value, member in self.members.items():
+            lines.append(f"{indent(4)}case {self.to_java_string(value)}: return {member};")
+        lines.extend([indent(3) + "}",
+                      indent(2) + "}",
+                      indent(2) + "return UNKNOWN;",
+                      indent(1) + "}",
+                      "}"])
+        return lines
+
+    def generate_go_lines(self) -> List[str]:
+        from constructor.utils import indent, snake_to_upper_camel
+
+        constants = {value: self.name + snake_to_upper_camel(member.lower()) for value, member in self.members.items()}
+        lines = [f"type {self.name} int", "", "const (",
+                 f"{indent(1)}{self.name}Unknown {self.name} = iota"]
+        lines.extend(indent(1) + constant for constant in constants.values())
+        lines.extend([")", "",
+                      f"func Parse{self.name}(value string) {self.name} {{",
+                      indent(1) + "switch value {"])
+        for value, constant in constants.items():
+            lines.extend([f"{indent(1)}case {self.to_go_string(value)}:", f"{indent(2)}return {constant}"])
+        lines.extend([indent(1) + "}",
+                      f"{indent(1)}return {self.name}Unknown",
+                      "}", "",
+                      f"func (e {self.name}) String() string {{",
+                      indent(1) + "switch e {"])
+        for value, constant in constants.items():
+            lines.extend([f"{indent(1)}case {constant}:", f"{indent(2)}return {self.to_go_string(value)}"])
+        lines.extend([indent(1) + "}",
+                      indent(1) + 'return ""',
+                      "}", "",
+                      f"func (e {self.name}) MarshalText() ([]byte, error) {{",
+                      indent(1) + "return []byte(e.String()), nil",
+                      "}", "",
+                      f"func (e *{self.name}) UnmarshalText(text []byte) error {{",
+                      f"{indent(1)}*e = Parse{self.name}(string(text))",
+                      indent(1) + "return nil",
+                      "}"])
+        return lines
+
+    def generate_c_lines(self) -> List[str]:
+        from constructor.utils import indent
+
+        constants = {value: f"{self.c_prefix}_{member}" for value, member in self.members.items()}
+        lines = [f"enum {self.name} {{", f"{indent(1)}{self.c_prefix}_UNKNOWN,"]
+        lines.extend(f"{indent(1)}{constant}," for constant in constants.values())
+        lines.extend(["};", f"typedef enum {self.name} {self.name};", "",
+                      f"{self.name} {self.name}_parse_n(const char * value, size_t length) {{"])
+        for value, constant in constants.items():
+            length = utf8_length(value)
+            comparison = f"length == {length} && memcmp(value, {self.to_c_string(value)}, {length}) == 0"
+            lines.extend([f"{indent(1)}if ({comparison}) {{",
+                          f"{indent(2)}return {constant};",
+                          indent(1) + "}"])
+        lines.extend([f"{indent(1)}return {self.c_prefix}_UNKNOWN;", "}", "",
+                      f"{self.name} {self.name}_parse(const char * value) {{",
+                      f"{indent(1)}return {self.name}_parse_n(value, strlen(value));",
+                      "}", "",
+                      f"const char * {self.name}_to_string({self.name} value) {{",
+                      indent(1) + "switch (value) {"])
+        for value, constant in constants.items():
+            lines.extend([f"{indent(2)}case {constant}:", f"{indent(3)}return {self.to_c_string(value)};"])
+        lines.extend([indent(2) + "default:",
+                      indent(3) + 'return "";',
+                      indent(1) + "}",
+                      "}"])
+        return lines
+
+    @staticmethod
+    def to_java_string(value: str) -> str:
+        return String.to_java_literal(None, value)
+
+    @staticmethod
+    def to_go_string(value: str) -> str:
+        import json
+
+        # Go has no escapes for the halves of surrogate pairs, but takes any other character as it is
+        return json.dumps(value, ensure_ascii=False)
+
+    @staticmethod
+    def to_c_string(value: str) -> str:
+        # Always a plain string literal, even when the field is read as a view
+        return String.to_java_literal(None, value)
 
 
 class Integer(Type):
     to_python = 'int'
+    default_value = 0
+    schema_name = 'integer'
+    JAVA_COMPACT_TYPES = {8: 'byte', 16: 'short', 32: 'int', 64: 'long'}
+    JAVA_BOXED_TYPES = {'byte': 'Byte', 'short': 'Short', 'int': 'Integer', 'long': 'Long'}
+    PYTHON_TYPECODES = {8: 'b', 16: 'h', 32: 'i', 64: 'q'}
+    C_LIMITS = {'int': ('INT_MIN', 'INT_MAX'), 'long': ('LONG_MIN', 'LONG_MAX'),
+                'long long': ('LLONG_MIN', 'LLONG_MAX')}
+
+    @property
+    def python_typecode(self) -> Optional[str]:
+        # Like compact types, columns only hold the values seen, so larger values raise OverflowError
+        bits = self.compact_bits()
+        if bits is None:
+            return None
+        return self.PYTHON_TYPECODES[bits].upper() if self.min_value >= 0 else self.PYTHON_TYPECODES[bits]
 
     @property
     def to_java(self) -> str:
+        if self.compact_types and self.compact_bits(signed=True):
+            return self.JAVA_COMPACT_TYPES[self.compact_bits(signed=True)]
         if self.max_value >= 2**31 or self.min_value < -2**31:
             return 'long'
         return 'int'
 
     @property
     def to_go(self) -> str:
+        if self.compact_types and self.compact_bits():
+            return f"{'u' if self.min_value >= 0 else ''}int{self.compact_bits()}"
         if self.max_value >= 2**31 or self.min_value < -2**31:
                 return 'int64'
         return 'int'
 
     @property
     def to_c(self) -> str:
+        if self.compact_types and self.compact_bits():
+            return f"{'u' if self.min_value >= 0 else ''}int{self.compact_bits()}_t"
         if self.max_value >= 2**61 or self.min_value < -2**61:
             return 'long long'
         if self.max_value >= 2**31 or self.min_value < -2**31:
@@ -165,60 +817,167 @@ class Integer(Type):
         super().__init__(value, original_name)
         self.max_value = value
         self.min_value = value
+        self.compact_types = False
+
+    def use_compact_types(self):
+        self.compact_types = True
+
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        # Values which do not fit the type are errors rather than wrapping around
+        if self.to_c.startswith('u'):
+            parse = f"{prefix}_json_parse_unsigned(parser, UINT{self.compact_bits()}_MAX, &value)"
+            return ["{",
+                    "    unsigned long long value;",
+                    *("    " + line for line in c_check(parse)),
+                    f"    {target} = ({self.to_c}) value;",
+                    "}"]
+        minimum, maximum = self.C_LIMITS.get(self.to_c) or (f"INT{self.compact_bits()}_MIN",
+                                                            f"INT{self.compact_bits()}_MAX")
+        parse = f"{prefix}_json_parse_integer(parser, {minimum}, {maximum}, &value)"
+        return ["{",
+                "    long long value;",
+                *("    " + line for line in c_check(parse)),
+                f"    {target} = ({self.to_c}) value;",
+                "}"]
+
+    def compact_bits(self, signed: bool = False) -> Optional[int]:
+        """
+        Return the fewest bits of an integer holding every value seen, unsigned if none were negative unless signed
+        is given, or None if not even 64 bits are enough
+        """
+        for bits in (8, 16, 32, 64):
+            if self.min_value >= 0 and not signed:
+                if self.max_value < 2**bits:
+                    return bits
+            elif -2**(bits - 1) <= self.min_value and self.max_value < 2**(bits - 1):
+                return bits
+        return None
 
     @property
-    def to_python_value(self) -> str:
-        return repr(self.value)
+    def c_includes(self) -> Set[str]:
+        if self.compact_types and self.compact_bits():
+            return {'stdint.h'}
+        return set()
 
-    @property
-    def to_java_value(self) -> str:
-        if self.to_java == 'long':
-            return repr(self.value) + 'L'
-        return repr(self.value)
+    def merge(self, other: Union['Integer', 'Double']) -> Union['Integer', 'Double']:
+        if isinstance(other, Double):
+            return self.to_double().merge(other)
+        super().merge(other)
+        self.max_value = max(self.max_value, other.max_value)
+        self.min_value = min(self.min_value, other.min_value)
+        return self
 
-    @property
-    def to_c_value(self) -> str:
-        return repr(self.value)
+    def to_schema(self) -> dict:
+        return {**super().to_schema(), "min": self.min_value, "max": self.max_value}
 
-    def to_c_printf(self, name: str) -> str:
-        return f'printf_s("{name}=%d", p->{name});'
+    def to_double(self) -> 'Double':
+        """
+        Return this type widened to a floating-point type, for when integers are seen alongside doubles
+        """
+        double = Double(float(self.value) if self.value is not None else None, self.original_name)
+        double.max_value = float(self.max_value)
+        double.min_value = float(self.min_value)
+        double.count = self.count
+        double.position = self.position
+        double.statistics = self.statistics
+        return double
+
+    def to_python_literal(self, value: int) -> str:
+        return repr(value)
+
+    def to_java_literal(self, value: int) -> str:
+        if self.to_java == 'long':
+            return repr(value) + 'L'
+        if self.to_java in ('byte', 'short'):
+            # Integer literals are only narrowed implicitly in assignments, not in calls
+            return f"({self.to_java}) {value!r}"
+        return repr(value)
+
+    def to_c_literal(self, value: int) -> str:
+        return repr(value)
+
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        if self.compact_types and self.compact_bits() and self.min_value >= 0:
+            return [f"{prefix}_json_write_unsigned(writer, {target});"]
+        return [f"{prefix}_json_write_integer(writer, {target});"]
+
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        if self.to_go.startswith('uint'):
+            return [f"buf = strconv.AppendUint(buf, uint64({target}), 10)"]
+        return [f"buf = strconv.AppendInt(buf, int64({target}), 10)"]
+
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        # Values which do not fit the type are errors, as they are for encoding/json
+        unsigned = self.to_go.startswith('uint')
+        bits = self.to_go[4 if unsigned else 3:] or '0'
+        return [f"var value {'uint64' if unsigned else 'int64'}",
+                *go_check(f"value, err = r.read{'Uint' if unsigned else 'Int'}({bits})"),
+                f"{target} = {self.to_go}(value)"]
+
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"out.append(Long.toString({target}));"]
+
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        # Values which do not fit the type are errors rather than wrapping around
+        boxed = self.JAVA_BOXED_TYPES[self.to_java]
+        cast = "" if self.to_java == 'long' else f"({self.to_java}) "
+        return [f"{target} = {cast}json.readLong({boxed}.MIN_VALUE, {boxed}.MAX_VALUE);"]
 
 
 class Double(Type):
     to_python = 'float'
+    python_typecode = 'd'
     to_java = 'double'
     to_go = 'float64'
+    default_value = 0.0
+    schema_name = 'double'
 
-    def __init__(self, value: int, original_name: str):
+    def __init__(self, value: float, original_name: str):
         super().__init__(value, original_name)
         self.max_value = value
         self.min_value = value
 
+    def to_schema(self) -> dict:
+        return {**super().to_schema(), "min": self.min_value, "max": self.max_value}
+
+    def merge(self, other: Union['Double', Integer]) -> 'Double':
+        if isinstance(other, Integer):
+            other = other.to_double()
+        super().merge(other)
+        self.max_value = max(self.max_value, other.max_value)
+        self.min_value = min(self.min_value, other.min_value)
+        return self
+
     @property
     def to_c(self) -> str:
         if self.max_value >= 1.7E+308 or self.min_value < -2.3E-308:
             return 'long double'
         return 'double'
 
-    @property
-    def to_python_value(self) -> str:
-        if self.max_value == float('inf'):
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        return ["{",
+                "    double value;",
+                *("    " + line for line in c_check(f"{prefix}_json_parse_double(parser, &value)")),
+                f"    {target} = value;",
+                "}"]
+
+    def to_python_literal(self, value: float) -> str:
+        if value == float('inf'):
             return 'float("inf")'
-        if self.min_value == float('-inf'):
+        if value == float('-inf'):
             return 'float("-inf")'
-        if self.min_value == float('nan'):
+        if value != value:
             return 'float("nan")'
-        return repr(self.value)
+        return repr(value)
 
-    @property
-    def to_java_value(self) -> str:
-        if self.max_value == float('inf'):
+    def to_java_literal(self, value: float) -> str:
+        if value == float('inf'):
             return "Float.POSITIVE_INFINITY"
-        if self.min_value == float('-inf'):
+        if value == float('-inf'):
             return "Float.NEGATIVE_INFINITY"
-        if self.min_value == float('nan'):
+        if value != value:
             return "Float.NaN"
-        return repr(self.value)
+        return repr(value)
 
     @property
     def to_go_value(self) -> str:
@@ -232,12 +991,23 @@ class Double(Type):
             return repr("math.NaN()")
         return repr(self.value)
 
-    @property
-    def to_c_value(self) -> str:
-        return repr(self.value)
+    def to_c_literal(self, value: float) -> str:
+        return repr(value)
+
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"{prefix}_json_write_double(writer, (double) {target});"]
+
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"buf = {prefix}AppendJSONFloat(buf, {target})"]
+
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        return go_check(f"{target}, err = r.readFloat()")
+
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"{json_class}.writeDouble(out, {target});"]
 
-    def to_c_printf(self, name: str) -> str:
-        return f'printf_s("{name}=%f", p->{name});'
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"{target} = json.readDouble();"]
 
 
 class Boolean(Type):
@@ -246,94 +1016,284 @@ class Boolean(Type):
     to_go = 'bool'
     to_c = 'bool'
     c_includes = {'stdbool.h'}
+    default_value = False
+    schema_name = 'boolean'
 
-    @property
-    def to_python_value(self) -> str:
-        return repr(self.value)
+    def to_python_literal(self, value: bool) -> str:
+        return repr(value)
 
-    @property
-    def to_java_value(self) -> str:
+    def to_java_literal(self, value: bool) -> str:
         # In Java, booleans are false rather than False, or true rather than True
-        return repr(self.value).lower()
+        return repr(value).lower()
 
-    @property
-    def to_c_value(self) -> str:
+    def to_c_literal(self, value: bool) -> str:
         # In c, booleans are false rather than False, or true rather than True
-        return repr(self.value).lower()
+        return repr(value).lower()
+
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"{prefix}_json_write_boolean(writer, {target});"]
+
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"buf = strconv.AppendBool(buf, {target})"]
+
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        return go_check(f"{target}, err = r.readBool()")
 
-    def to_c_printf(self, name: str) -> str:
-        return f'printf_s("{name}=%s\", p->{name} ? "true" : "false");'
+    def go_nonzero(self, target: str) -> Optional[str]:
+        return target
+
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        return [f'out.append({target} ? "true" : "false");']
+
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"{target} = json.readBoolean();"]
+
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        return c_check(f"{prefix}_json_parse_boolean(parser, &{target})")
 
 
 class Array(Type):
-    c_is_variable_length_array = True
+    schema_name = 'array'
+    collects_lengths = True
+    collects_distinct = False
+
+    @property
+    def capacity(self) -> int:
+        """
+        The length to size buffers for, the given percentile of the lengths seen or the longest if there are none
+        """
+        capacity = self.statistics.length_percentile(self.CAPACITY_PERCENTILE)
+        return capacity if capacity is not None else self.length
 
     def __init__(self, value: List, original_name: str, item_type: Type, length: int = 255):
         super().__init__(value=value, original_name=original_name)
         self.item_type = item_type
         self.length = length
 
-    def to_python_to_dict_pair(self, name) -> Tuple[str, str]:
-        if isinstance(self.item_type, Array) or isinstance(self.item_type, Object):
-            original_name_copy = self.item_type.original_name
-            self.item_type.original_name = 'o'
-            string = f"[{self.item_type.to_python_to_dict_pair('o')[1].lstrip('self.')} for o in self.{name}]"
-            self.item_type.original_name = original_name_copy
-            return self.original_name, string
-        return self.original_name, f"self.{name}"
+        # Whether the items are stored in a buffer inside C structs, with a count, see use_inline_storage
+        self.inline = False
 
-    def to_python_from_dict_value(self) -> str:
-        if isinstance(self.item_type, Array) or isinstance(self.item_type, Object):
-            original_name_copy = self.item_type.original_name
-            looped_to_dict_value = self.item_type.to_python_from_dict_value()\
-                .replace(f'd[{self.item_type.original_name!r}]', 'o', 1)
-            string = f"[{looped_to_dict_value} for o in d[{self.original_name!r}]]"
-            self.item_type.original_name = original_name_copy
-            return string
-        return f"d[{self.original_name!r}]"
+        # The C struct holding the count and items of this array when it is an item of another array, see name_c_items
+        self.c_struct_name: Optional[str] = None
 
     @property
-    def to_python_value(self) -> str:
-        original_value = self.item_type.value
-        value = "["
-        for item in self.value:
-            self.item_type.value = item
-            value += self.item_type.to_python_value + ", "
-        value = value.rstrip(", ")
-        value += "]"
-        self.item_type.value = original_value
-        return value
+    def default_value(self) -> List:
+        return []
+
+    def rename(self, original_name: str):
+        super().rename(original_name)
+        self.item_type.rename(original_name)
+
+    def to_schema(self) -> dict:
+        return {**super().to_schema(), "length": self.length, "items": self.item_type.to_schema()}
+
+    def merge(self, other: 'Array') -> 'Array':
+        super().merge(other)
+        # We want the maximum length seen for the array size
+        self.length = max(self.length, other.length)
+        self.item_type = self.item_type.merge(other.item_type)
+        return self
 
     @property
-    def to_java_value(self) -> str:
-        # Array literal
-        original_value = self.item_type.value
-        value = f"new {self.item_type.to_java}[]{{"
-        for item in self.value:
-            self.item_type.value = item
-            value += self.item_type.to_java_value + ", "
-        value = value.rstrip(", ")
-        value += "}"
-        self.item_type.value = original_value
-        return value
+    def embedded_enums(self) -> List['Enum']:
+        return self.item_type.embedded_enums
+
+    def to_enums(self, class_name: str) -> 'Array':
+        self.item_type = self.item_type.to_enums(class_name)
+        return self
+
+    def use_compact_types(self):
+        self.item_type.use_compact_types()
 
     @property
-    def to_c_value(self) -> str:
+    def go_layout(self) -> Tuple[int, int]:
+        # A pointer, a length and a capacity
+        return 3 * POINTER_SIZE, POINTER_SIZE
+
+    def use_inline_storage(self):
+        # Arrays of arrays would need a count for every item, so they are left behind pointers
+        if isinstance(self.item_type, Array):
+            return
+        self.inline = True
+        self.item_type.use_inline_storage()
+
+    def use_c_parser(self, prefix: str):
+        # Arrays of arrays are skipped by the parser, so their items are left as they are
+        if isinstance(self.item_type, Array):
+            return
+        # Parsing does not allocate, so the items are stored inline
+        self.use_inline_storage()
+        self.item_type.use_c_parser(prefix)
+
+    def name_c_items(self, name: str):
+        if isinstance(self.item_type, Array):
+            self.item_type.c_struct_name = name
+            self.item_type.name_c_items(name + "Item")
+
+    def c_item_struct_lines(self) -> List[str]:
+        if not isinstance(self.item_type, Array):
+            return []
+        name = self.item_type.c_struct_name
+        return [*self.item_type.c_item_struct_lines(),
+                f"struct {name} {{",
+                "    size_t count;",
+                f"    {self.item_type.c_item_type} * items;",
+                "};",
+                f"typedef struct {name} {name};",
+                ""]
+
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        count = f"{target}_count"
+        if not self.inline:
+            # Arrays of arrays would need allocating, so they are left empty and their items skipped
+            return [f"{target} = NULL;",
+                    f"{count} = 0;",
+                    *c_check(f"{prefix}_json_expect(parser, '[')"),
+                    f"if (!{prefix}_json_accept(parser, ']')) {{",
+                    "    parser->truncated = true;",
+                    "    do {",
+                    *("        " + line for line in c_check(f"{prefix}_json_skip_value(parser)")),
+                    f"    }} while ({prefix}_json_accept(parser, ','));",
+                    *("    " + line for line in c_check(f"{prefix}_json_expect(parser, ']')")),
+                    "}"]
+        # Items beyond the capacity are skipped
+        return [*c_check(f"{prefix}_json_expect(parser, '[')"),
+                f"if (!{prefix}_json_accept(parser, ']')) {{",
+                "    do {",
+                f"        if ({count} < {self.capacity}) {{",
+                *("            " + line for line in self.item_type.c_parse_lines(f"{target}[{count}]", prefix)),
+                f"            {count}++;",
+                "        } else {",
+                "            parser->truncated = true;",
+                *("            " + line for line in c_check(f"{prefix}_json_skip_value(parser)")),
+                "        }",
+                f"    }} while ({prefix}_json_accept(parser, ','));",
+                *("    " + line for line in c_check(f"{prefix}_json_expect(parser, ']')")),
+                "}"]
+
+    @property
+    def c_is_variable_length_array(self) -> bool:
+        return not self.inline
+
+    @property
+    def c_layout(self) -> Tuple[int, int]:
+        if not self.inline:
+            # A count and a pointer
+            return 2 * POINTER_SIZE, POINTER_SIZE
+        # The count comes first, then the items
+        item_size, item_alignment = self.item_type.c_layout
+        offset = POINTER_SIZE + -POINTER_SIZE % item_alignment
+        return offset + self.capacity * item_size, max(POINTER_SIZE, item_alignment)
+
+    @property
+    def c_item_type(self) -> str:
+        """
+        The C type of the items of array literals
+        """
+        if isinstance(self.item_type, Array):
+            return self.item_type.c_struct_name
+        if isinstance(self.item_type, String) and self.item_type.inline:
+            return 'const char *'
+        if self.item_type.c_is_variable_length_array:
+            return f"{self.item_type.to_c} *"
+        return self.item_type.to_c
+
+    def c_declarations(self, name: str) -> List[str]:
+        if not self.inline:
+            # The count is kept next to the pointer, so the items can be written back out
+            return [f"size_t {name}_count;", f"{self.c_item_type} * {name};"]
+        return [f"size_t {name}_count;", *self.item_type.c_declarations(f"{name}[{self.capacity}]")]
+
+    def c_parameters(self, name: str) -> List[str]:
+        if not self.inline:
+            return [f"{self.c_item_type} {name}[]", f"size_t {name}_count"]
+        return [*self.item_type.c_parameters(f"{name}[]"), f"size_t {name}_count"]
+
+    def c_assignments(self, name: str) -> List[str]:
+        if not self.inline:
+            return [f"p->{name} = {name};", f"p->{name}_count = {name}_count;"]
+        from constructor.utils import indent
+
+        # Items beyond the capacity are dropped
+        count = f"p->{name}_count"
+        lines = [f"{count} = {name}_count < {self.capacity} ? {name}_count : {self.capacity};"]
+        if self.c_item_type == 'const char *':
+            lines.append(f"for (size_t i = 0; i < {count}; i++) {{")
+            lines.extend(indent(1) + line for line in self.item_type.c_assignments(f"{name}[i]"))
+            lines.append("}")
+        else:
+            lines.append(f"memcpy(p->{name}, {name}, {count} * sizeof(p->{name}[0]));")
+        return lines
+
+    def to_python_to_dict_pair(self, name) -> Tuple[str, str]:
+        if isinstance(self.item_type, (Array, Object, Enum)):
+            string = f"[{self.item_type.to_python_to_dict_pair('o')[1].lstrip('self.')} for o in self.{name}]"
+            return self.original_name, string
+        return self.original_name, f"self.{name}"
+
+    @property
+    def python_lazy(self) -> bool:
+        return isinstance(self.item_type, (Array, Object, Enum))
+
+    def to_python_from_dict_value(self, source: Optional[str] = None) -> str:
+        source = super().to_python_from_dict_value(source)
+        if isinstance(self.item_type, (Array, Object, Enum)):
+            return f"[{self.item_type.to_python_from_dict_value('o')} for o in {source}]"
+        return source
+
+    def python_signature(self, columns=False) -> list:
+        return [*super().python_signature(columns), self.item_type.python_signature(columns)]
+
+    def to_python_literal(self, value: List) -> str:
+        out = StringIO()
+        self.write_python_literal(value, out)
+        return out.getvalue()
+
+    def to_java_literal(self, value: List) -> str:
+        out = StringIO()
+        self.write_java_literal(value, out)
+        return out.getvalue()
+
+    def to_c_literal(self, value: List) -> str:
+        out = StringIO()
+        self.write_c_literal(value, out)
+        return out.getvalue()
+
+    def write_python_literal(self, value: List, out: TextIO):
+        out.write("[")
+        for i, item in enumerate(value):
+            if i:
+                out.write(", ")
+            self.item_type.write_python_literal(item, out)
+        out.write("]")
+
+    def write_java_literal(self, value: List, out: TextIO):
         # Array literal
-        original_value = self.item_type.value
-        value = f"({self.item_type.to_c}[]) {{"
-        for item in self.value:
-            self.item_type.value = item
-            value += "*" if isinstance(self.item_type, Object) else ""
-            value += self.item_type.to_c_value + ", "
-        value = value.rstrip(", ")
-        value += "}"
-        self.item_type.value = original_value
-        return value
+        out.write(f"new {self.item_type.to_java}[]{{")
+        for i, item in enumerate(value):
+            if i:
+                out.write(", ")
+            self.item_type.write_java_literal(item, out)
+        out.write("}")
+
+    def write_c_literal(self, value: List, out: TextIO):
+        # Array literal, with its count inside the struct of an item of another array or as the next argument
+        if self.c_struct_name:
+            out.write(f"{{{len(value)}, ")
+        out.write(f"({self.c_item_type}[]) {{")
+        for i, item in enumerate(value):
+            if i:
+                out.write(", ")
+            self.item_type.write_c_literal(item, out)
+        out.write("}")
+        out.write("}" if self.c_struct_name else f", {len(value)}")
 
     @property
     def python_imports(self) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]], Dict[str, Set[str]]]:
-        return ({"typing": {"List"}}, {}, {})
+        i_standard, i_third_party, i_local = self.item_type.python_imports
+        i_standard = {key: set(values) for key, values in i_standard.items()}
+        i_standard.setdefault("typing", set()).add("List")
+        return (i_standard, i_third_party, i_local)
 
     @property
     def java_imports(self) -> Set[str]:
@@ -361,50 +1321,167 @@ class Array(Type):
 
     @property
     def c_includes(self) -> Set[str]:
+        if self.inline:
+            return self.item_type.c_includes | {'string.h'}
         return self.item_type.c_includes
 
-    def to_c_printf(self, name: str) -> str:
-        return f'printf_s("{name}={{...}}");'
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        # Each level of nested arrays has its own index
+        index = f"i{target.count('[')}"
+        count, items = (f"{target}.count", f"{target}.items") if self.c_struct_name else (f"{target}_count", target)
+        return [f"{prefix}_json_write_char(writer, '[');",
+                f"for (size_t {index} = 0; {index} < {count}; {index}++) {{",
+                f"    if ({index}) {{",
+                f"        {prefix}_json_write_char(writer, ',');",
+                "    }",
+                *("    " + line for line in self.item_type.c_json_lines(f"{items}[{index}]", prefix)),
+                "}",
+                f"{prefix}_json_write_char(writer, ']');"]
+
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        # Each level of nested arrays has its own index
+        index = f"i{target.count('[')}"
+        return ["buf = append(buf, '[')",
+                f"for {index} := range {target} {{",
+                f"    if {index} > 0 {{",
+                "        buf = append(buf, ',')",
+                "    }",
+                *("    " + line for line in self.item_type.go_append_lines(f"{target}[{index}]", prefix)),
+                "}",
+                "buf = append(buf, ']')"]
+
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        # Each item is read in place at the end of the slice, so nested arrays need no variables
+        item = f"{target}[len({target})-1]"
+        return [*go_check("err = r.expect('[')"),
+                "if !r.accept(']') {",
+                "    for {",
+                f"        {target} = append({target}, *new({self.item_type.to_go}))",
+                *("        " + line for line in self.item_type.go_read_lines(item, prefix)),
+                "        if !r.accept(',') {",
+                "            break",
+                "        }",
+                "    }",
+                *("    " + line for line in go_check("err = r.expect(']')")),
+                "}"]
+
+    def go_nonzero(self, target: str) -> Optional[str]:
+        return f"len({target}) != 0"
+
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        # Each level of nested arrays has its own index
+        index = f"i{target.count('[')}"
+        return [f"if ({target} == null) {{",
+                '    out.append("null");',
+                "} else {",
+                "    out.append('[');",
+                f"    for (int {index} = 0; {index} < {target}.length; {index}++) {{",
+                f"        if ({index} > 0) {{",
+                "            out.append(',');",
+                "        }",
+                *("        " + line for line in self.item_type.java_write_lines(f"{target}[{index}]", json_class)),
+                "    }",
+                "    out.append(']');",
+                "}"]
+
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        # Items are read into an array of the item type itself, so primitives are never boxed, which starts at the
+        # capacity for nearly all of the lengths seen and doubles when it is full
+        depth = target.count('[')
+        items, count = f"items{depth}", f"count{depth}"
+        item_java = self.item_type.to_java
+        base_java = item_java.split('[')[0]
+        return ["{",
+                f"    {item_java}[] {items} = new {base_java}[{max(self.capacity, 1)}]{item_java[len(base_java):]};",
+                f"    int {count} = 0;",
+                "    json.expect('[');",
+                "    if (!json.accept(']')) {",
+                "        do {",
+                f"            if ({count} == {items}.length) {{",
+                f"                {items} = Arrays.copyOf({items}, {count} * 2);",
+                "            }",
+                *("            " + line
+                  for line in self.item_type.java_read_lines(f"{items}[{count}]", json_class)),
+                f"            {count}++;",
+                "        } while (json.accept(','));",
+                "        json.expect(']');",
+                "    }",
+                f"    {target} = {count} == {items}.length ? {items} : Arrays.copyOf({items}, {count});",
+                "}"]
+
+    def java_nonnull(self, target: str) -> Optional[str]:
+        return f"{target} != null"
 
 
 class Object(Type):
+    schema_name = 'object'
+    collects_distinct = False
+    python_lazy = True
+
     def __init__(self, value: dict, original_name: str, object_class: 'MetaClass'):
         super().__init__(value=value, original_name=original_name)
         self.object_class = object_class
 
+    @property
+    def default_value(self) -> dict:
+        # Every field of the object falls back to its own default
+        return {}
+
+    def rename(self, original_name: str):
+        from constructor.utils import singular
+
+        super().rename(original_name)
+        self.object_class.rename(singular(original_name))
+
+    def to_schema(self) -> dict:
+        return self.object_class.to_schema()
+
+    def merge(self, other: 'Object') -> 'Object':
+        super().merge(other)
+        self.object_class.merge(other.object_class)
+        return self
+
     @property
     def embedded_objects(self) -> List['Object']:
         return [self]
 
+    @property
+    def c_layout(self) -> Tuple[int, int]:
+        return self.object_class.c_layout
+
+    def c_parse_lines(self, target: str, prefix: str) -> List[str]:
+        return c_check(f"{self.object_class.c_name}_parse_json_object(parser, &{target})")
+
+    @property
+    def go_layout(self) -> Tuple[int, int]:
+        return self.object_class.go_layout
+
     def to_python_to_dict_pair(self, name) -> Tuple[str, str]:
         return self.original_name, f"self.{name}.to_dict()"
 
-    def to_python_from_dict_value(self) -> str:
-        return f"""{self.to_python.strip("'")}.from_dict(d[{self.original_name!r}])"""
+    def to_python_from_dict_value(self, source: Optional[str] = None) -> str:
+        return f"""{self.to_python.strip("'")}.from_dict({super().to_python_from_dict_value(source)})"""
 
-    @property
-    def to_python_value(self) -> str:
-        from constructor.main import MetaClass
+    def python_signature(self, columns=False) -> list:
+        return [*super().python_signature(columns), self.object_class.get_python_signature(columns)]
 
-        # Not using self.object_class so that overriding the value is supported...
-        object_class = MetaClass.from_dict(name=self.object_class.name, data=self.value)
-        return object_class.generate_python_object()
+    def to_python_literal(self, value: dict) -> str:
+        return self.object_class.generate_python_object(value)
 
-    @property
-    def to_java_value(self) -> str:
-        from constructor.main import MetaClass
+    def to_java_literal(self, value: dict) -> str:
+        return self.object_class.generate_java_object(value)
 
-        # Not using self.object_class so that overriding the value is supported...
-        object_class = MetaClass.from_dict(name=self.object_class.name, data=self.value)
-        return object_class.generate_java_object()
+    def to_c_literal(self, value: dict) -> str:
+        return self.object_class.generate_c_object(value, by_value=True)
 
-    @property
-    def to_c_value(self) -> str:
-        from constructor.main import MetaClass
+    def write_python_literal(self, value: dict, out: TextIO):
+        self.object_class.write_python_object(value, out)
+
+    def write_java_literal(self, value: dict, out: TextIO):
+        self.object_class.write_java_object(value, out)
 
-        # Not using self.object_class so that overriding the value is supported...
-        object_class = MetaClass.from_dict(name=self.object_class.name, data=self.value)
-        return object_class.generate_c_object()
+    def write_c_literal(self, value: dict, out: TextIO):
+        self.object_class.write_c_object(value, out, by_value=True)
 
     @property
     def to_python(self) -> str:
@@ -434,5 +1511,28 @@ class Object(Type):
     def java_imports(self) -> Set[str]:
         return set(self.object_class.get_java_imports())
 
-    def to_c_printf(self, name: str) -> str:
-        return f'{self.object_class.c_name}_print(&p->{name});'
+    def c_json_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"{self.object_class.c_name}_write_json(writer, &{target});"]
+
+    def go_append_lines(self, target: str, prefix: str) -> List[str]:
+        return [f"buf = {target}.appendJSON(buf)"]
+
+    def go_read_lines(self, target: str, prefix: str) -> List[str]:
+        return go_check(f"err = {target}.readJSON(r)")
+
+    def go_nonzero(self, target: str) -> Optional[str]:
+        # Like encoding/json, structs are never left out
+        return None
+
+    def java_write_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"if ({target} == null) {{",
+                '    out.append("null");',
+                "} else {",
+                f"    {target}.toJson(out);",
+                "}"]
+
+    def java_read_lines(self, target: str, json_class: str) -> List[str]:
+        return [f"{target} = {self.object_class.java_name}.readJson(json);"]
+
+    def java_nonnull(self, target: str) -> Optional[str]:
+        return f"{target} != null"
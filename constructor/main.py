@@ -1,18 +1,52 @@
 import json
+import os
+import pickle
 import autopep8
-from typing import Dict, List, Union, Set, Tuple
-
-from constructor.field_types import Type, Array, Object
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from functools import partial, wraps
+from io import StringIO
+from types import ModuleType
+from typing import Dict, List, Union, Set, Tuple, Optional, Iterable, Iterator, TextIO, Callable
+
+from constructor.context import GenerationContext
+from constructor.field_types import Type, Array, Enum, Object, c_check, go_check
+from constructor.retention import RetainValues
 from constructor.utils import any_to_upper_camel, any_to_lower_camel, camel_to_lower_snake, indent, primitive_to_type, \
-    add_suffix_to_reserved_python_words
+    add_suffix_to_reserved_python_words, pad_lines, struct_layout, write_lines
 
 from inflection import pluralize, singularize
 
-PRINTED_SIGNATURES: Dict[str, Set[str]] = {}
+LANGUAGES = ('python', 'java', 'go', 'c')
 
 
 class MetaClass:
-    def __init__(self, name: str, fields: Dict[str, Type]):
+    def __init__(self, name: str, fields: Dict[str, Type], context: Optional[GenerationContext] = None):
+        self.rename(name)
+
+        # Normalize field name as lowerCamel
+        self.fields = {any_to_lower_camel(field): t for field, t in fields.items()}
+
+        # The context used to name this class and its related classes
+        self.context = context if context is not None else GenerationContext()
+
+        # How many objects this class was inferred from, fields seen in fewer of them are optional
+        self.samples = 1
+
+        # Whether the fields of C and Go structs are ordered to minimize padding, see specialize_fields
+        self.minimize_padding = False
+
+        # The name of the C arena this class and its related classes can be built in, see use_arena
+        self.arena_name: Optional[str] = None
+
+        # The prefix of the C JSON parser helpers shared by this class and its related classes, see use_c_parser
+        self.parser_name: Optional[str] = None
+
+        # The prefix of the C JSON writer helpers shared by this class and its related classes, see use_json_writer
+        self.writer_name: Optional[str] = None
+
+    def rename(self, name: str):
         if not name:
             name += 'ClassName'  # TODO: Raise an error
 
@@ -27,119 +61,533 @@ class MetaClass:
         if self.name[0].isdigit():
             self.name = 'Item' + self.name
 
-        # Normalize field name as lowerCamel
-        self.fields = {any_to_lower_camel(field): t for field, t in fields.items()}
-
     @classmethod
-    def from_dict(cls, name: str, data: Dict[str, Union[str, bool, int, list]], skip_fields_with_errors=False):
+    def from_dict(cls, name: str, data: Dict[str, Union[str, bool, int, list]], skip_fields_with_errors=False,
+                  context: Optional[GenerationContext] = None, retain_values: Union[str, RetainValues, None] = None):
+        """
+        :param retain_values: Which of the values in the data are kept as examples, 'all', 'sample(k)' to keep at
+            most k items of each array, or 'none' to only keep the types. Defaults to the setting of the context if
+            one is given, and 'all' otherwise.
+        """
+        context = cls.inference_context(context, retain_values, 'all')
+        meta_class = cls(name=name, fields=cls.infer_fields(data, skip_fields_with_errors, context), context=context)
+        meta_class.name_related_classes(context)
+        return meta_class
+
+    @staticmethod
+    def infer_fields(data: Dict[str, Union[str, bool, int, list]], skip_fields_with_errors: bool,
+                     context: GenerationContext) -> Dict[str, Type]:
         # TODO: Support for None
         fields = {}
-        for key, value in data.items():
+        for position, (key, value) in enumerate(data.items()):
 
             try:
-                fields[key] = primitive_to_type(value, field_name=key)
+                fields[key] = primitive_to_type(value, field_name=key, context=context)
+                fields[key].position = position
             except Exception:
                 if not skip_fields_with_errors:
                     raise
                 # TODO: Warnings instead
+        return fields
 
-        return cls(name=name, fields=fields)
+    @staticmethod
+    def inference_context(context: Optional[GenerationContext], retain_values: Union[str, RetainValues, None],
+                          default: str) -> GenerationContext:
+        """
+        Return the context to infer with, a new one keeping the default values if none is given. The values retained
+        by a given context are only changed when retain_values is given too.
+        """
+        if context is None:
+            return GenerationContext(RetainValues.parse(retain_values if retain_values is not None else default))
+        if retain_values is not None:
+            context.retain_values = RetainValues.parse(retain_values)
+        return context
 
     @classmethod
-    def from_json(cls, name: str, data: str, skip_fields_with_errors=False):
+    def from_json(cls, name: str, data: str, skip_fields_with_errors=False,
+                  context: Optional[GenerationContext] = None, single_pass=False,
+                  retain_values: Union[str, RetainValues, None] = None):
+        """
+        :param single_pass: Infer types while decoding rather than from the decoded data, so that the decoded data
+            is never held in memory
+        :param retain_values: Which of the values in the data are kept as examples, 'all', 'sample(k)' to keep at
+            most k items of each array, or 'none' to only keep the types. Defaults to the setting of the context if one
+            is given, and otherwise to 'sample(1)' for a single pass and 'all' for the decoded data.
+        """
+        if single_pass:
+            return cls.from_json_single_pass(name, data, skip_fields_with_errors, context, retain_values)
         data = json.loads(data)
         # TODO: More useful support for lists
         # TODO: Bubble up a warning that we ignored everything except the first nonlist item
         if isinstance(data, list):
             if len(data) == 0:
                 raise NotImplementedError("Top-level array cannot be an empty list")
-            items_name = pluralize(name)
-            if singularize(items_name) == name:
-                items_name = "items"
-            return cls.from_dict(name, {items_name: data}, skip_fields_with_errors)
-        return cls.from_dict(name, data, skip_fields_with_errors)
+            return cls.from_dict(name, {cls.get_items_name(name): data}, skip_fields_with_errors, context,
+                                 retain_values)
+        return cls.from_dict(name, data, skip_fields_with_errors, context, retain_values)
+
+    @classmethod
+    def from_json_single_pass(cls, name: str, data: str, skip_fields_with_errors=False,
+                              context: Optional[GenerationContext] = None,
+                              retain_values: Union[str, RetainValues, None] = None):
+        from constructor.decoder import InferringDecoder, InferenceError
+
+        context = cls.inference_context(context, retain_values, 'sample(1)')
+        data = InferringDecoder(context, skip_fields_with_errors).decode(data)
+        if isinstance(data, Object):
+            meta_class = data.object_class
+            meta_class.rename(name)
+        elif not isinstance(data, (Array, InferenceError)):
+            raise NotImplementedError(f"{data!r} (type={type(data)}) is not supported at the top level!")
+        else:
+            # Top-level arrays, failing or not, end up as a single field like they do with from_json
+            fields = {}
+            try:
+                fields[cls.get_items_name(name)] = InferringDecoder.to_type(data, cls.get_items_name(name), context)
+            except Exception:
+                if not skip_fields_with_errors:
+                    raise
+            meta_class = cls(name=name, fields=fields, context=context)
+        meta_class.name_related_classes(context)
+        return meta_class
+
+    @classmethod
+    def from_jsonl(cls, name: str, lines: Iterable[Union[str, bytes]], skip_fields_with_errors=False,
+                   context: Optional[GenerationContext] = None, retain_values: Union[str, RetainValues, None] = None):
+        """
+        Infer a class from JSON Lines (newline-delimited JSON) such as an open file, one record at a time. Each record
+        must be an object and is merged into the class inferred from the records before it, so memory use does not
+        grow with the number of records. The first record is used as the example. Values are retained like with
+        from_dict.
+        """
+        context = cls.inference_context(context, retain_values, 'all')
+        meta_class = None
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if not isinstance(data, dict):
+                raise NotImplementedError(f"Record on line {line_number} is not an object ({data!r})")
+            record_class = cls(name=name, fields=cls.infer_fields(data, skip_fields_with_errors, context),
+                               context=context)
+            meta_class = record_class if meta_class is None else meta_class.merge(record_class)
+        if meta_class is None:
+            raise NotImplementedError("JSON Lines input must contain at least one record")
+        meta_class.name_related_classes(context)
+        return meta_class
+
+    @classmethod
+    def from_json_parallel(cls, name: str, data: str, executor: Optional[Executor] = None, chunk_size: int = 10000,
+                           context: Optional[GenerationContext] = None, max_workers: Optional[int] = None,
+                           max_pending: Optional[int] = None):
+        """
+        Infer a class from a JSON array by decoding and inferring chunks of its items in parallel, by default in a
+        process pool of max_workers, then merging the partial schemas of the chunks in order. The text is split
+        between items one item at a time, so workers only get the text of their chunk. No values are retained, so
+        there are no examples, but the context given is left as it is. Anything other than a top-level array is
+        inferred as usual.
+        """
+        from json.decoder import WHITESPACE
+        from constructor.schema import infer_json_array_chunk, split_json_array
+
+        start = WHITESPACE.match(data).end()
+        if data[start:start + 1] != '[':
+            return cls.from_json(name, data, context=context, retain_values='none')
+        items_name = cls.get_items_name(name)
+        context = context.fork() if context is not None else GenerationContext()
+        context.retain_values = RetainValues(0)
+        item_type = cls.infer_chunks(partial(infer_json_array_chunk, enum_limit=context.enum_limit),
+                                     split_json_array(data, chunk_size), items_name, executor, context, max_workers,
+                                     max_pending)
+        if item_type is None:
+            raise NotImplementedError("Top-level array cannot be an empty list")
+        array = Array(value=None, original_name=items_name, item_type=item_type, length=item_type.count)
+        array.rename(items_name)
+        meta_class = cls(name=name, fields={items_name: array}, context=context)
+        meta_class.name_related_classes(context)
+        return meta_class
+
+    @classmethod
+    def from_jsonl_parallel(cls, name: str, lines: Iterable[Union[str, bytes]], executor: Optional[Executor] = None,
+                            chunk_size: int = 10000, context: Optional[GenerationContext] = None,
+                            max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        """
+        Infer a class from JSON Lines like from_jsonl, but decoding and inferring chunks of lines in parallel, by
+        default in a process pool of max_workers. No values are retained, so there are no examples, but the context
+        given is left as it is.
+        """
+        from constructor.schema import infer_jsonl_schema
+
+        lines = iter(lines)
+        chunks = iter(lambda: list(islice(lines, chunk_size)), [])
+        context = context.fork() if context is not None else GenerationContext()
+        context.retain_values = RetainValues(0)
+        record_type = cls.infer_chunks(partial(infer_jsonl_schema, enum_limit=context.enum_limit), chunks, name,
+                                       executor, context, max_workers, max_pending)
+        if record_type is None:
+            raise NotImplementedError("JSON Lines input must contain at least one record")
+        meta_class = record_type.object_class
+        meta_class.rename(name)
+        meta_class.name_related_classes(context)
+        return meta_class
+
+    @staticmethod
+    def infer_chunks(infer: Callable[[Union[List, str]], Optional[dict]], chunks: Iterable[Union[List, str]],
+                     field_name: str, executor: Optional[Executor], context: GenerationContext,
+                     max_workers: Optional[int] = None, max_pending: Optional[int] = None) -> Optional[Type]:
+        """
+        Run infer on every chunk with the executor, or a process pool of max_workers if there is none, and merge the
+        partial schemas it returns in the order of the chunks. At most max_pending chunks are submitted at once, by
+        default two per worker, so chunks can be read lazily.
+        """
+        from constructor.schema import schema_to_type
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = 2 * max_workers
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be positive ({max_pending})")
+        if executor is None:
+            with ProcessPoolExecutor(max_workers) as executor:
+                return MetaClass.infer_chunks(infer, chunks, field_name, executor, context, max_workers, max_pending)
+
+        pending = deque()
+        merged = None
+        chunks = iter(chunks)
+        while True:
+            while len(pending) < max_pending:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append(executor.submit(infer, chunk))
+            if not pending:
+                return merged
+            schema = pending.popleft().result()
+            if schema is not None:
+                t = schema_to_type(schema, field_name=field_name, context=context)
+                merged = t if merged is None else merged.merge(t)
+
+    def merge(self, other: 'MetaClass') -> 'MetaClass':
+        """
+        Combine the fields inferred from another sample of this class into this class and return it. Fields missing
+        from either sample are kept, with the number of samples they were seen in.
+        """
+        for field, t in other.fields.items():
+            if field in self.fields:
+                self.fields[field] = self.fields[field].merge(t)
+            else:
+                self.fields[field] = t
+        self.samples += other.samples
+        return self
+
+    def to_schema(self) -> dict:
+        """
+        Return the partial schema of an object of this class, see Type.to_schema. Fields are ordered by the earliest
+        position they were seen at, then by name, so the order does not depend on the order of merging.
+        """
+        fields = sorted(self.fields.values(), key=lambda t: (t.position, t.original_name))
+        return {"type": Object.schema_name, "count": self.samples, "statistics": {},
+                "fields": {t.original_name: {**t.to_schema(), "position": t.position} for t in fields}}
+
+    def to_sketch(self) -> dict:
+        """
+        Return a versioned summary of this class without any values, which can be saved as JSON and merged with the
+        sketches of other samples of the same data using from_sketches
+        """
+        from constructor.schema import SKETCH_FORMAT, SKETCH_VERSION
+
+        return {"format": SKETCH_FORMAT, "version": SKETCH_VERSION, "name": self.original_name,
+                "schema": self.to_schema()}
+
+    @classmethod
+    def from_sketches(cls, sketches: Iterable[Union[dict, TextIO]], context: Optional[GenerationContext] = None):
+        """
+        Merge sketches from to_sketch, or open files containing them, into the class they summarize. The result does
+        not depend on the order of the sketches. Sketches hold no values, so there are no examples, but the context
+        given is left as it is.
+        """
+        from constructor.schema import merge_sketches, schema_to_type
+
+        sketch = merge_sketches(sketches)
+        context = context.fork() if context is not None else GenerationContext()
+        context.retain_values = RetainValues(0)
+        meta_class = schema_to_type(sketch["schema"], field_name=sketch["name"], context=context).object_class
+        meta_class.rename(sketch["name"])
+        meta_class.name_related_classes(context)
+        return meta_class
+
+    def is_optional(self, t: Type) -> bool:
+        """
+        Return whether the given field was missing from some of the objects this class was inferred from
+        """
+        return t.count < self.samples
+
+    def absent_rate(self, t: Type) -> float:
+        """
+        Return the fraction of the objects this class was inferred from which were missing the given field
+        """
+        return 1 - t.count / self.samples
+
+    @staticmethod
+    def get_items_name(name: str) -> str:
+        """
+        Return the name of the field holding the items of a top-level array
+        """
+        items_name = pluralize(name)
+        if singularize(items_name) == name:
+            items_name = "items"
+        return items_name
+
+    def name_related_classes(self, context: GenerationContext, top_level: bool = True):
+        """
+        Give every class used by the fields of this class a unique name, innermost classes first, then specialize
+        the fields of each class once it has its final name
+        """
+        for t in self.fields.values():
+            for field_type in t.embedded_objects:
+                related_class = field_type.object_class
+                related_class.name_related_classes(context, top_level=False)
+                related_class.name_uniquely(context)
+                related_class.specialize_fields(context)
+        if top_level:
+            self.specialize_fields(context)
+            self.use_json_writer(self.c_name)
+            if context.c_arena:
+                self.use_arena(self.c_name)
+            if context.c_parser:
+                self.use_c_parser(self.c_name)
+
+    def specialize_fields(self, context: GenerationContext):
+        """
+        Turn string fields with few enough distinct values into enums named after this class, use the narrowest
+        integer types if the context asks for compact numbers, and lay out structs as the context asks
+        """
+        self.fields = {field: t.to_enums(self.name) for field, t in self.fields.items()}
+        for t in self.fields.values():
+            if context.compact_numbers:
+                t.use_compact_types()
+            if context.inline_arrays:
+                t.use_inline_storage()
+        for field, t in self.get_c_fields().items():
+            t.name_c_items(f"{self.c_name}{any_to_upper_camel(field)}Item")
+        self.minimize_padding = context.minimize_padding
+
+    def use_arena(self, name: str):
+        """
+        Generate C constructors building this class and its related classes in the arena named after the given class
+        """
+        self.arena_name = name
+        for t in self.fields.values():
+            for field_type in t.embedded_objects:
+                field_type.object_class.use_arena(name)
+
+    def use_json_writer(self, name: str):
+        """
+        Generate C JSON writers for this class and its related classes, sharing helpers named after the given class
+        """
+        self.writer_name = name
+        for t in self.fields.values():
+            for field_type in t.embedded_objects:
+                field_type.object_class.use_json_writer(name)
+
+    def use_c_parser(self, name: str):
+        """
+        Generate C JSON parsers for this class and its related classes, sharing helpers named after the given class
+        """
+        self.parser_name = name
+        for t in self.fields.values():
+            t.use_c_parser(name)
+            for field_type in t.embedded_objects:
+                field_type.object_class.use_c_parser(name)
+
+    def name_uniquely(self, context: GenerationContext):
+        class_name = self.original_name
+        self.rename(class_name)
+        signature = self.get_name_and_field_signature()
+        if signature in context.class_signatures_to_name:
+            self.name = context.class_signatures_to_name[signature]
+        else:
+            if class_name not in context.unique_classnames:
+                context.unique_classnames.add(class_name)
+            else:
+                i = 2
+                while f"{class_name}{i}" in context.unique_classnames:
+                    i += 1
+                self.name = f"{any_to_upper_camel(class_name)}{i}"
+                context.unique_classnames.add(f"{class_name}{i}")
+            context.class_signatures_to_name[signature] = self.name
 
     class Decorators:
         @classmethod
         def handle_visit(cls, language: str):
             def handle_visited_language(decorated):
-                def wrapper(self: 'MetaClass'):
-                    top_level, visited = self.handle_visit_start(language)
-                    if visited:
-                        result = ''
-                    else:
-                        result = decorated(self, top_level)
-                        self.handle_visit_end(language, top_level)
-                    return result
+                @wraps(decorated)
+                def wrapper(self: 'MetaClass', context: Optional[GenerationContext] = None) -> Iterator[str]:
+                    if context is None:
+                        context = self.context
+                    if language not in context.printed_signatures:
+                        # Every top level call tracks its own printed classes so calls can run concurrently
+                        context = context.fork()
+                    top_level, visited = self.handle_visit_start(language, context)
+                    if not visited:
+                        yield from decorated(self, top_level, context)
+                        self.handle_visit_end(language, context, top_level)
 
                 return wrapper
 
             return handle_visited_language
 
     # Core methods for generating code
+    def generate_python(self, context: Optional[GenerationContext] = None) -> str:
+        return '\n'.join(self.iter_python_lines(context))
+
+    def generate_java(self, context: Optional[GenerationContext] = None) -> str:
+        return '\n'.join(self.iter_java_lines(context))
+
+    def generate_go(self, context: Optional[GenerationContext] = None) -> str:
+        return '\n'.join(self.iter_go_lines(context))
+
+    def generate_c(self, context: Optional[GenerationContext] = None) -> str:
+        return '\n'.join(self.iter_c_lines(context))
+
+    # Streaming equivalents of the core methods, writing each line as soon as it is generated
+    def generate_python_to(self, fp: TextIO, context: Optional[GenerationContext] = None):
+        write_lines(fp, self.iter_python_lines(context))
+
+    def generate_java_to(self, fp: TextIO, context: Optional[GenerationContext] = None):
+        write_lines(fp, self.iter_java_lines(context))
+
+    def generate_go_to(self, fp: TextIO, context: Optional[GenerationContext] = None):
+        write_lines(fp, self.iter_go_lines(context))
+
+    def generate_c_to(self, fp: TextIO, context: Optional[GenerationContext] = None):
+        write_lines(fp, self.iter_c_lines(context))
+
+    def build_python_module(self, context: Optional[GenerationContext] = None,
+                            cache_dir: Optional[str] = None) -> ModuleType:
+        """
+        Return a new module holding the generated Python classes, ready to use without writing them to a file. The
+        compiled code is cached by a fingerprint of the schema, in memory and also in cache_dir if one is given, so
+        building the classes of the same schema again, even in another process, skips generating and compiling it.
+        """
+        from constructor.runtime import build_python_module
+
+        return build_python_module(self, context if context is not None else self.context, cache_dir)
+
     @Decorators.handle_visit('python')
-    def generate_python(self, top_level: bool) -> str:
-        lines = []
+    def iter_python_lines(self, top_level: bool, context: GenerationContext) -> Iterator[str]:
         if top_level:
-            lines += self.generate_python_import_lines()
-        lines += self.generate_python_related_classes_lines()
-        lines += self.generate_python_class_lines()
-        if top_level:
-            lines += self.generate_python_main_function_lines()
-        return '\n'.join(lines)
+            yield from self.generate_python_import_lines(context.python_columns, context.python_lazy)
+        yield from self.generate_python_related_classes_lines(context)
+        yield from self.generate_python_enum_lines()
+        yield from self.generate_python_class_lines(context.python_slots, context.python_lazy)
+        if context.python_columns and self.fields:
+            yield ''
+            yield from self.generate_python_columns_lines()
+        if top_level and context.python_main:
+            yield from self.generate_python_main_function_lines()
 
     @Decorators.handle_visit('java')
-    def generate_java(self, top_level: bool) -> str:
-        lines = []
+    def iter_java_lines(self, top_level: bool, context: GenerationContext) -> Iterator[str]:
         if top_level:
-            lines += self.generate_java_import_lines()
+            yield from self.generate_java_import_lines(context.java_json)
         class_scope = 'public' if top_level else ''
         generate_main_method = top_level
-        lines += self.generate_java_class_lines(class_scope, generate_main_method)
-        lines += self.generate_java_related_classes_lines()
-        return '\n'.join(lines)
+        yield from self.generate_java_class_lines(class_scope, generate_main_method, context.java_json)
+        yield from self.generate_java_enum_lines()
+        yield from self.generate_java_related_classes_lines(context)
+        if top_level and context.java_json:
+            yield ''
+            yield from self.generate_java_json_helper_lines()
 
     @Decorators.handle_visit('go')
-    def generate_go(self, top_level: bool) -> str:
-        lines = []
+    def iter_go_lines(self, top_level: bool, context: GenerationContext) -> Iterator[str]:
         if top_level:
-            lines.append(self.generate_go_package_line())
-            lines.append('')
-        lines += self.generate_go_related_structs_lines()
-        lines += self.generate_go_struct_lines()
-        lines += self.generate_go_constructor_lines()
+            yield self.generate_go_package_line()
+            yield ''
+            if context.go_json:
+                yield from self.generate_go_json_helper_lines()
+        yield from self.generate_go_related_structs_lines(context)
+        yield from self.generate_go_enum_lines()
+        yield from self.generate_go_struct_lines()
+        yield from self.generate_go_constructor_lines()
+        if context.go_json:
+            yield ''
+            yield from self.generate_go_json_lines()
         if top_level:
-            lines += self.generate_go_main_function_lines()
-        return '\n'.join(lines)
+            yield from self.generate_go_main_function_lines()
 
     @Decorators.handle_visit('c')
-    def generate_c(self, top_level: bool) -> str:
-        lines = []
+    def iter_c_lines(self, top_level: bool, context: GenerationContext) -> Iterator[str]:
         if top_level:
-            lines += self.generate_c_import_lines()
-        lines += self.generate_c_related_structs_lines()
-        lines += self.generate_c_struct_lines()
-        lines += self.generate_c_constructor_lines()
-        lines += self.generate_c_struct_print_function()
+            yield from self.generate_c_import_lines()
+            if self.arena_name:
+                yield from self.generate_c_arena_lines()
+            yield from self.generate_c_json_writer_lines()
+            if self.parser_name:
+                yield from self.generate_c_json_parser_lines()
+        yield from self.generate_c_related_structs_lines(context)
+        yield from self.generate_c_enum_lines()
+        yield from self.generate_c_struct_lines()
+        yield from self.generate_c_constructor_lines()
+        yield from self.generate_c_to_json_lines()
+        if self.parser_name:
+            yield from self.generate_c_from_json_lines()
         if top_level:
-            lines += self.generate_c_example_code_lines()
-        return '\n'.join(lines)
+            yield from self.generate_c_example_code_lines()
+
+    def generate_all(self, languages: Iterable[str] = LANGUAGES,
+                     executor: Optional[Executor] = None) -> Dict[str, str]:
+        """
+        Generate code for several languages at once, returning the code for each language by name. The emitters are
+        pure Python, so only processes run them in parallel: by default a process pool is started for the call, or
+        they run one after another when there is only one language or core. Callers generating code often should pass
+        a long-lived ProcessPoolExecutor instead, since starting processes costs more than generating small classes;
+        a ThreadPoolExecutor is safe, but takes as long as running the emitters one after another.
+        """
+        languages = tuple(languages)
+        for language in languages:
+            if language not in LANGUAGES:
+                raise NotImplementedError(f"{language!r} is not a supported language")
+        if executor is None:
+            workers = min(len(languages), os.cpu_count() or 1)
+            if workers <= 1:
+                return {language: getattr(self, f"generate_{language}")() for language in languages}
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                return self.generate_all(languages, executor)
+        if isinstance(executor, ProcessPoolExecutor):
+            # Submitting bound methods would pickle this class, with every value it retains, once for each language
+            pickled = pickle.dumps(self)
+            futures = {language: executor.submit(MetaClass.generate_pickled, pickled, language)
+                       for language in languages}
+        else:
+            futures = {language: executor.submit(getattr(self, f"generate_{language}")) for language in languages}
+        return {language: future.result() for language, future in futures.items()}
+
+    @staticmethod
+    def generate_pickled(pickled: bytes, language: str) -> str:
+        """
+        Generate code for a language from a pickled MetaClass, see generate_all
+        """
+        return getattr(pickle.loads(pickled), f"generate_{language}")()
 
     # Supplemental methods and functions to make generating code easier
-    def handle_visit_start(self, language: str) -> Tuple[bool, bool]:
+    def handle_visit_start(self, language: str, context: GenerationContext) -> Tuple[bool, bool]:
+        printed_signatures = context.printed_signatures
         visited = False
-        top_level = language not in PRINTED_SIGNATURES
+        top_level = language not in printed_signatures
         if top_level:
-            PRINTED_SIGNATURES[language] = {self.get_name_and_field_signature()}
-        elif self.get_name_and_field_signature() in PRINTED_SIGNATURES[language]:
+            printed_signatures[language] = {self.get_name_and_field_signature()}
+        elif self.get_name_and_field_signature() in printed_signatures[language]:
             visited = True
         else:
-            PRINTED_SIGNATURES[language].add(self.get_name_and_field_signature())
+            printed_signatures[language].add(self.get_name_and_field_signature())
         return top_level, visited
 
-    def handle_visit_end(self, language, top_level):
+    def handle_visit_end(self, language: str, context: GenerationContext, top_level: bool):
         if top_level:
-            del PRINTED_SIGNATURES[language]
+            del context.printed_signatures[language]
 
     @property
     def python_name(self) -> str:
@@ -161,14 +609,32 @@ class MetaClass:
         return {add_suffix_to_reserved_python_words(camel_to_lower_snake(field), "_field"): t for field, t in
                 self.fields.items()}
 
+    def get_python_lazy_fields(self) -> Dict[str, Type]:
+        """
+        Return the Python fields which lazy classes build on first access, by the names of the attributes holding them
+        """
+        return {f"_{field}_value": t for field, t in self.get_python_fields().items() if t.python_lazy}
+
+    def get_python_signature(self, columns=False) -> list:
+        """
+        Return everything the generated Python code of this class and its related classes depends on besides their
+        values, as plain data which is the same in every process
+        """
+        return [self.python_name, [[field, t.original_name, self.is_optional(t), t.python_signature(columns)]
+                                   for field, t in self.get_python_fields().items()]]
+
     def get_python_imports(self) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]], Dict[str, Set[str]]]:
         i_standard = {}
         i_third_party = {}
         i_local = {}
-        for field_type in self.fields.values():
-            i_standard.update(field_type.python_imports[0])
-            i_third_party.update(field_type.python_imports[1])
-            i_local.update(field_type.python_imports[2])
+        field_imports = [field_type.python_imports for field_type in self.fields.values()]
+        if any(self.is_optional(t) for t in self.fields.values()):
+            field_imports.append(({"typing": {"Optional"}}, {}, {}))
+        # Several fields may need different names from the same module
+        for imports in field_imports:
+            for i_group, field_group in zip((i_standard, i_third_party, i_local), imports):
+                for key, values in field_group.items():
+                    i_group.setdefault(key, set()).update(values)
         return i_standard, i_third_party, i_local
 
     def get_java_fields(self) -> Dict[str, Type]:
@@ -186,12 +652,53 @@ class MetaClass:
     def get_c_fields(self) -> Dict[str, Type]:
         return {camel_to_lower_snake(field): t for field, t in self.fields.items()}
 
+    def get_c_struct_fields(self) -> Dict[str, Type]:
+        """
+        Return the C fields in the order they are declared in the struct, by decreasing alignment if padding is
+        minimized, which leaves no padding between fields whose sizes are multiples of their alignment
+        """
+        if not self.minimize_padding:
+            return self.get_c_fields()
+        return dict(sorted(self.get_c_fields().items(), key=lambda item: -item[1].c_layout[1]))
+
+    def get_go_struct_fields(self) -> Dict[str, Type]:
+        """
+        Return the Go fields in the order they are declared in the struct, see get_c_struct_fields
+        """
+        if not self.minimize_padding:
+            return self.get_go_fields()
+        return dict(sorted(self.get_go_fields().items(), key=lambda item: -item[1].go_layout[1]))
+
+    @property
+    def c_layout(self) -> Tuple[int, int]:
+        """
+        The size and alignment in bytes of the C struct of this class
+        """
+        return struct_layout(t.c_layout for t in self.get_c_struct_fields().values())
+
+    @property
+    def go_layout(self) -> Tuple[int, int]:
+        """
+        The size and alignment in bytes of the Go struct of this class
+        """
+        return struct_layout(t.go_layout for t in self.get_go_struct_fields().values())
+
     def get_c_includes(self) -> List[str]:
-        includes = set()
+        includes = {'stddef.h', 'stdlib.h'} if self.arena_name else set()
+        if self.writer_name or self.parser_name:
+            includes.update({'stdbool.h', 'stdlib.h', 'string.h'})
+        if self.parser_name:
+            includes.update({'ctype.h', 'limits.h'})
         for field_type in self.fields.values():
             includes.update(field_type.c_includes)
         return sorted(includes)
 
+    def get_example_data(self) -> dict:
+        """
+        Return the values the fields of this class were inferred from, keyed by their original names
+        """
+        return {t.original_name: t.value for t in self.fields.values()}
+
     def get_name_and_field_signature(self) -> str:
         """
         Return an arbitrary string unique to the name and fields of this class
@@ -199,27 +706,91 @@ class MetaClass:
         return self.name + '@@@' + str(sorted(self.get_java_fields()))
 
     # Methods to generate code called by core code generation methods
-    def generate_python_class_lines(self) -> List[str]:
+    def generate_python_class_lines(self, slots=False, lazy=False) -> List[str]:
+        # Classes without nested values have nothing to put off
+        lazy = lazy and bool(self.get_python_lazy_fields())
         class_lines = [f"class {self.python_name}:"]
+        if slots:
+            class_lines += self.generate_python_slots_lines(lazy)
         class_lines += self.generate_python_constructor_lines()
-        class_lines += self.generate_python_from_dict_classmethod_lines()
+        if lazy:
+            class_lines += self.generate_python_lazy_from_dict_classmethod_lines()
+        else:
+            class_lines += self.generate_python_from_dict_classmethod_lines()
         class_lines += self.generate_python_from_json_classmethod_lines()
-        class_lines += self.generate_python_to_dict_method_lines()
+        if lazy:
+            class_lines += self.generate_python_lazy_property_lines()
+        class_lines += self.generate_python_to_dict_method_lines(lazy)
         class_lines += self.generate_python_to_json_method_lines()
         class_lines += self.generate_python_repr_method_lines()
         return class_lines
 
-    def generate_python_repr_method_lines(self) -> List[str]:
+    def generate_python_slots_lines(self, lazy=False) -> List[str]:
+        # Works on every version of Python, unlike dataclass(slots=True), and leaves the other methods as they are
+        slots = tuple(self.get_python_fields())
+        if lazy:
+            # Lazy fields are properties of the class, held in other attributes along with the raw dict
+            lazy_fields = self.get_python_lazy_fields()
+            slots = ('_raw', *(field for field in slots if f"_{field}_value" not in lazy_fields), *lazy_fields)
+        return [indent(1) + f"__slots__ = {slots!r}", '']
+
+    def generate_python_lazy_from_dict_classmethod_lines(self) -> List[str]:
+        """
+        A from_dict keeping the dict it is given, and only reading the values from_dict would use as they are
+        """
+        lazy_fields = self.get_python_lazy_fields()
+        lines = ['',
+                 indent(1) + '@classmethod',
+                 indent(1) + "def from_dict(cls, d: dict):",
+                 indent(2) + "instance = cls.__new__(cls)",
+                 indent(2) + "instance._raw = d"]
+        for field, t in self.get_python_fields().items():
+            if f"_{field}_value" in lazy_fields:
+                field, value = f"_{field}_value", "_NOT_BUILT"
+            else:
+                value = t.to_python_from_dict_value()
+            if self.is_optional(t):
+                value = f"{value} if {t.original_name!r} in d else None"
+            lines.append(indent(2) + f"instance.{field} = {value}")
+        lines.append(indent(2) + "return instance")
+        return lines
+
+    def generate_python_lazy_property_lines(self) -> List[str]:
+        """
+        Properties building the nested values of a lazy class from its raw dict when they are first read
+        """
+        lines = []
+        lazy_fields = self.get_python_lazy_fields()
+        for field, t in self.get_python_fields().items():
+            attribute = f"_{field}_value"
+            if attribute not in lazy_fields:
+                continue
+            python_type = f"Optional[{t.to_python}]" if self.is_optional(t) else t.to_python
+            value = t.to_python_from_dict_value(f"self._raw[{t.original_name!r}]")
+            lines += ['',
+                      indent(1) + "@property",
+                      indent(1) + f"def {field}(self) -> {python_type}:",
+                      indent(2) + f"if self.{attribute} is _NOT_BUILT:",
+                      indent(3) + f"self.{attribute} = {value}",
+                      indent(2) + f"return self.{attribute}",
+                      '',
+                      indent(1) + f"@{field}.setter",
+                      indent(1) + f"def {field}(self, {field}: {python_type}):",
+                      indent(2) + f"self.{attribute} = {field}"]
+        return lines
+
+    def generate_python_repr_method_lines(self, name: Optional[str] = None) -> List[str]:
+        name = name or self.python_name
         repr_lines = ['',
                       indent(1) + "def __repr__(self):"]
         if self.fields:
-            repr_lines.append(indent(2) + f"return f\"{self.python_name}(\" \\")
+            repr_lines.append(indent(2) + f"return f\"{name}(\" \\")
             for field, t in self.get_python_fields().items():
                 # 7 is the number of spaces in "return "
                 repr_lines.append(indent(1) + " " * 7 + f"f\"{field}={{self.{field}!r}}, \" \\")
             repr_lines[-1] = repr_lines[-1].rstrip(", \" \\") + ")\""
         else:
-            repr_lines.append(indent(2) + f"return f\"{self.python_name}()\"")
+            repr_lines.append(indent(2) + f"return f\"{name}()\"")
         return repr_lines
 
     def generate_python_to_json_method_lines(self) -> List[str]:
@@ -228,19 +799,44 @@ class MetaClass:
                          "return json.dumps(self.to_dict())"]
         return to_json_lines
 
-    def generate_python_to_dict_method_lines(self) -> List[str]:
+    def generate_python_to_dict_method_lines(self, lazy=False) -> List[str]:
         to_dict_lines = ['',
                          indent(1) + "def to_dict(self) -> dict:"]
-        if self.fields:
-            first_item_prefix = indent(2) + "return {"
-            other_item_prefix = indent(2) + "        "
-            for field, t in self.get_python_fields().items():
-                k, v = t.to_python_to_dict_pair(field)
+        # Nested values of lazy classes which were never built are returned as they were in the raw dict
+        fields = self.get_python_fields()
+        if lazy:
+            lazy_fields = self.get_python_lazy_fields()
+            fields = {f"_{field}_value" if f"_{field}_value" in lazy_fields else field: t
+                      for field, t in fields.items()}
+        else:
+            lazy_fields = {}
+
+        def to_dict_pair(field: str, t: Type) -> Tuple[str, str]:
+            k, v = t.to_python_to_dict_pair(field)
+            if field in lazy_fields:
+                v = f"self._raw[{k!r}] if self.{field} is _NOT_BUILT else {v}"
+            return k, v
+
+        required_fields = {field: t for field, t in fields.items() if not self.is_optional(t)}
+        optional_fields = {field: t for field, t in fields.items() if self.is_optional(t)}
+        # Optional fields are left out when they are None, like they were in the data
+        returned = "d = " if optional_fields else "return "
+        if required_fields:
+            first_item_prefix = indent(2) + returned + "{"
+            other_item_prefix = indent(2) + " " * len(returned) + " "
+            for field, t in required_fields.items():
+                k, v = to_dict_pair(field, t)
                 to_dict_lines.append(f"{first_item_prefix or other_item_prefix}{k!r}: {v}, ")
                 first_item_prefix = ""
             to_dict_lines[-1] = to_dict_lines[-1].rstrip(", ") + "}"
         else:
-            to_dict_lines.append(indent(2) + "return {}")
+            to_dict_lines.append(indent(2) + returned + "{}")
+        if optional_fields:
+            for field, t in optional_fields.items():
+                k, v = to_dict_pair(field, t)
+                to_dict_lines += [indent(2) + f"if self.{field} is not None:",
+                                  indent(3) + f"d[{k!r}] = {v}"]
+            to_dict_lines.append(indent(2) + "return d")
         return to_dict_lines
 
     def generate_python_from_json_classmethod_lines(self) -> List[str]:
@@ -256,7 +852,10 @@ class MetaClass:
         string_body = indent(2) + f"return cls("
         if self.fields:
             for field, t in self.get_python_fields().items():
-                string_body += f"{field}={t.to_python_from_dict_value()}, "
+                value = t.to_python_from_dict_value()
+                if self.is_optional(t):
+                    value = f"{value} if {t.original_name!r} in d else None"
+                string_body += f"{field}={value}, "
         string_body = string_body.rstrip(", ") + ")"
         from_dict_lines.append(string_body)
         return from_dict_lines
@@ -265,7 +864,8 @@ class MetaClass:
         constructor_lines = [indent(1) + "def __init__(self, "]
         if self.fields:
             for field, t in self.get_python_fields().items():
-                constructor_lines[0] += f"{field}: {t.to_python}, "
+                python_type = f"Optional[{t.to_python}]" if self.is_optional(t) else t.to_python
+                constructor_lines[0] += f"{field}: {python_type}, "
                 constructor_lines.append(indent(2) + f"self.{field} = {field}")
         else:
             constructor_lines.append(indent(2) + "pass")
@@ -273,6 +873,66 @@ class MetaClass:
         constructor_lines[0] = constructor_lines[0].rstrip(', ') + "):"
         return constructor_lines
 
+    def generate_python_columns_lines(self) -> List[str]:
+        """
+        A class holding many records of this class as a column per field, numbers in arrays of the narrowest type
+        holding the values seen and anything else in lists, and a class viewing one record of it like an instance of
+        this class
+        """
+        columns, row = f"{self.python_name}Columns", f"{self.python_name}Row"
+        fields = self.get_python_fields()
+        lines = [f"class {columns}:",
+                 indent(1) + "def __init__(self):"]
+        for field, t in fields.items():
+            # Optional fields are None when they are missing, which arrays cannot hold
+            if t.python_typecode and not self.is_optional(t):
+                lines.append(indent(2) + f"self.{field} = array({t.python_typecode!r})")
+            else:
+                python_type = f"Optional[{t.to_python}]" if self.is_optional(t) else t.to_python
+                lines.append(indent(2) + f"self.{field}: List[{python_type}] = []")
+        lines += ['',
+                  indent(1) + "@classmethod",
+                  indent(1) + f"def from_records(cls, records: Iterable[dict]) -> '{columns}':",
+                  indent(2) + "columns = cls()",
+                  indent(2) + "for d in records:"]
+        for field, t in fields.items():
+            value = t.to_python_from_dict_value()
+            if self.is_optional(t):
+                value = f"{value} if {t.original_name!r} in d else None"
+            lines.append(indent(3) + f"columns.{field}.append({value})")
+        lines += [indent(2) + "return columns",
+                  '',
+                  indent(1) + "def __len__(self) -> int:",
+                  indent(2) + f"return len(self.{next(iter(fields))})",
+                  '',
+                  indent(1) + f"def __getitem__(self, index: int) -> '{row}':",
+                  indent(2) + "if index < 0:",
+                  indent(3) + "index += len(self)",
+                  indent(2) + "if not 0 <= index < len(self):",
+                  indent(3) + f"raise IndexError(f\"{columns} index out of range ({{index}})\")",
+                  indent(2) + f"return {row}(self, index)",
+                  '',
+                  indent(1) + "def to_records(self) -> List[dict]:",
+                  indent(2) + f"return [{row}(self, index).to_dict() for index in range(len(self))]",
+                  '',
+                  f"class {row}:",
+                  indent(1) + "__slots__ = ('_columns', '_index')",
+                  '',
+                  indent(1) + f"def __init__(self, columns: '{columns}', index: int):",
+                  indent(2) + "self._columns = columns",
+                  indent(2) + "self._index = index"]
+        for field, t in fields.items():
+            python_type = f"Optional[{t.to_python}]" if self.is_optional(t) else t.to_python
+            lines += ['',
+                      indent(1) + "@property",
+                      indent(1) + f"def {field}(self) -> {python_type}:",
+                      indent(2) + f"return self._columns.{field}[self._index]"]
+        # The properties have the names of the attributes of this class, so the same methods work on them
+        lines += self.generate_python_to_dict_method_lines()
+        lines += self.generate_python_to_json_method_lines()
+        lines += self.generate_python_repr_method_lines(row)
+        return lines
+
     def generate_python_main_function_lines(self) -> List[str]:
         main_function_lines = ['',
                                'def main():']
@@ -283,19 +943,23 @@ class MetaClass:
         main_function_lines.append(indent(1) + "main()")
         return main_function_lines
 
-    def generate_python_related_classes_lines(self) -> List[str]:
-        related_object_definitions = []
+    def generate_python_related_classes_lines(self, context: GenerationContext) -> Iterator[str]:
         for field, t in self.get_c_fields().items():
             for field_type in t.embedded_objects:
-                object_string = field_type.object_class.generate_python()
-                if object_string:
-                    related_object_definitions.append(object_string)
-                    related_object_definitions.append('')
-        return related_object_definitions
+                yield from pad_lines(field_type.object_class.iter_python_lines(context), after=True)
 
-    def generate_python_import_lines(self) -> List[str]:
+    def generate_python_enum_lines(self) -> Iterator[str]:
+        for t in self.fields.values():
+            for enum in t.embedded_enums:
+                yield from pad_lines(enum.generate_python_lines(), after=True)
+
+    def generate_python_import_lines(self, columns=False, lazy=False) -> List[str]:
         import_lines = ['import json']
-        for import_group in self.get_python_imports():
+        python_imports = self.get_python_imports()
+        if columns:
+            for key, values in (("array", {"array"}), ("typing", {"Iterable", "List", "Optional"})):
+                python_imports[0].setdefault(key, set()).update(values)
+        for import_group in python_imports:
             if not import_group:
                 continue
             for key, values in import_group.items():
@@ -303,6 +967,12 @@ class MetaClass:
                     continue
                 import_lines.append(self.generate_python_import_line(key, sorted(values)))
             import_lines.append('')
+        if lazy:
+            if import_lines[-1]:
+                import_lines.append('')
+            import_lines += ["# Stands in for the nested values of lazy classes until they are built from the raw dict",
+                             "_NOT_BUILT = object()",
+                             '']
         return import_lines
 
     def generate_python_import_line(self, key: str, values: List[str]) -> str:
@@ -312,43 +982,57 @@ class MetaClass:
         import_line = import_line[:-2]
         return import_line
 
-    def generate_python_object(self) -> str:
-        line = f"{self.python_name}("
-        for field, t in self.get_python_fields().items():
-            line += f"{field}={t.to_python_value}, "
-        line = line.rstrip(", ") + ")"
-        return line
+    def generate_python_object(self, data: dict) -> str:
+        out = StringIO()
+        self.write_python_object(data, out)
+        return out.getvalue()
+
+    def write_python_object(self, data: dict, out: TextIO):
+        out.write(f"{self.python_name}(")
+        for i, (field, t) in enumerate(self.get_python_fields().items()):
+            if i:
+                out.write(", ")
+            out.write(f"{field}=")
+            t.write_python_literal(t.or_default(data.get(t.original_name)), out)
+        out.write(")")
 
     def generate_python_example_lines(self) -> List[str]:
         example_var_name = add_suffix_to_reserved_python_words(camel_to_lower_snake(self.name), "_object")
-        lines = [f"{example_var_name} = {self.generate_python_object()}", f"print({example_var_name})"]
+        lines = [f"{example_var_name} = {self.generate_python_object(self.get_example_data())}",
+                 f"print({example_var_name})"]
         return lines
 
-    def generate_java_object(self) -> str:
-        line = f"new {self.java_name}("
-        for field, t in self.get_java_fields().items():
-            line += f"{t.to_java_value}, "
-        line = line.rstrip(", ") + ")"
-        return line
+    def generate_java_object(self, data: dict) -> str:
+        out = StringIO()
+        self.write_java_object(data, out)
+        return out.getvalue()
+
+    def write_java_object(self, data: dict, out: TextIO):
+        out.write(f"new {self.java_name}(")
+        for i, t in enumerate(self.get_java_fields().values()):
+            if i:
+                out.write(", ")
+            t.write_java_literal(t.or_default(data.get(t.original_name)), out)
+        out.write(")")
 
     def generate_java_example_lines(self) -> List[str]:
         # TODO: Avoid Java keywords and shadowing Java builtins
         test_var_name = any_to_lower_camel(self.name)
-        lines = [f"{self.java_name} {test_var_name} = {self.generate_java_object()};",
+        lines = [f"{self.java_name} {test_var_name} = {self.generate_java_object(self.get_example_data())};",
                  f"System.out.println({test_var_name});"]
         return lines
 
-    def generate_java_related_classes_lines(self) -> List[str]:
-        lines = []
+    def generate_java_related_classes_lines(self, context: GenerationContext) -> Iterator[str]:
         for field, t in self.get_c_fields().items():
             for field_type in t.embedded_objects:
-                string = field_type.object_class.generate_java()
-                if string:
-                    lines.append('')
-                    lines.append(string)
-        return lines
+                yield from pad_lines(field_type.object_class.iter_java_lines(context), before=True)
 
-    def generate_java_class_lines(self, class_scope, generate_main_method) -> List[str]:
+    def generate_java_enum_lines(self) -> Iterator[str]:
+        for t in self.fields.values():
+            for enum in t.embedded_enums:
+                yield from pad_lines(enum.generate_java_lines(), before=True)
+
+    def generate_java_class_lines(self, class_scope, generate_main_method, json_methods=False) -> List[str]:
         lines = [f"{class_scope + ' ' if class_scope else ''}class {self.java_name} {{"]
         lines += self.generate_java_field_lines()
         lines.append('')
@@ -357,19 +1041,58 @@ class MetaClass:
             lines.append('')
             lines += self.generate_java_getter_and_setter_lines()
         lines += self.generate_java_to_string_method_lines()
+        if json_methods:
+            lines += self.generate_java_json_method_lines()
         if generate_main_method:
-            lines += self.generate_java_main_method_lines()
+            lines += self.generate_java_main_method_lines(json_methods)
         lines.append("}")
         return lines
 
-    def generate_java_main_method_lines(self) -> List[str]:
-        lines = [indent(1) + "public static void main(String[] args) {"]
+    def generate_java_main_method_lines(self, json_methods=False) -> List[str]:
+        throws = " throws IOException" if json_methods else ""
+        lines = [indent(1) + f"public static void main(String[] args){throws} {{"]
         for line in self.generate_java_example_lines():
             lines.append(indent(2) + line)
+        if json_methods:
+            lines.append(indent(2) + f"benchmarkJson({any_to_lower_camel(self.name)});")
         lines.append(indent(1) + "}")
         lines.append('')
+        if json_methods:
+            lines += self.generate_java_benchmark_method_lines()
         return lines
 
+    def generate_java_benchmark_method_lines(self) -> List[str]:
+        """
+        A method printing how many times a second the given object can be read from and written to JSON, after as
+        long again to warm up the JIT compiler
+        """
+        return [indent(1) + f"static void benchmarkJson({self.java_name} value) throws IOException {{",
+                indent(2) + "StringBuilder out = new StringBuilder();",
+                indent(2) + "value.toJson(out);",
+                indent(2) + "String json = out.toString();",
+                indent(2) + "System.out.println(json);",
+                indent(2) + "for (int pass = 0; pass < 2; pass++) {",
+                indent(3) + "long reads = 0;",
+                indent(3) + "long end = System.nanoTime() + 1_000_000_000L;",
+                indent(3) + "while (System.nanoTime() < end) {",
+                indent(4) + "value = fromJson(new StringReader(json));",
+                indent(4) + "reads++;",
+                indent(3) + "}",
+                indent(3) + "long writes = 0;",
+                indent(3) + "end = System.nanoTime() + 1_000_000_000L;",
+                indent(3) + "while (System.nanoTime() < end) {",
+                indent(4) + "out.setLength(0);",
+                indent(4) + "value.toJson(out);",
+                indent(4) + "writes++;",
+                indent(3) + "}",
+                indent(3) + "if (pass > 0) {",
+                indent(4) + 'System.out.println("fromJson: " + reads + " records/sec");',
+                indent(4) + 'System.out.println("toJson: " + writes + " records/sec");',
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(1) + "}",
+                '']
+
     def generate_java_to_string_method_lines(self) -> List[str]:
         lines = [indent(1) + "public String toString() {"]
         string_body = indent(2) + f'return "{self.java_name}('
@@ -427,15 +1150,384 @@ class MetaClass:
         ]
         return getter_lines
 
-    def generate_java_import_lines(self) -> List[str]:
+    def generate_java_import_lines(self, json_methods=False) -> List[str]:
         lines = []
-        for java_import in self.get_java_imports():
+        java_imports = self.get_java_imports()
+        if json_methods:
+            # main reads the example back from a string
+            java_imports = sorted({*java_imports, "java.io.IOException", "java.io.Reader", "java.io.StringReader"})
+        for java_import in java_imports:
             lines.append(f"import {java_import};")
         # Add another line if there were imports needed
         if lines:
             lines.append('')
         return lines
 
+    @property
+    def java_json_name(self) -> str:
+        """
+        The name of the Java JSON tokenizer and helpers shared by this class and its related classes
+        """
+        return (self.writer_name or self.java_name) + "Json"
+
+    def generate_java_json_method_lines(self) -> List[str]:
+        json_class = self.java_json_name
+        fields = self.get_java_fields()
+        # Optional fields are left out when they are null, so each is written after a separator set by the one before
+        omit_null = any(self.is_optional(t) and t.java_nonnull(f"this.{field}") for field, t in fields.items())
+        lines = []
+        if fields:
+            lines += [indent(1) + "// Only for readJson, which sets the fields found in the JSON one at a time",
+                      indent(1) + f"private {self.java_name}() {{",
+                      indent(1) + "}",
+                      '']
+        lines += [indent(1) + f"public static {self.java_name} fromJson(Reader reader) throws IOException {{",
+                  indent(2) + f"{json_class} json = new {json_class}(reader);",
+                  indent(2) + f"{self.java_name} value = readJson(json);",
+                  indent(2) + "if (json.peek() != -1) {",
+                  indent(3) + "throw json.syntaxError();",
+                  indent(2) + "}",
+                  indent(2) + "return value;",
+                  indent(1) + "}",
+                  '',
+                  indent(1) + f"static {self.java_name} readJson({json_class} json) throws IOException {{",
+                  indent(2) + f"{self.java_name} value = new {self.java_name}();",
+                  indent(2) + "json.expect('{');",
+                  indent(2) + "if (!json.accept('}')) {",
+                  indent(3) + "do {",
+                  indent(4) + "String key = json.readString();",
+                  indent(4) + "json.expect(':');",
+                  indent(4) + "// null leaves a field as it is",
+                  indent(4) + "if (json.acceptNull()) {",
+                  indent(5) + "continue;",
+                  indent(4) + "}",
+                  indent(4) + "switch (key) {"]
+        for field, t in fields.items():
+            lines.append(indent(5) + f"case {Enum.to_java_string(t.original_name)}:")
+            lines.extend(indent(6) + line for line in t.java_read_lines(f"value.{field}", json_class))
+            lines.append(indent(6) + "break;")
+        lines += [indent(5) + "default:",
+                  indent(6) + "json.skipValue();",
+                  indent(4) + "}",
+                  indent(3) + "} while (json.accept(','));",
+                  indent(3) + "json.expect('}');",
+                  indent(2) + "}",
+                  indent(2) + "return value;",
+                  indent(1) + "}",
+                  '',
+                  indent(1) + "public void toJson(Appendable out) throws IOException {"]
+        if omit_null:
+            lines += [indent(2) + "out.append('{');",
+                      indent(2) + 'String separator = "";']
+        separator = "{"
+        for field, t in fields.items():
+            key = json.dumps(t.original_name) + ":"
+            if omit_null:
+                append_lines = [f"out.append(separator).append({Enum.to_java_string(key)});",
+                                *t.java_write_lines(f"this.{field}", json_class),
+                                'separator = ",";']
+            else:
+                append_lines = [f"out.append({Enum.to_java_string(separator + key)});",
+                                *t.java_write_lines(f"this.{field}", json_class)]
+            condition = t.java_nonnull(f"this.{field}") if self.is_optional(t) else None
+            if condition:
+                lines += [indent(2) + f"if ({condition}) {{",
+                          *(indent(3) + line for line in append_lines),
+                          indent(2) + "}"]
+            else:
+                lines.extend(indent(2) + line for line in append_lines)
+            separator = ","
+        lines += [indent(2) + ("out.append('}');" if fields else 'out.append("{}");'),
+                  indent(1) + "}",
+                  '']
+        return lines
+
+    def generate_java_json_helper_lines(self) -> List[str]:
+        """
+        The tokenizer shared by the readJson methods of every class, reading one token at a time from a buffer of the
+        input, and the writers for the values Java has no JSON form of
+        """
+        name = self.java_json_name
+        return [f"// Reads JSON one token at a time, and writes strings and doubles as JSON",
+                f"final class {name} {{",
+                indent(1) + 'private static final String HEX_DIGITS = "0123456789abcdef";',
+                "",
+                indent(1) + "private final Reader reader;",
+                indent(1) + "private final char[] buffer = new char[8192];",
+                indent(1) + "private int position;",
+                indent(1) + "private int limit;",
+                indent(1) + "// The number of characters read before those in the buffer",
+                indent(1) + "private long offset;",
+                indent(1) + "private final StringBuilder text = new StringBuilder();",
+                "",
+                indent(1) + f"{name}(Reader reader) {{",
+                indent(2) + "this.reader = reader;",
+                indent(1) + "}",
+                "",
+                indent(1) + "IOException syntaxError() {",
+                indent(2) + 'return new IOException("Invalid JSON at offset " + (this.offset + this.position));',
+                indent(1) + "}",
+                "",
+                indent(1) + "// The next character without reading past it, or -1 at the end of the input",
+                indent(1) + "private int peekChar() throws IOException {",
+                indent(2) + "if (this.position == this.limit) {",
+                indent(3) + "this.offset += this.limit;",
+                indent(3) + "this.position = 0;",
+                indent(3) + "this.limit = Math.max(this.reader.read(this.buffer, 0, this.buffer.length), 0);",
+                indent(3) + "if (this.limit == 0) {",
+                indent(4) + "return -1;",
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(2) + "return this.buffer[this.position];",
+                indent(1) + "}",
+                "",
+                indent(1) + "private char nextChar() throws IOException {",
+                indent(2) + "if (peekChar() == -1) {",
+                indent(3) + "throw syntaxError();",
+                indent(2) + "}",
+                indent(2) + "return this.buffer[this.position++];",
+                indent(1) + "}",
+                "",
+                indent(1) + "// The next character after any whitespace, without reading past it, or -1 at the end of "
+                            "the input",
+                indent(1) + "int peek() throws IOException {",
+                indent(2) + "int c = peekChar();",
+                indent(2) + "while (c == ' ' || c == '\\t' || c == '\\n' || c == '\\r') {",
+                indent(3) + "this.position++;",
+                indent(3) + "c = peekChar();",
+                indent(2) + "}",
+                indent(2) + "return c;",
+                indent(1) + "}",
+                "",
+                indent(1) + "boolean accept(char c) throws IOException {",
+                indent(2) + "if (peek() != c) {",
+                indent(3) + "return false;",
+                indent(2) + "}",
+                indent(2) + "this.position++;",
+                indent(2) + "return true;",
+                indent(1) + "}",
+                "",
+                indent(1) + "void expect(char c) throws IOException {",
+                indent(2) + "if (!accept(c)) {",
+                indent(3) + "throw syntaxError();",
+                indent(2) + "}",
+                indent(1) + "}",
+                "",
+                indent(1) + "private void expectWord(String word) throws IOException {",
+                indent(2) + "for (int i = 0; i < word.length(); i++) {",
+                indent(3) + "if (nextChar() != word.charAt(i)) {",
+                indent(4) + "throw syntaxError();",
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(1) + "}",
+                "",
+                indent(1) + "boolean acceptNull() throws IOException {",
+                indent(2) + "if (peek() != 'n') {",
+                indent(3) + "return false;",
+                indent(2) + "}",
+                indent(2) + 'expectWord("null");',
+                indent(2) + "return true;",
+                indent(1) + "}",
+                "",
+                indent(1) + "boolean readBoolean() throws IOException {",
+                indent(2) + "int c = peek();",
+                indent(2) + "if (c == 't') {",
+                indent(3) + 'expectWord("true");',
+                indent(3) + "return true;",
+                indent(2) + "}",
+                indent(2) + "if (c == 'f') {",
+                indent(3) + 'expectWord("false");',
+                indent(3) + "return false;",
+                indent(2) + "}",
+                indent(2) + "throw syntaxError();",
+                indent(1) + "}",
+                "",
+                indent(1) + "String readString() throws IOException {",
+                indent(2) + "expect('\"');",
+                indent(2) + "StringBuilder text = this.text;",
+                indent(2) + "text.setLength(0);",
+                indent(2) + "while (true) {",
+                indent(3) + "// Runs of characters which are not escaped are copied from the buffer at once",
+                indent(3) + "int start = this.position;",
+                indent(3) + "while (this.position < this.limit && this.buffer[this.position] != '\"' "
+                            "&& this.buffer[this.position] != '\\\\') {",
+                indent(4) + "this.position++;",
+                indent(3) + "}",
+                indent(3) + "text.append(this.buffer, start, this.position - start);",
+                indent(3) + "char c = nextChar();",
+                indent(3) + "if (c == '\"') {",
+                indent(4) + "return text.toString();",
+                indent(3) + "}",
+                indent(3) + "if (c != '\\\\') {",
+                indent(4) + "// The run ended with the buffer",
+                indent(4) + "text.append(c);",
+                indent(4) + "continue;",
+                indent(3) + "}",
+                indent(3) + "c = nextChar();",
+                indent(3) + "switch (c) {",
+                indent(4) + "case '\"':",
+                indent(4) + "case '\\\\':",
+                indent(4) + "case '/':",
+                indent(5) + "text.append(c);",
+                indent(5) + "break;",
+                indent(4) + "case 'b':",
+                indent(5) + "text.append('\\b');",
+                indent(5) + "break;",
+                indent(4) + "case 'f':",
+                indent(5) + "text.append('\\f');",
+                indent(5) + "break;",
+                indent(4) + "case 'n':",
+                indent(5) + "text.append('\\n');",
+                indent(5) + "break;",
+                indent(4) + "case 'r':",
+                indent(5) + "text.append('\\r');",
+                indent(5) + "break;",
+                indent(4) + "case 't':",
+                indent(5) + "text.append('\\t');",
+                indent(5) + "break;",
+                indent(4) + "case 'u':",
+                indent(5) + "// Characters outside the Basic Multilingual Plane are escaped as surrogate pairs, "
+                            "which Java strings hold as they are",
+                indent(5) + "text.append(readHex());",
+                indent(5) + "break;",
+                indent(4) + "default:",
+                indent(5) + "throw syntaxError();",
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(1) + "}",
+                "",
+                indent(1) + "private char readHex() throws IOException {",
+                indent(2) + "int value = 0;",
+                indent(2) + "for (int i = 0; i < 4; i++) {",
+                indent(3) + "int digit = Character.digit(nextChar(), 16);",
+                indent(3) + "if (digit == -1) {",
+                indent(4) + "throw syntaxError();",
+                indent(3) + "}",
+                indent(3) + "value = value << 4 | digit;",
+                indent(2) + "}",
+                indent(2) + "return (char) value;",
+                indent(1) + "}",
+                "",
+                indent(1) + "// Values outside of min and max are errors, like numbers which are not integers",
+                indent(1) + "long readLong(long min, long max) throws IOException {",
+                indent(2) + "boolean negative = accept('-');",
+                indent(2) + "// Digits are subtracted so that the most negative long can be read as well",
+                indent(2) + "long value = 0;",
+                indent(2) + "int digits = 0;",
+                indent(2) + "for (int c = peekChar(); c >= '0' && c <= '9'; c = peekChar()) {",
+                indent(3) + "if (value < (Long.MIN_VALUE + (c - '0')) / 10) {",
+                indent(4) + "throw syntaxError();",
+                indent(3) + "}",
+                indent(3) + "value = value * 10 - (c - '0');",
+                indent(3) + "this.position++;",
+                indent(3) + "digits++;",
+                indent(2) + "}",
+                indent(2) + "if (digits == 0 || !negative && value == Long.MIN_VALUE) {",
+                indent(3) + "throw syntaxError();",
+                indent(2) + "}",
+                indent(2) + "value = negative ? value : -value;",
+                indent(2) + "if (value < min || value > max) {",
+                indent(3) + "throw syntaxError();",
+                indent(2) + "}",
+                indent(2) + "return value;",
+                indent(1) + "}",
+                "",
+                indent(1) + "double readDouble() throws IOException {",
+                indent(2) + "peek();",
+                indent(2) + "StringBuilder text = this.text;",
+                indent(2) + "text.setLength(0);",
+                indent(2) + "for (int c = peekChar(); c >= '0' && c <= '9' || c == '-' || c == '+' || c == '.' "
+                            "|| c == 'e' || c == 'E'; c = peekChar()) {",
+                indent(3) + "text.append((char) c);",
+                indent(3) + "this.position++;",
+                indent(2) + "}",
+                indent(2) + "try {",
+                indent(3) + "return Double.parseDouble(text.toString());",
+                indent(2) + "} catch (NumberFormatException e) {",
+                indent(3) + "throw syntaxError();",
+                indent(2) + "}",
+                indent(1) + "}",
+                "",
+                indent(1) + "// Reads past the value of a field the class does not have",
+                indent(1) + "void skipValue() throws IOException {",
+                indent(2) + "int c = peek();",
+                indent(2) + "if (c == '\"') {",
+                indent(3) + "readString();",
+                indent(2) + "} else if (c == '{') {",
+                indent(3) + "this.position++;",
+                indent(3) + "if (!accept('}')) {",
+                indent(4) + "do {",
+                indent(5) + "readString();",
+                indent(5) + "expect(':');",
+                indent(5) + "skipValue();",
+                indent(4) + "} while (accept(','));",
+                indent(4) + "expect('}');",
+                indent(3) + "}",
+                indent(2) + "} else if (c == '[') {",
+                indent(3) + "this.position++;",
+                indent(3) + "if (!accept(']')) {",
+                indent(4) + "do {",
+                indent(5) + "skipValue();",
+                indent(4) + "} while (accept(','));",
+                indent(4) + "expect(']');",
+                indent(3) + "}",
+                indent(2) + "} else if (c == 't' || c == 'f') {",
+                indent(3) + "readBoolean();",
+                indent(2) + "} else if (!acceptNull()) {",
+                indent(3) + "readDouble();",
+                indent(2) + "}",
+                indent(1) + "}",
+                "",
+                indent(1) + "// Writes null for null, like any other object",
+                indent(1) + "static void writeString(Appendable out, String value) throws IOException {",
+                indent(2) + "if (value == null) {",
+                indent(3) + 'out.append("null");',
+                indent(3) + "return;",
+                indent(2) + "}",
+                indent(2) + "out.append('\"');",
+                indent(2) + "// Runs of characters which need no escaping are appended at once",
+                indent(2) + "int start = 0;",
+                indent(2) + "for (int i = 0; i < value.length(); i++) {",
+                indent(3) + "char c = value.charAt(i);",
+                indent(3) + "if (c >= 0x20 && c != '\"' && c != '\\\\') {",
+                indent(4) + "continue;",
+                indent(3) + "}",
+                indent(3) + "out.append(value, start, i);",
+                indent(3) + "start = i + 1;",
+                indent(3) + "switch (c) {",
+                indent(4) + "case '\"':",
+                indent(5) + 'out.append("\\\\\\"");',
+                indent(5) + "break;",
+                indent(4) + "case '\\\\':",
+                indent(5) + 'out.append("\\\\\\\\");',
+                indent(5) + "break;",
+                indent(4) + "case '\\n':",
+                indent(5) + 'out.append("\\\\n");',
+                indent(5) + "break;",
+                indent(4) + "case '\\r':",
+                indent(5) + 'out.append("\\\\r");',
+                indent(5) + "break;",
+                indent(4) + "case '\\t':",
+                indent(5) + 'out.append("\\\\t");',
+                indent(5) + "break;",
+                indent(4) + "default:",
+                indent(5) + 'out.append("\\\\u00")'
+                            '.append(HEX_DIGITS.charAt(c >> 4)).append(HEX_DIGITS.charAt(c & 0xf));',
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(2) + "out.append(value, start, value.length()).append('\"');",
+                indent(1) + "}",
+                "",
+                indent(1) + "// JSON has no infinities or NaN, so they are written as null",
+                indent(1) + "static void writeDouble(Appendable out, double value) throws IOException {",
+                indent(2) + "if (Double.isNaN(value) || Double.isInfinite(value)) {",
+                indent(3) + 'out.append("null");',
+                indent(2) + "} else {",
+                indent(3) + "out.append(Double.toString(value));",
+                indent(2) + "}",
+                indent(1) + "}",
+                "}"]
+
     def generate_go_constructor_lines(self) -> List[str]:
         lines = []
         constructor_signature = f"func New{self.go_name}("
@@ -451,41 +1543,595 @@ class MetaClass:
         lines.append("}")
         return lines
 
-    def generate_go_struct_lines(self) -> List[str]:
+    def generate_go_struct_lines(self, renames: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        :param renames: Other names for this struct and the structs of its fields, by their Go names
+        """
+        renames = renames or {}
         lines = []
-        lines.append(f"type {self.go_name} struct {{")
+        if self.minimize_padding:
+            size = struct_layout(t.go_layout for t in self.get_go_fields().values())[0]
+            lines.append(f"// Fields ordered to minimize padding: {self.go_layout[0]} bytes, {size} in JSON order")
+        lines.append(f"type {renames.get(self.go_name, self.go_name)} struct {{")
         struct_lines = []
-        for field, t in self.get_go_fields().items():
-            struct_lines.append(indent(1) + f"{field} {t.to_go} `json:\"{t.original_name}\"`")  # TODO: Scope
+        for field, t in self.get_go_struct_fields().items():
+            tag = f"{t.original_name},omitempty" if self.is_optional(t) else t.original_name
+            # Only the innermost type of slices is a struct
+            item_type = t.to_go.lstrip('[]')
+            go_type = t.to_go[:len(t.to_go) - len(item_type)] + renames.get(item_type, item_type)
+            struct_lines.append(indent(1) + f"{field} {go_type} `json:\"{tag}\"`")  # TODO: Scope
         lines += struct_lines
         lines.append("}")
         lines.append('')
         return lines
 
-    def generate_go_related_structs_lines(self) -> List[str]:
-        lines = []
+    def generate_go_related_structs_lines(self, context: GenerationContext) -> Iterator[str]:
         for field, t in self.get_go_fields().items():
             for field_type in t.embedded_objects:
-                string = field_type.object_class.generate_go()
-                if string:
-                    lines.append(string)
-                    lines.append('')
+                yield from pad_lines(field_type.object_class.iter_go_lines(context), after=True)
+
+    def generate_go_enum_lines(self) -> Iterator[str]:
+        for t in self.fields.values():
+            for enum in t.embedded_enums:
+                yield from pad_lines(enum.generate_go_lines(), after=True)
+
+    @property
+    def go_json_prefix(self) -> str:
+        """
+        The prefix of the Go JSON helpers shared by this class and its related classes
+        """
+        return any_to_lower_camel(self.writer_name or self.go_name)
+
+    def get_example_json(self) -> str:
+        """
+        Return the example data as compact JSON, with defaults for the values which were not kept
+        """
+        return json.dumps({t.original_name: t.or_default(t.value) for t in self.fields.values()},
+                          separators=(',', ':'), ensure_ascii=False)
+
+    def get_go_classes(self, classes: Optional[Dict[str, 'MetaClass']] = None) -> Dict[str, 'MetaClass']:
+        """
+        Return this class and every class used by its fields by their Go names, related classes first
+        """
+        if classes is None:
+            classes = {}
+        for t in self.get_go_fields().values():
+            for field_type in t.embedded_objects:
+                if field_type.object_class.go_name not in classes:
+                    field_type.object_class.get_go_classes(classes)
+        classes[self.go_name] = self
+        return classes
+
+    def generate_go_json_lines(self) -> List[str]:
+        prefix = self.go_json_prefix
+        fields = self.get_go_fields()
+        # Optional fields may be left out, so each is written after a comma and the first comma replaced at the end
+        omit_empty = any(self.is_optional(t) and t.go_nonzero(f"x.{field}") for field, t in fields.items())
+        lines = [f"func (x *{self.go_name}) appendJSON(buf []byte) []byte {{"]
+        if omit_empty:
+            lines.append(indent(1) + "start := len(buf)")
+        separator = "," if omit_empty else "{"
+        for field, t in fields.items():
+            key = separator + json.dumps(t.original_name) + ":"
+            append_lines = [f"buf = append(buf, {json.dumps(key, ensure_ascii=False)}...)",
+                            *t.go_append_lines(f"x.{field}", prefix)]
+            condition = t.go_nonzero(f"x.{field}") if self.is_optional(t) else None
+            if condition:
+                lines += [indent(1) + f"if {condition} {{",
+                          *(indent(2) + line for line in append_lines),
+                          indent(1) + "}"]
+            else:
+                lines.extend(indent(1) + line for line in append_lines)
+            separator = ","
+        if omit_empty:
+            lines += [indent(1) + "if len(buf) == start {",
+                      indent(2) + "buf = append(buf, '{')",
+                      indent(1) + "} else {",
+                      indent(2) + "buf[start] = '{'",
+                      indent(1) + "}",
+                      indent(1) + "return append(buf, '}')"]
+        elif fields:
+            lines.append(indent(1) + "return append(buf, '}')")
+        else:
+            lines.append(indent(1) + 'return append(buf, "{}"...)')
+        lines += ["}",
+                  "",
+                  "// MarshalJSON writes the struct as JSON without reflection",
+                  f"func (x {self.go_name}) MarshalJSON() ([]byte, error) {{",
+                  indent(1) + f"return x.appendJSON(make([]byte, 0, {len(self.get_example_json().encode())})), nil",
+                  "}",
+                  "",
+                  "// UnmarshalJSON replaces the struct with the JSON object in data without reflection, skipping "
+                  "fields it does not have",
+                  f"func (x *{self.go_name}) UnmarshalJSON(data []byte) error {{",
+                  indent(1) + f"r := {prefix}JSONReader{{data: data}}",
+                  *(indent(1) + line for line in go_check("err := x.readJSON(&r)")),
+                  indent(1) + "r.skipWhitespace()",
+                  indent(1) + "if r.pos != len(r.data) {",
+                  indent(2) + "return r.syntaxError()",
+                  indent(1) + "}",
+                  indent(1) + "return nil",
+                  "}",
+                  "",
+                  f"func (x *{self.go_name}) readJSON(r *{prefix}JSONReader) error {{",
+                  indent(1) + f"*x = {self.go_name}{{}}",
+                  *(indent(1) + line for line in go_check("err := r.expect('{')")),
+                  indent(1) + "if r.accept('}') {",
+                  indent(2) + "return nil",
+                  indent(1) + "}",
+                  indent(1) + "for {",
+                  indent(2) + "key, err := r.readStringBytes()",
+                  indent(2) + "if err != nil {",
+                  indent(3) + "return err",
+                  indent(2) + "}",
+                  *(indent(2) + line for line in go_check("err = r.expect(':')")),
+                  indent(2) + "// Like encoding/json, null leaves a field as it is",
+                  indent(2) + "if !r.acceptNull() {",
+                  indent(3) + "switch string(key) {"]
+        for field, t in fields.items():
+            lines.append(indent(3) + f"case {json.dumps(t.original_name, ensure_ascii=False)}:")
+            lines.extend(indent(4) + line for line in t.go_read_lines(f"x.{field}", prefix))
+        lines += [indent(3) + "default:",
+                  *(indent(4) + line for line in go_check("err = r.skipValue()")),
+                  indent(3) + "}",
+                  indent(2) + "}",
+                  indent(2) + "if !r.accept(',') {",
+                  indent(3) + "break",
+                  indent(2) + "}",
+                  indent(1) + "}",
+                  indent(1) + "return r.expect('}')",
+                  "}"]
         return lines
 
-    def generate_c_object(self) -> str:
-        line = f"{self.c_name}_new("
-        for field, t in self.get_c_fields().items():
-            if isinstance(t, Object):
-                line += "*"
-            line += f"{t.to_c_value}, "
-        line = line.rstrip(", ") + ")"
-        return line
+    def generate_go_test(self) -> str:
+        """
+        Generate a Go test file for the code generated with GenerationContext.go_json, checking the JSON methods
+        against encoding/json and benchmarking both with the example data, using copies of the structs without the
+        methods for encoding/json
+        """
+        classes = self.get_go_classes()
+        renames = {name: any_to_lower_camel(name) + "Reflect" for name in classes}
+        example = f"{self.go_json_prefix}ExampleJSON"
+        name, plain = self.go_name, renames[self.go_name]
+        lines = [self.generate_go_package_line(),
+                 "",
+                 "import (",
+                 indent(1) + '"encoding/json"',
+                 indent(1) + '"reflect"',
+                 indent(1) + '"testing"',
+                 ")",
+                 ""]
+        for meta_class in classes.values():
+            lines += meta_class.generate_go_struct_lines(renames)
+        lines += [f"var {example} = []byte({json.dumps(self.get_example_json(), ensure_ascii=False)})",
+                  "",
+                  "// The example read and written again by the generated methods reads the same as the example with "
+                  "encoding/json",
+                  f"func Test{name}JSONMatchesEncodingJSON(t *testing.T) {{",
+                  indent(1) + f"var generated {name}",
+                  indent(1) + f"var expected, actual {plain}",
+                  *(indent(1) + line for line in go_check(f"err := generated.UnmarshalJSON({example})",
+                                                          "t.Fatal(err)")),
+                  indent(1) + "generatedJSON, _ := generated.MarshalJSON()",
+                  indent(1) + f"for _, err := range []error{{json.Unmarshal({example}, &expected), "
+                              f"json.Unmarshal(generatedJSON, &actual)}} {{",
+                  indent(2) + "if err != nil {",
+                  indent(3) + "t.Fatal(err)",
+                  indent(2) + "}",
+                  indent(1) + "}",
+                  indent(1) + "if !reflect.DeepEqual(expected, actual) {",
+                  indent(2) + 't.Errorf("%s was written as %s", ' + example + ', generatedJSON)',
+                  indent(1) + "}",
+                  "}",
+                  ""]
+        for method, target in (("Marshal", name), ("Marshal", plain), ("Unmarshal", name), ("Unmarshal", plain)):
+            generated = target == name
+            lines += [f"func Benchmark{name}{method}{'JSON' if generated else 'EncodingJSON'}(b *testing.B) {{",
+                      indent(1) + f"var value {target}"]
+            if method == "Marshal":
+                lines += [indent(1) + f"if err := json.Unmarshal({example}, &value); err != nil {{",
+                          indent(2) + "b.Fatal(err)",
+                          indent(1) + "}"]
+            lines += [indent(1) + "b.ReportAllocs()",
+                      indent(1) + "b.ResetTimer()",
+                      indent(1) + "for i := 0; i < b.N; i++ {"]
+            if method == "Marshal":
+                call = "value.MarshalJSON()" if generated else "json.Marshal(&value)"
+                lines.append(indent(2) + f"if _, err := {call}; err != nil {{")
+            else:
+                call = f"value.UnmarshalJSON({example})" if generated else f"json.Unmarshal({example}, &value)"
+                lines.append(indent(2) + f"if err := {call}; err != nil {{")
+            lines += [indent(3) + "b.Fatal(err)",
+                      indent(2) + "}",
+                      indent(1) + "}",
+                      "}",
+                      ""]
+        return '\n'.join(lines)
+
+    def generate_go_json_helper_lines(self) -> List[str]:
+        """
+        The imports and helpers shared by the JSON methods of every struct: a reader of single tokens, and appenders
+        for the values strconv has no JSON form of
+        """
+        prefix = self.go_json_prefix
+        reader = f"{prefix}JSONReader"
+        return ["import (",
+                indent(1) + '"fmt"',
+                indent(1) + '"strconv"',
+                indent(1) + '"unicode/utf16"',
+                indent(1) + '"unicode/utf8"',
+                ")",
+                "",
+                f"type {reader} struct {{",
+                indent(1) + "data []byte",
+                indent(1) + "pos  int",
+                "}",
+                "",
+                f"func (r *{reader}) syntaxError() error {{",
+                indent(1) + 'return fmt.Errorf("invalid JSON at offset %d", r.pos)',
+                "}",
+                "",
+                f"func (r *{reader}) skipWhitespace() {{",
+                indent(1) + "for r.pos < len(r.data) {",
+                indent(2) + "switch r.data[r.pos] {",
+                indent(2) + "case ' ', '\\t', '\\n', '\\r':",
+                indent(3) + "r.pos++",
+                indent(2) + "default:",
+                indent(3) + "return",
+                indent(2) + "}",
+                indent(1) + "}",
+                "}",
+                "",
+                f"func (r *{reader}) accept(c byte) bool {{",
+                indent(1) + "r.skipWhitespace()",
+                indent(1) + "if r.pos < len(r.data) && r.data[r.pos] == c {",
+                indent(2) + "r.pos++",
+                indent(2) + "return true",
+                indent(1) + "}",
+                indent(1) + "return false",
+                "}",
+                "",
+                f"func (r *{reader}) expect(c byte) error {{",
+                indent(1) + "if !r.accept(c) {",
+                indent(2) + "return r.syntaxError()",
+                indent(1) + "}",
+                indent(1) + "return nil",
+                "}",
+                "",
+                f"func (r *{reader}) acceptNull() bool {{",
+                indent(1) + "r.skipWhitespace()",
+                indent(1) + 'if len(r.data)-r.pos >= 4 && string(r.data[r.pos:r.pos+4]) == "null" {',
+                indent(2) + "r.pos += 4",
+                indent(2) + "return true",
+                indent(1) + "}",
+                indent(1) + "return false",
+                "}",
+                "",
+                "// readStringBytes returns the contents of a string, which are part of the input unless the string "
+                "has escapes",
+                f"func (r *{reader}) readStringBytes() ([]byte, error) {{",
+                indent(1) + "if !r.accept('\"') {",
+                indent(2) + "return nil, r.syntaxError()",
+                indent(1) + "}",
+                indent(1) + "start := r.pos",
+                indent(1) + "for r.pos < len(r.data) {",
+                indent(2) + "switch r.data[r.pos] {",
+                indent(2) + "case '\"':",
+                indent(3) + "r.pos++",
+                indent(3) + "return r.data[start : r.pos-1], nil",
+                indent(2) + "case '\\\\':",
+                indent(3) + "return r.readEscapedString(start)",
+                indent(2) + "}",
+                indent(2) + "r.pos++",
+                indent(1) + "}",
+                indent(1) + "return nil, r.syntaxError()",
+                "}",
+                "",
+                f"func (r *{reader}) readEscapedString(start int) ([]byte, error) {{",
+                indent(1) + "value := append([]byte(nil), r.data[start:r.pos]...)",
+                indent(1) + "for r.pos < len(r.data) {",
+                indent(2) + "c := r.data[r.pos]",
+                indent(2) + "r.pos++",
+                indent(2) + "if c == '\"' {",
+                indent(3) + "return value, nil",
+                indent(2) + "}",
+                indent(2) + "if c != '\\\\' {",
+                indent(3) + "value = append(value, c)",
+                indent(3) + "continue",
+                indent(2) + "}",
+                indent(2) + "if r.pos == len(r.data) {",
+                indent(3) + "break",
+                indent(2) + "}",
+                indent(2) + "c = r.data[r.pos]",
+                indent(2) + "r.pos++",
+                indent(2) + "switch c {",
+                indent(2) + "case '\"', '\\\\', '/':",
+                indent(3) + "value = append(value, c)",
+                indent(2) + "case 'b':",
+                indent(3) + "value = append(value, '\\b')",
+                indent(2) + "case 'f':",
+                indent(3) + "value = append(value, '\\f')",
+                indent(2) + "case 'n':",
+                indent(3) + "value = append(value, '\\n')",
+                indent(2) + "case 'r':",
+                indent(3) + "value = append(value, '\\r')",
+                indent(2) + "case 't':",
+                indent(3) + "value = append(value, '\\t')",
+                indent(2) + "case 'u':",
+                indent(3) + "code, ok := r.readHex()",
+                indent(3) + "if !ok {",
+                indent(4) + "return nil, r.syntaxError()",
+                indent(3) + "}",
+                indent(3) + "// Characters outside the Basic Multilingual Plane are escaped as surrogate pairs",
+                indent(3) + "if utf16.IsSurrogate(code) && len(r.data)-r.pos >= 6 && r.data[r.pos] == '\\\\' && "
+                            "r.data[r.pos+1] == 'u' {",
+                indent(4) + "r.pos += 2",
+                indent(4) + "low, ok := r.readHex()",
+                indent(4) + "if !ok {",
+                indent(5) + "return nil, r.syntaxError()",
+                indent(4) + "}",
+                indent(4) + "if pair := utf16.DecodeRune(code, low); pair != utf8.RuneError {",
+                indent(5) + "code = pair",
+                indent(4) + "} else {",
+                indent(5) + "r.pos -= 6",
+                indent(4) + "}",
+                indent(3) + "}",
+                indent(3) + "value = utf8.AppendRune(value, code)",
+                indent(2) + "default:",
+                indent(3) + "return nil, r.syntaxError()",
+                indent(2) + "}",
+                indent(1) + "}",
+                indent(1) + "return nil, r.syntaxError()",
+                "}",
+                "",
+                f"func (r *{reader}) readHex() (rune, bool) {{",
+                indent(1) + "if len(r.data)-r.pos < 4 {",
+                indent(2) + "return 0, false",
+                indent(1) + "}",
+                indent(1) + "var value rune",
+                indent(1) + "for _, c := range r.data[r.pos : r.pos+4] {",
+                indent(2) + "switch {",
+                indent(2) + "case '0' <= c && c <= '9':",
+                indent(3) + "value = value<<4 | rune(c-'0')",
+                indent(2) + "case 'a' <= c && c <= 'f':",
+                indent(3) + "value = value<<4 | rune(c-'a'+10)",
+                indent(2) + "case 'A' <= c && c <= 'F':",
+                indent(3) + "value = value<<4 | rune(c-'A'+10)",
+                indent(2) + "default:",
+                indent(3) + "return 0, false",
+                indent(2) + "}",
+                indent(1) + "}",
+                indent(1) + "r.pos += 4",
+                indent(1) + "return value, true",
+                "}",
+                "",
+                f"func (r *{reader}) readString() (string, error) {{",
+                indent(1) + "value, err := r.readStringBytes()",
+                indent(1) + "return string(value), err",
+                "}",
+                "",
+                "// readNumber returns the characters of a number, which strconv checks",
+                f"func (r *{reader}) readNumber() []byte {{",
+                indent(1) + "r.skipWhitespace()",
+                indent(1) + "start := r.pos",
+                indent(1) + "for r.pos < len(r.data) {",
+                indent(2) + "c := r.data[r.pos]",
+                indent(2) + "if (c < '0' || c > '9') && c != '-' && c != '+' && c != '.' && c != 'e' && c != 'E' {",
+                indent(3) + "break",
+                indent(2) + "}",
+                indent(2) + "r.pos++",
+                indent(1) + "}",
+                indent(1) + "return r.data[start:r.pos]",
+                "}",
+                "",
+                f"func (r *{reader}) readInt(bits int) (int64, error) {{",
+                indent(1) + "value, err := strconv.ParseInt(string(r.readNumber()), 10, bits)",
+                indent(1) + "if err != nil {",
+                indent(2) + "return 0, r.syntaxError()",
+                indent(1) + "}",
+                indent(1) + "return value, nil",
+                "}",
+                "",
+                f"func (r *{reader}) readUint(bits int) (uint64, error) {{",
+                indent(1) + "value, err := strconv.ParseUint(string(r.readNumber()), 10, bits)",
+                indent(1) + "if err != nil {",
+                indent(2) + "return 0, r.syntaxError()",
+                indent(1) + "}",
+                indent(1) + "return value, nil",
+                "}",
+                "",
+                f"func (r *{reader}) readFloat() (float64, error) {{",
+                indent(1) + "value, err := strconv.ParseFloat(string(r.readNumber()), 64)",
+                indent(1) + "if err != nil {",
+                indent(2) + "return 0, r.syntaxError()",
+                indent(1) + "}",
+                indent(1) + "return value, nil",
+                "}",
+                "",
+                f"func (r *{reader}) readBool() (bool, error) {{",
+                indent(1) + "r.skipWhitespace()",
+                indent(1) + "rest := r.data[r.pos:]",
+                indent(1) + 'if len(rest) >= 4 && string(rest[:4]) == "true" {',
+                indent(2) + "r.pos += 4",
+                indent(2) + "return true, nil",
+                indent(1) + "}",
+                indent(1) + 'if len(rest) >= 5 && string(rest[:5]) == "false" {',
+                indent(2) + "r.pos += 5",
+                indent(2) + "return false, nil",
+                indent(1) + "}",
+                indent(1) + "return false, r.syntaxError()",
+                "}",
+                "",
+                "// skipValue reads past the value of a field the struct does not have",
+                f"func (r *{reader}) skipValue() error {{",
+                indent(1) + "r.skipWhitespace()",
+                indent(1) + "if r.pos == len(r.data) {",
+                indent(2) + "return r.syntaxError()",
+                indent(1) + "}",
+                indent(1) + "switch r.data[r.pos] {",
+                indent(1) + "case '\"':",
+                indent(2) + "_, err := r.readStringBytes()",
+                indent(2) + "return err",
+                indent(1) + "case '{':",
+                indent(2) + "r.pos++",
+                indent(2) + "if r.accept('}') {",
+                indent(3) + "return nil",
+                indent(2) + "}",
+                indent(2) + "for {",
+                *(indent(3) + line for line in go_check("_, err := r.readStringBytes()")),
+                *(indent(3) + line for line in go_check("err := r.expect(':')")),
+                *(indent(3) + line for line in go_check("err := r.skipValue()")),
+                indent(3) + "if !r.accept(',') {",
+                indent(4) + "return r.expect('}')",
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(1) + "case '[':",
+                indent(2) + "r.pos++",
+                indent(2) + "if r.accept(']') {",
+                indent(3) + "return nil",
+                indent(2) + "}",
+                indent(2) + "for {",
+                *(indent(3) + line for line in go_check("err := r.skipValue()")),
+                indent(3) + "if !r.accept(',') {",
+                indent(4) + "return r.expect(']')",
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(1) + "case 't', 'f':",
+                indent(2) + "_, err := r.readBool()",
+                indent(2) + "return err",
+                indent(1) + "case 'n':",
+                indent(2) + "if !r.acceptNull() {",
+                indent(3) + "return r.syntaxError()",
+                indent(2) + "}",
+                indent(2) + "return nil",
+                indent(1) + "}",
+                indent(1) + "if len(r.readNumber()) == 0 {",
+                indent(2) + "return r.syntaxError()",
+                indent(1) + "}",
+                indent(1) + "return nil",
+                "}",
+                "",
+                f'const {prefix}HexDigits = "0123456789abcdef"',
+                "",
+                f"// {prefix}AppendJSONString appends s as a JSON string, replacing invalid UTF-8 like encoding/json",
+                f"func {prefix}AppendJSONString(buf []byte, s string) []byte {{",
+                indent(1) + "buf = append(buf, '\"')",
+                indent(1) + "// Runs of characters which need no escaping are appended at once",
+                indent(1) + "start := 0",
+                indent(1) + "for i := 0; i < len(s); {",
+                indent(2) + "c := s[i]",
+                indent(2) + "if c >= utf8.RuneSelf {",
+                indent(3) + "code, size := utf8.DecodeRuneInString(s[i:])",
+                indent(3) + "if code == utf8.RuneError && size == 1 {",
+                indent(4) + "buf = append(buf, s[start:i]...)",
+                indent(4) + "buf = append(buf, `\\ufffd`...)",
+                indent(4) + "start = i + size",
+                indent(3) + "}",
+                indent(3) + "i += size",
+                indent(3) + "continue",
+                indent(2) + "}",
+                indent(2) + "if c >= 0x20 && c != '\"' && c != '\\\\' {",
+                indent(3) + "i++",
+                indent(3) + "continue",
+                indent(2) + "}",
+                indent(2) + "buf = append(buf, s[start:i]...)",
+                indent(2) + "switch c {",
+                indent(2) + "case '\"', '\\\\':",
+                indent(3) + "buf = append(buf, '\\\\', c)",
+                indent(2) + "case '\\n':",
+                indent(3) + "buf = append(buf, '\\\\', 'n')",
+                indent(2) + "case '\\r':",
+                indent(3) + "buf = append(buf, '\\\\', 'r')",
+                indent(2) + "case '\\t':",
+                indent(3) + "buf = append(buf, '\\\\', 't')",
+                indent(2) + "default:",
+                indent(3) + "buf = append(buf, '\\\\', 'u', '0', '0', "
+                            f"{prefix}HexDigits[c>>4], {prefix}HexDigits[c&0xF])",
+                indent(2) + "}",
+                indent(2) + "i++",
+                indent(2) + "start = i",
+                indent(1) + "}",
+                indent(1) + "buf = append(buf, s[start:]...)",
+                indent(1) + "return append(buf, '\"')",
+                "}",
+                "",
+                f"// {prefix}AppendJSONFloat appends f formatted like encoding/json, or null if JSON has no form of it",
+                f"func {prefix}AppendJSONFloat(buf []byte, f float64) []byte {{",
+                indent(1) + "if f != f || f-f != 0 {",
+                indent(2) + 'return append(buf, "null"...)',
+                indent(1) + "}",
+                indent(1) + "abs := f",
+                indent(1) + "if abs < 0 {",
+                indent(2) + "abs = -abs",
+                indent(1) + "}",
+                indent(1) + "format := byte('f')",
+                indent(1) + "if abs != 0 && (abs < 1e-6 || abs >= 1e21) {",
+                indent(2) + "format = 'e'",
+                indent(1) + "}",
+                indent(1) + "buf = strconv.AppendFloat(buf, f, format, -1, 64)",
+                indent(1) + "if format == 'e' {",
+                indent(2) + "// Exponents have no leading zero, 1e-07 is written as 1e-7",
+                indent(2) + "n := len(buf)",
+                indent(2) + "if n >= 4 && buf[n-4] == 'e' && buf[n-3] == '-' && buf[n-2] == '0' {",
+                indent(3) + "buf[n-2] = buf[n-1]",
+                indent(3) + "buf = buf[:n-1]",
+                indent(2) + "}",
+                indent(1) + "}",
+                indent(1) + "return buf",
+                "}",
+                ""]
+
+    def generate_c_object(self, data: dict, by_value: bool = False) -> str:
+        out = StringIO()
+        self.write_c_object(data, out, by_value)
+        return out.getvalue()
+
+    def write_c_object(self, data: dict, out: TextIO, by_value: bool = False):
+        """
+        Write a call building the object, returning the struct itself if by_value, such as for the fields of other
+        structs, and otherwise a pointer to it in the arena or allocated with malloc
+        """
+        in_arena = self.arena_name and not by_value
+        if by_value:
+            out.write(f"{self.c_name}_make(")
+        elif in_arena:
+            out.write(f"{self.c_name}_new_in(&arena")
+        else:
+            out.write(f"{self.c_name}_new(")
+        for i, t in enumerate(self.get_c_fields().values()):
+            if i or in_arena:
+                out.write(", ")
+            t.write_c_literal(t.or_default(data.get(t.original_name)), out)
+        out.write(")")
 
     def generate_c_example_lines(self) -> List[str]:
         # TODO: Avoid Java keywords and shadowing C builtins
         test_var_name = any_to_lower_camel(self.name)
-        lines = [f"{self.c_name} * {test_var_name} = {self.generate_c_object()};",
-                 f"{self.c_name}_print({test_var_name});"]
+        # The JSON is truncated to fit the buffer, but always null terminated
+        lines = [f"{self.c_name} * {test_var_name} = {self.generate_c_object(self.get_example_data())};",
+                 "char buffer[1 << 16];",
+                 f"{self.c_name}_to_json({test_var_name}, buffer, sizeof(buffer));",
+                 "fputs(buffer, stdout);"]
+        if not self.arena_name:
+            lines.append(f"{self.c_name}_free({test_var_name});")
+        if self.parser_name:
+            # The example data is read back into a struct written the same way, which leaves out any arrays of
+            # arrays it holds, so only invalid JSON stops it
+            example_json = json.dumps({t.original_name: t.or_default(t.value) for t in self.fields.values()})
+            lines += [f"const char json[] = {json.dumps(example_json)};",
+                      f"{self.c_name} parsed;",
+                      f"if ({self.c_name}_from_json(json, sizeof(json) - 1, &parsed) < 0) {{",
+                      indent(1) + "return 1;",
+                      "}",
+                      f"{self.c_name}_to_json(&parsed, buffer, sizeof(buffer));",
+                      'fputs("\\n", stdout);',
+                      "fputs(buffer, stdout);"]
+        if self.arena_name:
+            # Everything the example allocates is freed at once
+            lines = [f"{self.arena_name}Arena arena;",
+                     f"{self.arena_name}_arena_init(&arena, 1 << 16);",
+                     *lines,
+                     f"{self.arena_name}_arena_free(&arena);"]
         return lines
 
     def generate_c_example_code_lines(self) -> List[str]:
@@ -497,62 +2143,564 @@ class MetaClass:
         lines += example_lines
         return lines
 
-    def generate_c_struct_print_function(self) -> List[str]:
-        lines = [f"void {self.c_name}_print({self.c_name}* p) {{"]
-        print_statements = [indent(1) + f"printf_s(\"{self.c_name}(\");"]
+    def generate_c_to_json_lines(self) -> List[str]:
+        prefix = self.writer_name
+        lines = [f"void {self.c_name}_write_json({prefix}JsonWriter * writer, const {self.c_name} * p) {{"]
+        separator = "{"
         for field, t in self.get_c_fields().items():
-            print_statements.append(indent(1) + t.to_c_printf(field))
-            if print_statements[-1].count('",') == 1:
-                print_statements[-1] = print_statements[-1].replace('",', ', ",')
-            else:
-                print_statements.append(indent(1) + 'printf_s(", ");')
+            # Each key is written along with the punctuation before it in a single copy
+            key = separator + json.dumps(t.original_name) + ":"
+            lines.append(indent(1) + f"{prefix}_json_write(writer, {json.dumps(key)}, {len(key)});")
+            lines.extend(indent(1) + line for line in t.c_json_lines(f"p->{field}", prefix))
+            separator = ","
         if self.fields:
-            if print_statements[-1] == indent(1) + 'printf_s(", ");':
-                print_statements.pop()
-            else:
-                print_statements[-1] = print_statements[-1].replace(', ",', '",')
-        print_statements.append(indent(1) + 'printf_s(")");')
-        lines += print_statements
-        lines += ["}", ""]
+            lines.append(indent(1) + f"{prefix}_json_write_char(writer, '}}');")
+        else:
+            lines += [indent(1) + "(void) p;",
+                      indent(1) + f'{prefix}_json_write(writer, "{{}}", 2);']
+        lines += ["}",
+                  "",
+                  "// Write p as JSON into buffer, truncated to capacity - 1 characters and null terminated like "
+                  "snprintf, returning",
+                  "// the length of the whole JSON so a buffer of the right size can be used if it did not fit",
+                  f"size_t {self.c_name}_to_json(const {self.c_name} * p, char * buffer, size_t capacity) {{",
+                  indent(1) + f"{prefix}JsonWriter writer = {{buffer, capacity ? capacity - 1 : 0, 0}};",
+                  indent(1) + f"{self.c_name}_write_json(&writer, p);",
+                  indent(1) + "if (capacity) {",
+                  indent(2) + "buffer[writer.length < writer.capacity ? writer.length : writer.capacity] = '\\0';",
+                  indent(1) + "}",
+                  indent(1) + "return writer.length;",
+                  "}",
+                  ""]
         return lines
 
+    def generate_c_json_writer_lines(self) -> List[str]:
+        """
+        The helpers shared by the JSON writers of every struct. Writes past the capacity are counted but dropped, and
+        numbers are formatted by hand, so nothing goes through stdio but doubles.
+        """
+        prefix = self.writer_name
+        writer = f"{prefix}JsonWriter"
+        return [f"struct {writer} {{",
+                indent(1) + "char * buffer;",
+                indent(1) + "size_t capacity;",
+                indent(1) + "size_t length;",
+                "};",
+                f"typedef struct {writer} {writer};",
+                "",
+                f"void {prefix}_json_write({writer} * writer, const char * data, size_t length) {{",
+                indent(1) + "if (writer->length < writer->capacity) {",
+                indent(2) + "size_t room = writer->capacity - writer->length;",
+                indent(2) + "memcpy(writer->buffer + writer->length, data, length < room ? length : room);",
+                indent(1) + "}",
+                indent(1) + "writer->length += length;",
+                "}",
+                "",
+                f"void {prefix}_json_write_char({writer} * writer, char c) {{",
+                indent(1) + "if (writer->length < writer->capacity) {",
+                indent(2) + "writer->buffer[writer->length] = c;",
+                indent(1) + "}",
+                indent(1) + "writer->length++;",
+                "}",
+                "",
+                f"void {prefix}_json_write_string({writer} * writer, const char * data, size_t length) {{",
+                indent(1) + 'static const char hex[] = "0123456789abcdef";',
+                indent(1) + f"{prefix}_json_write_char(writer, '\"');",
+                indent(1) + "// Runs of characters which need no escaping are copied at once",
+                indent(1) + "size_t start = 0;",
+                indent(1) + "for (size_t i = 0; i < length; i++) {",
+                indent(2) + "unsigned char c = (unsigned char) data[i];",
+                indent(2) + "if (c != '\"' && c != '\\\\' && c >= 0x20) {",
+                indent(3) + "continue;",
+                indent(2) + "}",
+                indent(2) + f"{prefix}_json_write(writer, data + start, i - start);",
+                indent(2) + "if (c == '\"' || c == '\\\\') {",
+                indent(3) + "char escaped[2] = {'\\\\', (char) c};",
+                indent(3) + f"{prefix}_json_write(writer, escaped, 2);",
+                indent(2) + "} else {",
+                indent(3) + "char escaped[6] = {'\\\\', 'u', '0', '0', hex[c >> 4], hex[c & 15]};",
+                indent(3) + f"{prefix}_json_write(writer, escaped, 6);",
+                indent(2) + "}",
+                indent(2) + "start = i + 1;",
+                indent(1) + "}",
+                indent(1) + f"{prefix}_json_write(writer, data + start, length - start);",
+                indent(1) + f"{prefix}_json_write_char(writer, '\"');",
+                "}",
+                "",
+                f"void {prefix}_json_write_unsigned({writer} * writer, unsigned long long value) {{",
+                indent(1) + "char digits[20];",
+                indent(1) + "size_t start = sizeof(digits);",
+                indent(1) + "do {",
+                indent(2) + "digits[--start] = (char) ('0' + value % 10);",
+                indent(2) + "value /= 10;",
+                indent(1) + "} while (value);",
+                indent(1) + f"{prefix}_json_write(writer, digits + start, sizeof(digits) - start);",
+                "}",
+                "",
+                f"void {prefix}_json_write_integer({writer} * writer, long long value) {{",
+                indent(1) + "if (value < 0) {",
+                indent(2) + f"{prefix}_json_write_char(writer, '-');",
+                indent(2) + f"{prefix}_json_write_unsigned(writer, 0ULL - (unsigned long long) value);",
+                indent(1) + "} else {",
+                indent(2) + f"{prefix}_json_write_unsigned(writer, (unsigned long long) value);",
+                indent(1) + "}",
+                "}",
+                "",
+                f"void {prefix}_json_write_double({writer} * writer, double value) {{",
+                indent(1) + "// JSON has no infinities or NaN",
+                indent(1) + "if (value != value || value - value != 0) {",
+                indent(2) + f'{prefix}_json_write(writer, "null", 4);',
+                indent(2) + "return;",
+                indent(1) + "}",
+                indent(1) + "// The shorter of the usual precisions which reads back as the same value",
+                indent(1) + "char digits[32];",
+                indent(1) + 'int length = snprintf(digits, sizeof(digits), "%.15g", value);',
+                indent(1) + "if (strtod(digits, NULL) != value) {",
+                indent(2) + 'length = snprintf(digits, sizeof(digits), "%.17g", value);',
+                indent(1) + "}",
+                indent(1) + f"{prefix}_json_write(writer, digits, (size_t) length);",
+                "}",
+                "",
+                f"void {prefix}_json_write_boolean({writer} * writer, bool value) {{",
+                indent(1) + "if (value) {",
+                indent(2) + f'{prefix}_json_write(writer, "true", 4);',
+                indent(1) + "} else {",
+                indent(2) + f'{prefix}_json_write(writer, "false", 5);',
+                indent(1) + "}",
+                "}",
+                ""]
+
     def generate_c_constructor_lines(self) -> List[str]:
+        lines = self.generate_c_constructor(f"{self.c_name}_make", [], None)
+        lines += self.generate_c_constructor(f"{self.c_name}_new", [], f"malloc(sizeof({self.c_name}))")
+        # Nested structs are stored by value, and strings and arrays outside the struct belong to the caller, so
+        # freeing the struct frees everything it owns
+        lines += [f"void {self.c_name}_free({self.c_name}* p) {{",
+                  indent(1) + "free(p);",
+                  "}", ""]
+        if self.arena_name:
+            lines.append(f"// Never passed to {self.c_name}_free, since everything built in the arena is freed at "
+                         f"once by {self.arena_name}_arena_reset or {self.arena_name}_arena_free")
+            lines += self.generate_c_constructor(f"{self.c_name}_new_in", [f"{self.arena_name}Arena * arena"],
+                                                 f"{self.arena_name}_arena_alloc(arena, sizeof({self.c_name}))")
+        return lines
+
+    def generate_c_constructor(self, name: str, parameters: List[str], allocation: Optional[str]) -> List[str]:
+        """
+        A constructor returning a pointer to the struct built in the given allocation, or NULL if the allocation
+        fails, or the struct itself if there is no allocation
+        """
         lines = []
-        constructor_signature = f"{self.c_name}* {self.c_name}_new("
+        constructor_signature = f"{self.c_name}* {name}(" if allocation else f"{self.c_name} {name}("
         for field, t in self.get_c_fields().items():
-            constructor_signature += f"{t.to_c} {field}{'[]' if t.c_is_variable_length_array else ''}, "
-        constructor_signature = constructor_signature.rstrip(", ") + ") {"
+            parameters = parameters + t.c_parameters(field)
+        constructor_signature += ", ".join(parameters) + ") {"
         lines.append(constructor_signature)
-        lines.append(indent(1) + f"{self.c_name}* p = malloc(sizeof({self.c_name}));")
+        if allocation:
+            lines += [indent(1) + f"{self.c_name}* p = {allocation};",
+                      indent(1) + "if (p == NULL) {",
+                      indent(2) + "return NULL;",
+                      indent(1) + "}"]
+        else:
+            lines += [indent(1) + f"{self.c_name} value;",
+                      indent(1) + f"{self.c_name}* p = &value;"]
         for field, t in self.get_c_fields().items():
-            lines.append(indent(1) + f"p->{field} = {field};")
-        lines += [indent(1) + "return p;", '}']
+            lines.extend(indent(1) + assignment for assignment in t.c_assignments(field))
+        lines += [indent(1) + ("return p;" if allocation else "return value;"), '}']
         lines.append('')
         return lines
 
-    def generate_c_struct_lines(self) -> List[str]:
-        lines = [f"struct {self.c_name} {{"]
+    def generate_c_from_json_lines(self) -> List[str]:
+        prefix = self.parser_name
+        lines = [f"int {self.c_name}_parse_json_object({prefix}JsonParser * parser, {self.c_name} * out) {{",
+                 indent(1) + f"memset(out, 0, sizeof({self.c_name}));",
+                 *(indent(1) + line for line in c_check(f"{prefix}_json_expect(parser, '{{')")),
+                 indent(1) + f"if ({prefix}_json_accept(parser, '}}')) {{",
+                 indent(2) + "return 0;",
+                 indent(1) + "}",
+                 indent(1) + "do {",
+                 indent(2) + f"{prefix}StringView key;",
+                 *(indent(2) + line for line in c_check(f"{prefix}_json_parse_string(parser, &key)")),
+                 *(indent(2) + line for line in c_check(f"{prefix}_json_expect(parser, ':')"))]
+        # Field names are compared by length first, so most comparisons are of a single number
+        condition = "if"
         for field, t in self.get_c_fields().items():
-            lines.append(indent(1) + f"{t.to_c} {'* ' if t.c_is_variable_length_array else ''}{field};")
+            key = t.original_name.encode('utf-8', 'surrogatepass')
+            lines.append(indent(2) + f"{condition} (key.length == {len(key)} && memcmp(key.data, "
+                                     f"{json.dumps(t.original_name)}, {len(key)}) == 0) {{")
+            lines.extend(indent(3) + line for line in t.c_parse_lines(f"out->{field}", prefix))
+            condition = "} else if"
+        if self.fields:
+            lines += [indent(2) + f"}} else if ({prefix}_json_skip_value(parser) != 0) {{",
+                      indent(3) + "return -1;",
+                      indent(2) + "}"]
+        else:
+            lines += [indent(2) + line for line in c_check(f"{prefix}_json_skip_value(parser)")]
+        lines += [indent(1) + f"}} while ({prefix}_json_accept(parser, ','));",
+                  indent(1) + f"return {prefix}_json_expect(parser, '}}');",
+                  "}",
+                  "",
+                  f"// Read the JSON object in json into out, whose strings point into json, returning 0, -1 if the "
+                  f"JSON is not valid, or 1 if",
+                  f"// it is but out could not hold all of it: items beyond the capacity of an array, or any arrays "
+                  f"of arrays, are skipped",
+                  f"int {self.c_name}_from_json(const char * json, size_t length, {self.c_name} * out) {{",
+                  indent(1) + f"{prefix}JsonParser parser = {{json, json + length, false}};",
+                  *(indent(1) + line for line in c_check(f"{self.c_name}_parse_json_object(&parser, out)")),
+                  indent(1) + f"{prefix}_json_skip_whitespace(&parser);",
+                  indent(1) + "if (parser.p != parser.end) {",
+                  indent(2) + "return -1;",
+                  indent(1) + "}",
+                  indent(1) + "return parser.truncated ? 1 : 0;",
+                  "}",
+                  ""]
+        return lines
+
+    def generate_c_json_parser_lines(self) -> List[str]:
+        """
+        The helpers shared by the JSON parsers of every struct. Strings are read as views of the input, with any
+        escape sequences left as they are.
+        """
+        prefix = self.parser_name
+        view, parser = f"{prefix}StringView", f"{prefix}JsonParser"
+        return [f"struct {view} {{",
+                indent(1) + "const char * data;",
+                indent(1) + "size_t length;",
+                "};",
+                f"typedef struct {view} {view};",
+                "",
+                f"struct {parser} {{",
+                indent(1) + "const char * p;",
+                indent(1) + "const char * end;",
+                indent(1) + "// Set when valid JSON holds values the structs have no room for, which are skipped",
+                indent(1) + "bool truncated;",
+                "};",
+                f"typedef struct {parser} {parser};",
+                "",
+                f"void {prefix}_json_skip_whitespace({parser} * parser) {{",
+                indent(1) + "while (parser->p < parser->end && (*parser->p == ' ' || *parser->p == '\\t' || "
+                            "*parser->p == '\\n' || *parser->p == '\\r')) {",
+                indent(2) + "parser->p++;",
+                indent(1) + "}",
+                "}",
+                "",
+                f"int {prefix}_json_expect({parser} * parser, char c) {{",
+                indent(1) + f"{prefix}_json_skip_whitespace(parser);",
+                indent(1) + "if (parser->p == parser->end || *parser->p != c) {",
+                indent(2) + "return -1;",
+                indent(1) + "}",
+                indent(1) + "parser->p++;",
+                indent(1) + "return 0;",
+                "}",
+                "",
+                f"bool {prefix}_json_accept({parser} * parser, char c) {{",
+                indent(1) + f"return {prefix}_json_expect(parser, c) == 0;",
+                "}",
+                "",
+                f"int {prefix}_json_parse_string({parser} * parser, {view} * out) {{",
+                *(indent(1) + line for line in c_check(f"{prefix}_json_expect(parser, '\"')")),
+                indent(1) + "const char * start = parser->p;",
+                indent(1) + "while (parser->p < parser->end && *parser->p != '\"') {",
+                indent(2) + "// JSON strings hold no control characters, and each backslash starts an escape",
+                indent(2) + "if ((unsigned char) *parser->p < 0x20) {",
+                indent(3) + "return -1;",
+                indent(2) + "}",
+                indent(2) + "if (*parser->p == '\\\\') {",
+                indent(3) + "parser->p++;",
+                indent(3) + "if (parser->p == parser->end || (unsigned char) *parser->p < 0x20 || "
+                            "strchr(\"\\\"\\\\/bfnrtu\", *parser->p) == NULL) {",
+                indent(4) + "return -1;",
+                indent(3) + "}",
+                indent(3) + "if (*parser->p == 'u') {",
+                indent(4) + "for (int i = 1; i <= 4; i++) {",
+                indent(5) + "if (parser->end - parser->p <= i || !isxdigit((unsigned char) parser->p[i])) {",
+                indent(6) + "return -1;",
+                indent(5) + "}",
+                indent(4) + "}",
+                indent(3) + "}",
+                indent(2) + "}",
+                indent(2) + "parser->p++;",
+                indent(1) + "}",
+                indent(1) + "if (parser->p >= parser->end) {",
+                indent(2) + "return -1;",
+                indent(1) + "}",
+                indent(1) + "out->data = start;",
+                indent(1) + "out->length = (size_t) (parser->p - start);",
+                indent(1) + "parser->p++;",
+                indent(1) + "return 0;",
+                "}",
+                "",
+                "// Read the digits of a number, without leading zeros as JSON has none, failing if it is over max",
+                f"int {prefix}_json_parse_digits({parser} * parser, unsigned long long max, "
+                f"unsigned long long * out) {{",
+                indent(1) + "if (parser->p == parser->end || *parser->p < '0' || *parser->p > '9') {",
+                indent(2) + "return -1;",
+                indent(1) + "}",
+                indent(1) + "if (*parser->p == '0' && parser->p + 1 < parser->end && parser->p[1] >= '0' && "
+                            "parser->p[1] <= '9') {",
+                indent(2) + "return -1;",
+                indent(1) + "}",
+                indent(1) + "unsigned long long value = 0;",
+                indent(1) + "while (parser->p < parser->end && *parser->p >= '0' && *parser->p <= '9') {",
+                indent(2) + "unsigned long long digit = (unsigned long long) (*parser->p - '0');",
+                indent(2) + "if (digit > max || value > (max - digit) / 10) {",
+                indent(3) + "return -1;",
+                indent(2) + "}",
+                indent(2) + "value = value * 10 + digit;",
+                indent(2) + "parser->p++;",
+                indent(1) + "}",
+                indent(1) + "*out = value;",
+                indent(1) + "return 0;",
+                "}",
+                "",
+                f"int {prefix}_json_parse_unsigned({parser} * parser, unsigned long long max, "
+                f"unsigned long long * out) {{",
+                indent(1) + f"{prefix}_json_skip_whitespace(parser);",
+                indent(1) + "// Only zero fits when negative",
+                indent(1) + "if (parser->p < parser->end && *parser->p == '-') {",
+                indent(2) + "parser->p++;",
+                indent(2) + "max = 0;",
+                indent(1) + "}",
+                indent(1) + f"return {prefix}_json_parse_digits(parser, max, out);",
+                "}",
+                "",
+                "// Read an integer between min, which is at most 0, and max, failing if it is outside them",
+                f"int {prefix}_json_parse_integer({parser} * parser, long long min, long long max, "
+                f"long long * out) {{",
+                indent(1) + f"{prefix}_json_skip_whitespace(parser);",
+                indent(1) + "bool negative = parser->p < parser->end && *parser->p == '-';",
+                indent(1) + "if (negative) {",
+                indent(2) + "parser->p++;",
+                indent(1) + "}",
+                indent(1) + "// The magnitude of min is found without negating it, which overflows for LLONG_MIN",
+                indent(1) + "unsigned long long magnitude = negative ? (unsigned long long) -(min + 1) + 1 : "
+                            "(unsigned long long) max;",
+                indent(1) + "unsigned long long value;",
+                *(indent(1) + line for line in c_check(f"{prefix}_json_parse_digits(parser, magnitude, &value)")),
+                indent(1) + "*out = negative && value ? -(long long) (value - 1) - 1 : (long long) value;",
+                indent(1) + "return 0;",
+                "}",
+                "",
+                "// Skip a number, failing unless it has the form JSON gives numbers",
+                f"int {prefix}_json_skip_number({parser} * parser) {{",
+                indent(1) + "if (parser->p < parser->end && *parser->p == '-') {",
+                indent(2) + "parser->p++;",
+                indent(1) + "}",
+                indent(1) + "if (parser->p == parser->end || !isdigit((unsigned char) *parser->p)) {",
+                indent(2) + "return -1;",
+                indent(1) + "}",
+                indent(1) + "// Only zero may start with a zero",
+                indent(1) + "if (*parser->p++ != '0') {",
+                indent(2) + "while (parser->p < parser->end && isdigit((unsigned char) *parser->p)) {",
+                indent(3) + "parser->p++;",
+                indent(2) + "}",
+                indent(1) + "}",
+                indent(1) + "if (parser->p < parser->end && *parser->p == '.') {",
+                indent(2) + "parser->p++;",
+                indent(2) + "if (parser->p == parser->end || !isdigit((unsigned char) *parser->p)) {",
+                indent(3) + "return -1;",
+                indent(2) + "}",
+                indent(2) + "while (parser->p < parser->end && isdigit((unsigned char) *parser->p)) {",
+                indent(3) + "parser->p++;",
+                indent(2) + "}",
+                indent(1) + "}",
+                indent(1) + "if (parser->p < parser->end && (*parser->p == 'e' || *parser->p == 'E')) {",
+                indent(2) + "parser->p++;",
+                indent(2) + "if (parser->p < parser->end && (*parser->p == '+' || *parser->p == '-')) {",
+                indent(3) + "parser->p++;",
+                indent(2) + "}",
+                indent(2) + "if (parser->p == parser->end || !isdigit((unsigned char) *parser->p)) {",
+                indent(3) + "return -1;",
+                indent(2) + "}",
+                indent(2) + "while (parser->p < parser->end && isdigit((unsigned char) *parser->p)) {",
+                indent(3) + "parser->p++;",
+                indent(2) + "}",
+                indent(1) + "}",
+                indent(1) + "return 0;",
+                "}",
+                "",
+                f"int {prefix}_json_parse_double({parser} * parser, double * out) {{",
+                indent(1) + f"{prefix}_json_skip_whitespace(parser);",
+                indent(1) + "const char * start = parser->p;",
+                *(indent(1) + line for line in c_check(f"{prefix}_json_skip_number(parser)")),
+                indent(1) + "// strtod needs the number terminated, which the input need not be",
+                indent(1) + "char buffer[64];",
+                indent(1) + "size_t length = (size_t) (parser->p - start);",
+                indent(1) + "if (length >= sizeof(buffer)) {",
+                indent(2) + "return -1;",
+                indent(1) + "}",
+                indent(1) + "memcpy(buffer, start, length);",
+                indent(1) + "buffer[length] = '\\0';",
+                indent(1) + "*out = strtod(buffer, NULL);",
+                indent(1) + "return 0;",
+                "}",
+                "",
+                f"int {prefix}_json_parse_boolean({parser} * parser, bool * out) {{",
+                indent(1) + f"{prefix}_json_skip_whitespace(parser);",
+                indent(1) + "if (parser->end - parser->p >= 4 && memcmp(parser->p, \"true\", 4) == 0) {",
+                indent(2) + "*out = true;",
+                indent(2) + "parser->p += 4;",
+                indent(2) + "return 0;",
+                indent(1) + "}",
+                indent(1) + "if (parser->end - parser->p >= 5 && memcmp(parser->p, \"false\", 5) == 0) {",
+                indent(2) + "*out = false;",
+                indent(2) + "parser->p += 5;",
+                indent(2) + "return 0;",
+                indent(1) + "}",
+                indent(1) + "return -1;",
+                "}",
+                "",
+                "// Skip a value of a field which is not in the struct, failing unless it is valid JSON. Brackets are "
+                "kept on a stack",
+                "// rather than recursing, so values nested more deeply than it holds fail too",
+                f"int {prefix}_json_skip_value({parser} * parser) {{",
+                indent(1) + f"{view} ignored;",
+                indent(1) + "char closing[128];",
+                indent(1) + "size_t depth = 0;",
+                indent(1) + "while (true) {",
+                indent(2) + f"{prefix}_json_skip_whitespace(parser);",
+                indent(2) + "if (parser->p == parser->end) {",
+                indent(3) + "return -1;",
+                indent(2) + "}",
+                indent(2) + "if (*parser->p == '{' || *parser->p == '[') {",
+                indent(3) + "if (depth == sizeof(closing)) {",
+                indent(4) + "return -1;",
+                indent(3) + "}",
+                indent(3) + "closing[depth++] = *parser->p++ == '{' ? '}' : ']';",
+                indent(3) + f"if (!{prefix}_json_accept(parser, closing[depth - 1])) {{",
+                indent(4) + "if (closing[depth - 1] == '}') {",
+                *(indent(5) + line for line in c_check(f"{prefix}_json_parse_string(parser, &ignored)")),
+                *(indent(5) + line for line in c_check(f"{prefix}_json_expect(parser, ':')")),
+                indent(4) + "}",
+                indent(4) + "continue;",
+                indent(3) + "}",
+                indent(3) + "depth--;",
+                indent(2) + "} else if (*parser->p == '\"') {",
+                *(indent(3) + line for line in c_check(f"{prefix}_json_parse_string(parser, &ignored)")),
+                indent(2) + "} else if (*parser->p == 't' || *parser->p == 'f' || *parser->p == 'n') {",
+                indent(3) + "const char * literal = *parser->p == 't' ? \"true\" : *parser->p == 'f' ? \"false\" : "
+                            "\"null\";",
+                indent(3) + "size_t length = strlen(literal);",
+                indent(3) + "if ((size_t) (parser->end - parser->p) < length || "
+                            "memcmp(parser->p, literal, length) != 0) {",
+                indent(4) + "return -1;",
+                indent(3) + "}",
+                indent(3) + "parser->p += length;",
+                indent(2) + "} else {",
+                *(indent(3) + line for line in c_check(f"{prefix}_json_skip_number(parser)")),
+                indent(2) + "}",
+                indent(2) + "// Close every bracket the value ends, then go on to the next item of the innermost one",
+                indent(2) + f"while (depth > 0 && {prefix}_json_accept(parser, closing[depth - 1])) {{",
+                indent(3) + "depth--;",
+                indent(2) + "}",
+                indent(2) + "if (depth == 0) {",
+                indent(3) + "return 0;",
+                indent(2) + "}",
+                *(indent(2) + line for line in c_check(f"{prefix}_json_expect(parser, ',')")),
+                indent(2) + "if (closing[depth - 1] == '}') {",
+                *(indent(3) + line for line in c_check(f"{prefix}_json_parse_string(parser, &ignored)")),
+                *(indent(3) + line for line in c_check(f"{prefix}_json_expect(parser, ':')")),
+                indent(2) + "}",
+                indent(1) + "}",
+                "}",
+                ""]
+
+    def generate_c_arena_lines(self) -> List[str]:
+        """
+        A bump allocator handing out memory from large blocks, which are all freed at once
+        """
+        arena, block = f"{self.arena_name}Arena", f"{self.arena_name}ArenaBlock"
+        return [f"struct {block} {{",
+                indent(1) + f"struct {block} * next;",
+                indent(1) + "size_t capacity;",
+                indent(1) + "size_t used;",
+                indent(1) + "_Alignas(max_align_t) unsigned char data[];",
+                "};",
+                f"typedef struct {block} {block};",
+                "",
+                f"struct {arena} {{",
+                indent(1) + f"{block} * blocks;",
+                indent(1) + "size_t block_size;",
+                "};",
+                f"typedef struct {arena} {arena};",
+                "",
+                f"void {self.arena_name}_arena_init({arena} * arena, size_t block_size) {{",
+                indent(1) + "arena->blocks = NULL;",
+                indent(1) + "arena->block_size = block_size;",
+                "}",
+                "",
+                f"void * {self.arena_name}_arena_alloc({arena} * arena, size_t size) {{",
+                indent(1) + "size = (size + _Alignof(max_align_t) - 1) / _Alignof(max_align_t)"
+                            " * _Alignof(max_align_t);",
+                indent(1) + f"{block} * block = arena->blocks;",
+                indent(1) + "if (block == NULL || block->capacity - block->used < size) {",
+                indent(2) + "size_t capacity = size > arena->block_size ? size : arena->block_size;",
+                indent(2) + f"block = malloc(sizeof({block}) + capacity);",
+                indent(2) + "if (block == NULL) {",
+                indent(3) + "return NULL;",
+                indent(2) + "}",
+                indent(2) + "block->next = arena->blocks;",
+                indent(2) + "block->capacity = capacity;",
+                indent(2) + "block->used = 0;",
+                indent(2) + "arena->blocks = block;",
+                indent(1) + "}",
+                indent(1) + "void * p = block->data + block->used;",
+                indent(1) + "block->used += size;",
+                indent(1) + "return p;",
+                "}",
+                "",
+                "// Forget everything allocated, keeping the latest block to allocate from again",
+                f"void {self.arena_name}_arena_reset({arena} * arena) {{",
+                indent(1) + "if (arena->blocks == NULL) {",
+                indent(2) + "return;",
+                indent(1) + "}",
+                indent(1) + f"{block} * block = arena->blocks->next;",
+                indent(1) + "while (block != NULL) {",
+                indent(2) + f"{block} * next = block->next;",
+                indent(2) + "free(block);",
+                indent(2) + "block = next;",
+                indent(1) + "}",
+                indent(1) + "arena->blocks->next = NULL;",
+                indent(1) + "arena->blocks->used = 0;",
+                "}",
+                "",
+                f"void {self.arena_name}_arena_free({arena} * arena) {{",
+                indent(1) + f"{self.arena_name}_arena_reset(arena);",
+                indent(1) + "free(arena->blocks);",
+                indent(1) + "arena->blocks = NULL;",
+                "}",
+                ""]
+
+    def generate_c_struct_lines(self) -> List[str]:
+        lines = []
+        if self.minimize_padding:
+            size = struct_layout(t.c_layout for t in self.get_c_fields().values())[0]
+            lines.append(f"// Fields ordered to minimize padding: sizeof({self.c_name}) is {self.c_layout[0]} bytes, "
+                         f"{size} in JSON order")
+        for t in self.get_c_fields().values():
+            lines.extend(t.c_item_struct_lines())
+        lines.append(f"struct {self.c_name} {{")
+        for field, t in self.get_c_struct_fields().items():
+            lines.extend(indent(1) + declaration for declaration in t.c_declarations(field))
         lines.append("};")
         lines.append(f"typedef struct {self.c_name} {self.c_name};")
         lines.append('')
         return lines
 
-    def generate_c_related_structs_lines(self) -> List[str]:
-        lines = []
+    def generate_c_related_structs_lines(self, context: GenerationContext) -> Iterator[str]:
         for field, t in self.get_c_fields().items():
             for field_type in t.embedded_objects:
-                string = field_type.object_class.generate_c()
-                if string:
-                    lines.append(string)
-                    lines.append('')
-        return lines
+                yield from pad_lines(field_type.object_class.iter_c_lines(context), after=True)
+
+    def generate_c_enum_lines(self) -> Iterator[str]:
+        for t in self.fields.values():
+            for enum in t.embedded_enums:
+                yield from pad_lines(enum.generate_c_lines(), after=True)
 
     def generate_c_import_lines(self) -> List[str]:
         lines = []
         lines.append(f"#include <malloc.h>")  # Needed for any constructor
-        lines.append(f"#include <stdio.h>")  # Needed for any print func
+        lines.append(f"#include <stdio.h>")  # Needed for printing and formatting doubles
         for include in self.get_c_includes():
             lines.append(f"#include <{include}>")
         # Add another line if there were includes needed
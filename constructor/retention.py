@@ -0,0 +1,70 @@
+import re
+from random import Random
+from typing import List, Optional, Union
+
+
+class RetainValues:
+    """
+    How many of the values seen while inferring types are kept around as examples:
+      all: Every value, so examples reproduce the input
+      sample(k): At most k items of each array, picked by reservoir sampling
+      none: No values at all, for when only the types are needed
+    """
+
+    def __init__(self, sample_size: Optional[int]):
+        if sample_size is not None and sample_size < 0:
+            raise ValueError(f"Sample size cannot be negative ({sample_size})")
+        # None for no limit
+        self.sample_size = sample_size
+
+    @classmethod
+    def parse(cls, setting: Union[str, 'RetainValues']) -> 'RetainValues':
+        if isinstance(setting, RetainValues):
+            return setting
+        if setting == 'all':
+            return cls(None)
+        if setting == 'none':
+            return cls(0)
+        match = re.fullmatch(r'sample\((\d+)\)', setting)
+        if match is None:
+            raise ValueError(f"Expected 'all', 'sample(k)' or 'none' for retained values, not {setting!r}")
+        return cls(int(match.group(1)))
+
+    @property
+    def keeps_all(self) -> bool:
+        return self.sample_size is None
+
+    @property
+    def keeps_any(self) -> bool:
+        return self.sample_size != 0
+
+    def reservoir(self, random: Random) -> 'Reservoir':
+        return Reservoir(self.sample_size, random)
+
+    def __repr__(self) -> str:
+        if self.keeps_all:
+            return "RetainValues('all')"
+        if not self.keeps_any:
+            return "RetainValues('none')"
+        return f"RetainValues('sample({self.sample_size})')"
+
+
+class Reservoir:
+    """
+    A uniform random sample of at most size items from a stream of unknown length (Algorithm R)
+    """
+
+    def __init__(self, size: Optional[int], random: Random):
+        self.size = size
+        self.random = random
+        self.items: List = []
+        self.seen = 0
+
+    def add(self, item):
+        self.seen += 1
+        if self.size is None or len(self.items) < self.size:
+            self.items.append(item)
+            return
+        i = self.random.randrange(self.seen)
+        if i < self.size:
+            self.items[i] = item
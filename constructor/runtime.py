@@ -0,0 +1,123 @@
+"""
+Building the generated Python classes into a module in the running process, instead of writing them to a file. The
+compiled code is cached by a fingerprint of everything it depends on, so building the classes of the same schema
+again skips both generating and compiling the code: in memory for the life of the process, and on disk across
+restarts when a cache directory is given.
+
+Code cached on disk is loaded with marshal and run, so the cache directory must only be writable by trusted users.
+"""
+import json
+import marshal
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Lock
+from types import CodeType, ModuleType
+from typing import Optional, TYPE_CHECKING
+
+from constructor.context import GenerationContext
+
+if TYPE_CHECKING:
+    from constructor.main import MetaClass
+
+# Bump whenever the generated Python code changes, so that code cached by an earlier version is never used
+PYTHON_GENERATOR_VERSION = 2
+
+# How many compiled modules are kept in memory, the least recently used being dropped first
+MEMORY_CACHE_SIZE = 128
+
+CACHE_FILE_SUFFIX = '.marshal'
+
+_memory_cache: 'OrderedDict[str, CodeType]' = OrderedDict()
+_memory_cache_lock = Lock()
+
+
+def python_fingerprint(meta_class: 'MetaClass', context: GenerationContext) -> str:
+    """
+    Return a digest of everything the Python code generated for the class depends on, including the generator and
+    interpreter versions since marshalled code only loads in the interpreter which compiled it
+    """
+    key = [PYTHON_GENERATOR_VERSION, sys.implementation.cache_tag,
+           [context.python_slots, context.python_columns, context.python_lazy, context.python_main],
+           meta_class.get_python_signature(context.python_columns)]
+    return blake2b(json.dumps(key, separators=(',', ':')).encode(), digest_size=16).hexdigest()
+
+
+def clear_memory_cache():
+    with _memory_cache_lock:
+        _memory_cache.clear()
+
+
+def load_code(path: str) -> Optional[CodeType]:
+    """
+    Return the code cached in the file, or None if it is missing or unreadable
+    """
+    try:
+        with open(path, 'rb') as f:
+            code = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return code if isinstance(code, CodeType) else None
+
+
+def save_code(path: str, code: CodeType):
+    """
+    Cache the code in the file, written elsewhere first and moved into place so other processes never load part of it
+    """
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    except OSError:
+        # The cache only saves time, so the code is still used if it cannot be saved
+        return
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(code, f)
+        os.replace(temporary_path, path)
+    except OSError:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+def compile_python(meta_class: 'MetaClass', context: GenerationContext, cache_dir: Optional[str] = None) -> CodeType:
+    """
+    Return the compiled Python code of the class, from the memory cache, the disk cache if a directory is given, or
+    generated and compiled if neither has it
+    """
+    fingerprint = python_fingerprint(meta_class, context)
+    with _memory_cache_lock:
+        code = _memory_cache.get(fingerprint)
+        if code is not None:
+            _memory_cache.move_to_end(fingerprint)
+            return code
+
+    path = os.path.join(cache_dir, fingerprint + CACHE_FILE_SUFFIX) if cache_dir is not None else None
+    code = load_code(path) if path is not None else None
+    if code is None:
+        code = compile(meta_class.generate_python(context), f"<{meta_class.python_name}>", 'exec')
+        if path is not None:
+            save_code(path, code)
+
+    with _memory_cache_lock:
+        _memory_cache[fingerprint] = code
+        _memory_cache.move_to_end(fingerprint)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+    return code
+
+
+def build_python_module(meta_class: 'MetaClass', context: GenerationContext,
+                        cache_dir: Optional[str] = None) -> ModuleType:
+    """
+    Return a new module holding the generated Python classes of the class, without the main function
+    """
+    context = context.fork()
+    context.python_main = False
+    module = ModuleType(meta_class.python_name)
+    exec(compile_python(meta_class, context, cache_dir), module.__dict__)
+    return module
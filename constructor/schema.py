@@ -0,0 +1,146 @@
+"""
+Partial schemas are what is known about a type without any of its values, as plain data. They are small, can be
+pickled to and from worker processes, and merge like the types they were taken from, so chunks of a large input can
+be inferred in parallel and combined afterwards. The only values kept are those of strings which may become enums,
+when GenerationContext.enum_limit asks for them.
+
+Sketches wrap the partial schema of a class with a format version, so they can be saved to files on many hosts and
+merged into one class elsewhere. Merging is commutative as well as associative, so any order gives the same class.
+"""
+import json
+from json.decoder import WHITESPACE
+from typing import Iterable, Iterator, List, Optional, TextIO, Union
+
+from constructor import field_types
+from constructor.context import GenerationContext
+from constructor.retention import RetainValues
+from constructor.statistics import Statistics
+from constructor.utils import primitive_to_type, merge_types, singular
+
+SKETCH_FORMAT = 'code_constructor.sketch'
+SKETCH_VERSION = 4
+
+
+def schema_to_type(schema: dict, field_name: str, context: GenerationContext) -> field_types.Type:
+    """
+    Turn a partial schema from Type.to_schema back into a type without values
+    """
+    schema_name = schema["type"]
+    if schema_name == 'string':
+        t = field_types.String(value=None, original_name=field_name, length=schema["length"])
+        if "values" in schema:
+            t.track_values(schema["values"], schema["enum_limit"])
+    elif schema_name == 'boolean':
+        t = field_types.Boolean(value=None, original_name=field_name)
+    elif schema_name in ('integer', 'double'):
+        t = field_types.Integer(value=None, original_name=field_name) if schema_name == 'integer' \
+            else field_types.Double(value=None, original_name=field_name)
+        t.min_value = schema["min"]
+        t.max_value = schema["max"]
+    elif schema_name == 'array':
+        item_type = schema_to_type(schema["items"], field_name=field_name, context=context)
+        t = field_types.Array(value=None, original_name=field_name, item_type=item_type, length=schema["length"])
+    elif schema_name == 'object':
+        from constructor.main import MetaClass
+
+        fields = {}
+        for key, value in schema["fields"].items():
+            fields[key] = schema_to_type(value, field_name=key, context=context)
+            fields[key].position = value["position"]
+        object_class = MetaClass(singular(field_name), fields, context=context)
+        object_class.samples = schema["count"]
+        t = field_types.Object(value=None, original_name=field_name, object_class=object_class)
+    else:
+        raise NotImplementedError(f"{schema_name!r} is not a known schema type!")
+    t.count = schema["count"]
+    t.statistics = Statistics.from_schema(schema["statistics"])
+    return t
+
+
+# Workers for inferring chunks in other processes, so must be importable at the top level of a module
+def infer_schema(records: Iterable[Union[str, bool, int, float, list, dict]], enum_limit: int = 0) -> Optional[dict]:
+    """
+    Infer the partial schema of the merged items of a chunk of an array, or None if the chunk was empty
+    """
+    context = GenerationContext(RetainValues(0), enum_limit)
+    t = merge_types(primitive_to_type(record, field_name='', context=context) for record in records)
+    return t.to_schema() if t is not None else None
+
+
+def infer_jsonl_schema(lines: List[Union[str, bytes]], enum_limit: int = 0) -> Optional[dict]:
+    """
+    Infer the partial schema of the merged records of a chunk of JSON Lines, each of which must be an object
+    """
+    return infer_schema(decode_jsonl(lines), enum_limit)
+
+
+def infer_json_array_chunk(text: str, enum_limit: int = 0) -> Optional[dict]:
+    """
+    Decode and infer the partial schema of the merged items of a chunk of the text of a JSON array, see
+    split_json_array
+    """
+    return infer_schema(json.loads('[' + text + ']'), enum_limit)
+
+
+def split_json_array(data: str, chunk_size: int) -> Iterator[str]:
+    """
+    Split the text of a JSON array into the text of chunks of chunk_size items each. The json module scans each item
+    to find where it ends, so the cuts fall between top-level items whatever they hold, and only one item is decoded
+    at a time.
+    """
+    scan = json.JSONDecoder().raw_decode
+    start = WHITESPACE.match(data).end()
+    if data[start:start + 1] != '[':
+        raise json.JSONDecodeError("Expecting a JSON array", data, start)
+    position = WHITESPACE.match(data, start + 1).end()
+    if data[position:position + 1] != ']':
+        chunk_start, count = position, 0
+        while True:
+            position = WHITESPACE.match(data, scan(data, position)[1]).end()
+            count += 1
+            if data[position:position + 1] == ']':
+                yield data[chunk_start:position]
+                break
+            if data[position:position + 1] != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", data, position)
+            if count == chunk_size:
+                yield data[chunk_start:position]
+                chunk_start, count = position + 1, 0
+            position = WHITESPACE.match(data, position + 1).end()
+    end = WHITESPACE.match(data, position + 1).end()
+    if end != len(data):
+        raise json.JSONDecodeError("Extra data", data, end)
+
+
+def decode_jsonl(lines: Iterable[Union[str, bytes]]) -> Iterable[dict]:
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise NotImplementedError(f"JSON Lines records must be objects ({record!r})")
+        yield record
+
+
+def merge_sketches(sketches: Iterable[Union[dict, TextIO]]) -> dict:
+    """
+    Merge sketches, or open files containing them, into a single sketch
+    """
+    context = GenerationContext(RetainValues(0))
+    name = None
+    merged = None
+    for sketch in sketches:
+        if not isinstance(sketch, dict):
+            sketch = json.load(sketch)
+        if sketch.get("format") != SKETCH_FORMAT:
+            raise ValueError(f"Not a sketch ({sketch.get('format')!r})")
+        if sketch.get("version") != SKETCH_VERSION:
+            raise ValueError(f"Unsupported sketch version {sketch.get('version')!r}, expected {SKETCH_VERSION}")
+        if name is not None and sketch["name"] != name:
+            raise ValueError(f"Cannot merge sketches of different classes ({name!r} vs {sketch['name']!r})")
+        name = sketch["name"]
+        t = schema_to_type(sketch["schema"], field_name=name, context=context)
+        merged = t if merged is None else merged.merge(t)
+    if merged is None:
+        raise ValueError("There must be at least one sketch to merge")
+    return {"format": SKETCH_FORMAT, "version": SKETCH_VERSION, "name": name, "schema": merged.to_schema()}
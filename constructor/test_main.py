@@ -1,17 +1,32 @@
+import array
+import io
 import os
 import sys
 import json
+import pickle
+import shutil
 import subprocess
+import tempfile
+import tracemalloc
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from importlib.util import spec_from_loader, module_from_spec
 from typing import Tuple
-from unittest import TestCase
+from unittest import TestCase, mock, skipUnless
 
+from constructor.benchmarks import python_instance_bytes
+from constructor.context import GenerationContext
+from constructor.field_types import Type, Array, Object
 from constructor.main import MetaClass
-from constructor.utils import cleanup
+from constructor.retention import RetainValues
+from constructor.runtime import clear_memory_cache, python_fingerprint
+from constructor.statistics import stable_hash
+from constructor.utils import primitive_to_type
+from constructor.schema import infer_schema, schema_to_type, merge_sketches, SKETCH_VERSION
 
 # TEST ENVIRONMENT CONFIGURATION
 JAVAC_BINARY_PATH = 'javac'
+JAVA_BINARY_PATH = 'java'
 GO_BINARY_PATH = 'go'
 GCC_BINARY_PATH = 'gcc'
 
@@ -79,8 +94,6 @@ class AbstractTestClass(ABC):
                 f.write(self.c_source)
 
     def tearDown(self):
-        cleanup()  # TODO: This should NOT be necessary...
-
         # Python
         if not self.testlang or self.testlang == 'python':
             del sys.modules[self.python_module_name]
@@ -573,3 +586,1488 @@ class TestEmptyStructName(AbstractTestClass, TestCase):
     }
     """
     expected_classes = (class_name, "ClassName")
+
+
+class TestArrayOfObjectsWithDifferentFields(AbstractTestClass, TestCase):
+    class_name = "Team"
+    test_json = """\
+    {
+        "members": [
+            {"name": "Ann", "age": 31},
+            {"name": "Bob", "age": 27.5, "nickname": "Bobby"},
+            {"name": "Cy", "address": {"city": "Metro City"}, "scores": [1, 2.5]}
+        ]
+    }
+    """
+    expected_classes = (class_name, "Member", "Address")
+
+
+class TestConcurrentGeneration(TestCase):
+    class_name = "Couple"
+    test_json = TestSeeminglyDifferentStructuresAppearingWithSameName.test_json
+
+    def generate(self, _=None) -> Tuple[str, str, str, str]:
+        meta_class = MetaClass.from_json(self.class_name, self.test_json)
+        return meta_class.generate_python(), meta_class.generate_java(), meta_class.generate_go(), \
+            meta_class.generate_c()
+
+    def test_threads_match_serial_output(self):
+        expected = self.generate()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(self.generate, range(64)))
+        for result in results:
+            self.assertEqual(expected, result)
+
+
+class TestGenerateAll(TestCase):
+    class_name = "Person"
+    test_json = TestStructArrays.test_json
+
+    def setUp(self):
+        self.meta_class = MetaClass.from_json(self.class_name, self.test_json)
+        self.expected = {language: getattr(self.meta_class, f"generate_{language}")()
+                         for language in ('python', 'java', 'go', 'c')}
+
+    def test_threads_match_serial_output(self):
+        self.assertEqual(self.expected, self.meta_class.generate_all())
+
+    def test_processes_match_serial_output(self):
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(self.expected, self.meta_class.generate_all(executor=executor))
+
+    def test_processes_are_sent_the_class_pickled_once(self):
+        with ProcessPoolExecutor(max_workers=2) as executor, \
+                mock.patch("constructor.main.pickle.dumps", wraps=pickle.dumps) as dumps:
+            self.assertEqual(self.expected, self.meta_class.generate_all(executor=executor))
+        dumps.assert_called_once_with(self.meta_class)
+
+    def test_selected_languages(self):
+        self.assertEqual({'go': self.expected['go']}, self.meta_class.generate_all(languages=['go']))
+
+    def test_unsupported_language(self):
+        with self.assertRaises(NotImplementedError):
+            self.meta_class.generate_all(languages=['cobol'])
+
+
+class TestExampleRenderingScales(TestCase):
+    @staticmethod
+    def nested_record(depth: int) -> dict:
+        record = {"name": "leaf", "score": 1.5}
+        for level in range(depth):
+            record = {"name": f"level{level}", "count": level, "child": record}
+        return record
+
+    def test_each_object_is_rendered_once_without_inference(self):
+        for length in (1000, 2000):
+            meta_class = MetaClass.from_dict("Root", {"records": [self.nested_record(4) for _ in range(length)]})
+            data = meta_class.get_example_data()
+            for language in ('python', 'java', 'c'):
+                write_object = getattr(MetaClass, f"write_{language}_object")
+                with mock.patch.object(MetaClass, f"write_{language}_object", autospec=True,
+                                       side_effect=write_object) as written, \
+                        mock.patch.object(MetaClass, "infer_fields", side_effect=AssertionError):
+                    getattr(meta_class, f"generate_{language}_object")(data)
+                # The root and the five nested objects of every record
+                self.assertEqual(1 + 5 * length, written.call_count, language)
+
+    def test_rendering_does_not_register_class_names(self):
+        meta_class = MetaClass.from_dict("Root", {"records": [self.nested_record(3) for _ in range(3)]})
+        class_names = set(meta_class.context.unique_classnames)
+        meta_class.generate_python()
+        meta_class.generate_java()
+        meta_class.generate_c()
+        self.assertEqual(class_names, meta_class.context.unique_classnames)
+
+
+class TestArrayLiteralScales(TestCase):
+    def test_large_nested_arrays_render_every_element(self):
+        # How the time scales is measured by benchmarks.benchmark_array_literals
+        value = [[i, i + 1] for i in range(100_000)]
+        t = MetaClass.from_dict("Grid", {"rows": value[:1]}).fields["rows"]
+        self.assertEqual(repr(value), t.to_python_literal(value))
+        self.assertEqual("new int[][]{" + ", ".join(f"new int[]{{{i}, {i + 1}}}" for i in range(100_000)) + "}",
+                         t.to_java_literal(value))
+        # Each row is a struct of its count and items
+        self.assertEqual("(GridRowsItem[]) {" + ", ".join(f"{{2, (int[]) {{{i}, {i + 1}}}}}" for i in range(100_000))
+                         + "}, 100000", t.to_c_literal(value))
+
+    def test_nested_arrays_leave_types_untouched(self):
+        meta_class = MetaClass.from_dict("Grid", {"rows": [[1, 2], [3], [4, 5, 6]]})
+        t = meta_class.fields["rows"]
+        item_values = (t.item_type.value, t.item_type.item_type.value)
+        self.assertEqual("[[1, 2], [3], [4, 5, 6]]", t.to_python_literal(t.value))
+        self.assertEqual("new int[][]{new int[]{1, 2}, new int[]{3}, new int[]{4, 5, 6}}", t.to_java_literal(t.value))
+        self.assertEqual(item_values, (t.item_type.value, t.item_type.item_type.value))
+
+
+class TestStreamingGeneration(TestCase):
+    class_name = "Course"
+    test_json = """{
+        "availability": {"available": "Yes", "duration": {"type": "Continuous", "days_of_use": 0}},
+        "enrollment": {"type": "InstructorLed", "access_code": "string"},
+        "locale": {"id": "string", "force": true},
+        "has_children": true
+    }"""
+
+    class RecordingStream(io.StringIO):
+        def __init__(self):
+            super().__init__()
+            self.largest_write = 0
+
+        def write(self, s: str) -> int:
+            self.largest_write = max(self.largest_write, len(s))
+            return super().write(s)
+
+    def test_stream_matches_generated_string(self):
+        meta_class = MetaClass.from_json(self.class_name, self.test_json)
+        for language in ('python', 'java', 'go', 'c'):
+            stream = self.RecordingStream()
+            getattr(meta_class, f"generate_{language}_to")(stream)
+            expected = getattr(meta_class, f"generate_{language}")()
+            self.assertEqual(expected, stream.getvalue(), language)
+            self.assertLess(stream.largest_write, len(expected) / 4, language)
+
+
+class TestSinglePassInference(TestCase):
+    class_name = "User"
+
+    @staticmethod
+    def records_json(count: int) -> str:
+        return json.dumps([{"id": i, "name": f"user{i}", "tags": ["a", "b"], "score": i / 3,
+                            "address": {"city": "Metro City", "zip": 12345}} for i in range(count)])
+
+    def test_matches_two_pass_inference(self):
+        for test_class in (TestClassesAppearingInTwoFields, TestSeeminglyDifferentStructuresAppearingWithSameName,
+                           TestKeyWordsInFieldName, TestEmptyStructName):
+            for language in ('python', 'java', 'go', 'c'):
+                expected = getattr(MetaClass.from_json(self.class_name, test_class.test_json),
+                                   f"generate_{language}")()
+                actual = getattr(MetaClass.from_json(self.class_name, test_class.test_json, single_pass=True),
+                                 f"generate_{language}")()
+                self.assertEqual(expected, actual, f"{test_class.__name__} ({language})")
+
+    def test_arrays_keep_one_item_as_example(self):
+        meta_class = MetaClass.from_json(self.class_name, self.records_json(3), single_pass=True)
+        users = meta_class.fields["items"]
+        self.assertEqual(3, users.length)
+        self.assertEqual(1, len(users.value))
+        scores = MetaClass.from_json(self.class_name, '{"scores": [3, 1, 2]}', single_pass=True).fields["scores"]
+        self.assertEqual((1, 3), (scores.item_type.min_value, scores.item_type.max_value))
+        self.assertRegex(meta_class.generate_python(), r"tags=\['[ab]'\], score=")
+
+    def test_decoded_objects_and_arrays_are_never_held(self):
+        # How much memory this saves is measured by benchmarks.benchmark_single_pass_inference
+        with mock.patch("constructor.decoder.primitive_to_type", wraps=primitive_to_type) as scalar_to_type, \
+                mock.patch("json.loads", side_effect=AssertionError):
+            meta_class = MetaClass.from_json(self.class_name, self.records_json(1000), single_pass=True)
+        self.assertEqual(1000, meta_class.fields["items"].length)
+        self.assertEqual(1, len(meta_class.fields["items"].value))
+        # The id, name, two tags, score, city and zip of each record
+        self.assertEqual(7000, scalar_to_type.call_count)
+        for call in scalar_to_type.call_args_list:
+            self.assertNotIsInstance(call.args[0], (dict, list))
+
+    def test_errors(self):
+        data = '{"a": 1, "b": null, "c": {"d": []}, "e": [1, "two"]}'
+        meta_class = MetaClass.from_json(self.class_name, data, skip_fields_with_errors=True, single_pass=True)
+        self.assertEqual(["a"], list(meta_class.fields))
+        with self.assertRaises(NotImplementedError):
+            MetaClass.from_json(self.class_name, data, single_pass=True)
+        with self.assertRaises(NotImplementedError):
+            MetaClass.from_json(self.class_name, "[]", single_pass=True)
+        with self.assertRaises(json.JSONDecodeError):
+            MetaClass.from_json(self.class_name, "[1, 2,]", single_pass=True)
+
+
+class TestRetainValues(TestCase):
+    class_name = "User"
+    records_json = staticmethod(TestSinglePassInference.records_json)
+
+    def test_parse(self):
+        self.assertIsNone(RetainValues.parse('all').sample_size)
+        self.assertEqual(0, RetainValues.parse('none').sample_size)
+        self.assertEqual(5, RetainValues.parse('sample(5)').sample_size)
+        for setting in ('some', 'sample()', 'sample(-1)', 'sample(k)'):
+            with self.assertRaises(ValueError):
+                RetainValues.parse(setting)
+
+    def test_forked_contexts_change_settings_on_their_own(self):
+        context = GenerationContext(compact_numbers=True, python_lazy=True)
+        forked = context.fork()
+        forked.retain_values = RetainValues(0)
+        forked.python_main = False
+        self.assertTrue(context.retain_values.keeps_all)
+        self.assertTrue(context.python_main)
+        self.assertTrue(forked.compact_numbers and forked.python_lazy)
+        self.assertIs(context.unique_classnames, forked.unique_classnames)
+        # Every context has its own default too
+        self.assertIsNot(GenerationContext().retain_values, GenerationContext().retain_values)
+
+    def test_all_is_the_default(self):
+        data = self.records_json(5)
+        self.assertEqual(MetaClass.from_json(self.class_name, data).generate_python(),
+                         MetaClass.from_json(self.class_name, data, retain_values='all').generate_python())
+
+    def test_context_setting_is_kept_unless_given(self):
+        data = self.records_json(50)
+        for single_pass in (False, True):
+            context = GenerationContext(RetainValues.parse('sample(3)'))
+            meta_class = MetaClass.from_json(self.class_name, data, context=context, single_pass=single_pass)
+            self.assertEqual(3, len(meta_class.fields["items"].value))
+            context = GenerationContext(RetainValues.parse('none'))
+            meta_class = MetaClass.from_json(self.class_name, data, context=context, single_pass=single_pass,
+                                             retain_values='sample(2)')
+            self.assertEqual(2, len(meta_class.fields["items"].value))
+        record = {"name": "Ann", "scores": [1, 2]}
+        meta_class = MetaClass.from_dict(self.class_name, record, context=GenerationContext(RetainValues(0)))
+        self.assertIsNone(meta_class.fields["scores"].value)
+        meta_class = MetaClass.from_jsonl(self.class_name, [json.dumps(record)],
+                                          context=GenerationContext(RetainValues(0)))
+        self.assertIsNone(meta_class.fields["scores"].value)
+
+    def test_sample_keeps_at_most_k_items(self):
+        for single_pass in (False, True):
+            meta_class = MetaClass.from_json(self.class_name, self.records_json(50), single_pass=single_pass,
+                                             retain_values='sample(3)')
+            users = meta_class.fields["items"]
+            self.assertEqual(50, users.length)
+            self.assertEqual(3, len(users.value))
+            self.assertTrue(all(len(user["tags"]) == 2 for user in users.value))
+
+    def test_sample_is_reproducible(self):
+        data = json.dumps({"values": list(range(1000))})
+        samples = [MetaClass.from_json(self.class_name, data, retain_values='sample(10)').fields["values"].value
+                   for _ in range(2)]
+        self.assertEqual(samples[0], samples[1])
+        self.assertNotEqual(list(range(10)), samples[0])
+
+    def test_none_generates_default_examples(self):
+        for single_pass in (False, True):
+            meta_class = MetaClass.from_json(self.class_name, '{"name": "Ann", "age": 30, "scores": [1], '
+                                                              '"address": {"city": "Metro City"}}',
+                                             single_pass=single_pass, retain_values='none')
+            self.assertIsNone(meta_class.fields["scores"].value)
+            self.assertIn("user = User(name='', age=0, scores=[], address=Address(city=''))",
+                          meta_class.generate_python())
+            self.assertIn('new User("", 0, new int[]{}, new Address(""))', meta_class.generate_java())
+            self.assertIn('User_new("", 0, (int[]) {}, 0, Address_make(""))', meta_class.generate_c())
+
+    @classmethod
+    def retained_values(cls, value) -> int:
+        """
+        Count the scalars in a value kept by a type, or by the types of its nested fields and items
+        """
+        if isinstance(value, (Array, Object)):
+            nested = [value.item_type] if isinstance(value, Array) else value.object_class.fields.values()
+            return cls.retained_values(value.value) + sum(map(cls.retained_values, nested))
+        if isinstance(value, Type):
+            return cls.retained_values(value.value)
+        if isinstance(value, dict):
+            return sum(map(cls.retained_values, value.values()))
+        if isinstance(value, list):
+            return sum(map(cls.retained_values, value))
+        return value is not None
+
+    def test_retained_values_do_not_grow_with_array_length(self):
+        # How much memory this saves is measured by benchmarks.benchmark_retained_values
+        def retained_values(count: int, retain_values: str) -> int:
+            meta_class = MetaClass.from_json(self.class_name, self.records_json(count), retain_values=retain_values)
+            return sum(map(self.retained_values, meta_class.fields.values()))
+
+        self.assertGreater(retained_values(4000, 'all'), 3 * retained_values(1000, 'all'))
+        for retain_values in ('sample(5)', 'none'):
+            self.assertEqual(retained_values(1000, retain_values), retained_values(4000, retain_values), retain_values)
+        self.assertEqual(0, retained_values(4000, 'none'))
+
+
+class TestJsonLines(TestCase):
+    class_name = "LogRecord"
+
+    @staticmethod
+    def records(count: int):
+        for i in range(count):
+            yield json.dumps({"id": i, "level": "INFO" if i % 2 else "WARNING", "latency": i / 7,
+                              "tags": ["a"] * (i % 5 + 1), "source": {"host": f"web{i % 3}", "port": 8000 + i}})
+
+    def test_matches_single_record(self):
+        record = next(self.records(1))
+        self.assertEqual(MetaClass.from_json(self.class_name, record).generate_python(),
+                         MetaClass.from_jsonl(self.class_name, [record]).generate_python())
+
+    def test_merges_records(self):
+        meta_class = MetaClass.from_jsonl(self.class_name, self.records(100))
+        self.assertEqual((0, 99), (meta_class.fields["id"].min_value, meta_class.fields["id"].max_value))
+        self.assertEqual(99 / 7, meta_class.fields["latency"].max_value)
+        self.assertEqual(7, meta_class.fields["level"].length)
+        self.assertEqual(5, meta_class.fields["tags"].length)
+        self.assertEqual(8099, meta_class.fields["source"].object_class.fields["port"].max_value)
+        # The first record is the example
+        self.assertIn("id_field=0, level='WARNING'", meta_class.generate_python())
+
+    def test_widens_integers_across_records(self):
+        meta_class = MetaClass.from_jsonl(self.class_name, ['{"id": 1}', '', '{"id": 3000000000}\n'])
+        self.assertEqual('long', meta_class.fields["id"].to_java)
+        self.assertIn("new LogRecord(1L)", meta_class.generate_java())
+
+    def test_reads_files(self):
+        data = io.BytesIO('\n'.join(self.records(10)).encode())
+        self.assertEqual(9, MetaClass.from_jsonl(self.class_name, data).fields["id"].max_value)
+
+    def test_peak_memory_does_not_grow_with_records(self):
+        peaks = []
+        for count in (1000, 4000):
+            tracemalloc.start()
+            MetaClass.from_jsonl(self.class_name, self.records(count))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        self.assertLess(peaks[1], peaks[0] * 1.5)
+
+    def test_errors(self):
+        with self.assertRaises(NotImplementedError):
+            MetaClass.from_jsonl(self.class_name, ['{"id": 1}', '[1, 2]'])
+        with self.assertRaises(NotImplementedError):
+            MetaClass.from_jsonl(self.class_name, ['{"id": 1}', '{"id": "one"}'])
+        with self.assertRaises(NotImplementedError):
+            MetaClass.from_jsonl(self.class_name, ['', '  '])
+        with self.assertRaises(json.JSONDecodeError):
+            MetaClass.from_jsonl(self.class_name, ['{"id": 1}', '{"id": '])
+
+
+class TestSchemaMerging(TestCase):
+    class_name = "Team"
+
+    def test_object_fields_are_unioned_with_presence_counts(self):
+        meta_class = MetaClass.from_json(self.class_name, TestArrayOfObjectsWithDifferentFields.test_json)
+        member_class = meta_class.fields["members"].item_type.object_class
+        self.assertEqual(["name", "age", "nickname", "address", "scores"], list(member_class.fields))
+        self.assertEqual(3, member_class.samples)
+        self.assertEqual([3, 2, 1, 1, 1], [t.count for t in member_class.fields.values()])
+        self.assertEqual([False, True, True, True, True], [member_class.is_optional(t)
+                                                           for t in member_class.fields.values()])
+        self.assertIn('`json:"nickname,omitempty"`', meta_class.generate_go())
+
+    def test_integers_widen_to_doubles(self):
+        for values in ([1, 2.5, 3], [2.5, 1, 3]):
+            t = MetaClass.from_dict(self.class_name, {"values": values}).fields["values"]
+            self.assertEqual("double", t.item_type.to_java)
+            self.assertEqual((1.0, 3.0), (t.item_type.min_value, t.item_type.max_value))
+            self.assertEqual(3, t.item_type.count)
+
+    def test_keeps_maximum_lengths(self):
+        meta_class = MetaClass.from_dict(self.class_name, {"rows": [{"name": "a", "tags": [1]},
+                                                                    {"name": "abcd", "tags": [1, 2, 3]},
+                                                                    {"name": "ab", "tags": [1, 2]}]})
+        row_class = meta_class.fields["rows"].item_type.object_class
+        self.assertEqual(4, row_class.fields["name"].length)
+        self.assertEqual(3, row_class.fields["tags"].length)
+
+    def test_incompatible_types_still_fail(self):
+        with self.assertRaises(NotImplementedError):
+            MetaClass.from_dict(self.class_name, {"values": [1, "two"]})
+        with self.assertRaises(NotImplementedError):
+            MetaClass.from_dict(self.class_name, {"rows": [{"id": 1}, {"id": "one"}]})
+
+    def test_memory_depends_on_distinct_fields_not_elements(self):
+        def retained_memory(count: int) -> int:
+            data = {"rows": [{"id": i, f"field{i % 10}": i / 2} for i in range(count)]}
+            tracemalloc.start()
+            meta_class = MetaClass.from_dict(self.class_name, data, retain_values='none')
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            self.assertEqual(11, len(meta_class.fields["rows"].item_type.object_class.fields))
+            return size
+
+        self.assertLess(retained_memory(20000), 1.5 * retained_memory(2000))
+
+
+class TestParallelInference(TestCase):
+    class_name = "User"
+
+    @staticmethod
+    def records(count: int):
+        return [{"id": i, "name": "n" * (i % 9), "score": i / 3 if i % 2 else i, "tags": ["x"] * (i % 4 + 1),
+                 "address": {"zip": i, "city": "Metro City"}, **({"admin": True} if i % 5 == 0 else {})}
+                for i in range(count)]
+
+    def test_matches_serial_inference(self):
+        records = self.records(1000)
+        serial = MetaClass.from_json(self.class_name, json.dumps(records), retain_values='none')
+        serial_jsonl = MetaClass.from_jsonl(self.class_name, map(json.dumps, records), retain_values='none')
+        with ProcessPoolExecutor(2) as executor:
+            parallel = MetaClass.from_json_parallel(self.class_name, json.dumps(records), executor=executor,
+                                                    chunk_size=64)
+            parallel_jsonl = MetaClass.from_jsonl_parallel(self.class_name, map(json.dumps, records),
+                                                           executor=executor, chunk_size=64)
+        for language in ('python', 'java', 'go', 'c'):
+            self.assertEqual(getattr(serial, f"generate_{language}")(),
+                             getattr(parallel, f"generate_{language}")(), language)
+            self.assertEqual(getattr(serial_jsonl, f"generate_{language}")(),
+                             getattr(parallel_jsonl, f"generate_{language}")(), language)
+        self.assertEqual(1000, parallel.fields["items"].length)
+        self.assertEqual(999, parallel.fields["items"].item_type.object_class.fields["id"].max_value)
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        """
+        Records the chunks submitted to it, and the most chunks submitted but not yet inferred at once
+        """
+
+        def __init__(self):
+            super().__init__(2)
+            self.chunks = []
+            self.futures = []
+            self.largest_window = 0
+
+        def submit(self, fn, chunk, *args, **kwargs):
+            self.chunks.append(chunk)
+            self.futures.append(super().submit(fn, chunk, *args, **kwargs))
+            self.largest_window = max(self.largest_window, sum(not future.done() for future in self.futures))
+            return self.futures[-1]
+
+    def test_workers_decode_their_own_chunks(self):
+        records = self.records(1000)
+        data = json.dumps(records, indent=2)
+        with self.RecordingExecutor() as executor:
+            parallel = MetaClass.from_json_parallel(self.class_name, data, executor=executor, chunk_size=64)
+        serial = MetaClass.from_json(self.class_name, data, retain_values='none')
+        self.assertEqual(serial.generate_python(), parallel.generate_python())
+        self.assertGreater(len(executor.chunks), 10)
+        self.assertTrue(all(isinstance(chunk, str) for chunk in executor.chunks))
+        self.assertEqual(records, json.loads('[' + ','.join(executor.chunks) + ']'))
+
+    def test_chunks_are_cut_between_items_whatever_they_hold(self):
+        # Nested objects start with the same key as the items, and strings hold what items start with
+        records = [{"id": i, "note": ', {"id": 1, "x": [' * (i % 3),
+                    "children": [{"id": j, "children": [{"id": j}] * (j % 2 + 1)} for j in range(i % 4 + 1)]}
+                   for i in range(300)]
+        data = json.dumps(records)
+        serial = MetaClass.from_json(self.class_name, data, retain_values='none')
+        for chunk_size in (1, 7, 64):
+            with self.RecordingExecutor() as executor:
+                parallel = MetaClass.from_json_parallel(self.class_name, data, executor=executor,
+                                                        chunk_size=chunk_size)
+            self.assertEqual(serial.generate_python(), parallel.generate_python(), chunk_size)
+            self.assertEqual(300, parallel.fields["items"].length)
+            # Every chunk but the last holds exactly chunk_size items, so nothing was decoded as a whole
+            chunks = [json.loads('[' + chunk + ']') for chunk in executor.chunks]
+            self.assertEqual([chunk_size] * (len(chunks) - 1), [len(chunk) for chunk in chunks[:-1]])
+            self.assertEqual(records, [record for chunk in chunks for record in chunk])
+        with self.RecordingExecutor() as executor:
+            values = MetaClass.from_json_parallel(self.class_name, json.dumps(["a, b", "c", "d,", ",e"] * 50),
+                                                  executor=executor, chunk_size=3).fields["items"]
+        self.assertEqual((200, 4), (values.length, values.item_type.length))
+        self.assertEqual(67, len(executor.chunks))
+
+    def test_context_given_keeps_its_retained_values(self):
+        context = GenerationContext(enum_limit=3)
+        with self.RecordingExecutor() as executor:
+            MetaClass.from_json_parallel(self.class_name, json.dumps(self.records(10)), executor=executor,
+                                         context=context)
+            MetaClass.from_jsonl_parallel(self.class_name, map(json.dumps, self.records(10)), executor=executor,
+                                          context=context)
+        self.assertTrue(context.retain_values.keeps_all)
+
+    def test_invalid_json(self):
+        with self.RecordingExecutor() as executor:
+            for data in ('[{"id": 1}, ]', '[{"id": 1}] x', '[{"id": 1}, {"id": 2}', '[{"id": 1},, {"id": 2}]'):
+                with self.assertRaises(json.JSONDecodeError, msg=data):
+                    MetaClass.from_json_parallel(self.class_name, data, executor=executor, chunk_size=1)
+
+    def test_pending_chunks_are_limited(self):
+        lines = map(json.dumps, self.records(100))
+        with self.RecordingExecutor() as executor:
+            MetaClass.from_jsonl_parallel(self.class_name, lines, executor=executor, chunk_size=10, max_pending=1)
+        self.assertEqual(10, len(executor.chunks))
+        self.assertLessEqual(executor.largest_window, 1)
+        with self.assertRaises(ValueError):
+            MetaClass.from_json_parallel(self.class_name, '[1, 2]', executor=executor, max_pending=0)
+
+    def test_partial_schemas_are_value_free_and_picklable(self):
+        schema = infer_schema([{"secret": "hunter2", "pin": 1234, "nested": {"key": ["value"]}}])
+        self.assertEqual(schema, pickle.loads(pickle.dumps(schema)))
+        self.assertNotIn("hunter2", json.dumps(schema))
+        self.assertNotIn("value", json.dumps(schema["fields"]["nested"]))
+        self.assertEqual({"type": "integer", "count": 1, "min": 1234, "max": 1234, "position": 1},
+                         {k: v for k, v in schema["fields"]["pin"].items() if k != "statistics"})
+
+    def test_partial_schemas_merge_associatively(self):
+        records = self.records(30)
+        schemas = [infer_schema(records[i:i + 10]) for i in range(0, 30, 10)]
+
+        def merge(a: dict, b: dict) -> dict:
+            context = GenerationContext()
+            return schema_to_type(a, '', context).merge(schema_to_type(b, '', context)).to_schema()
+
+        self.assertEqual(merge(merge(schemas[0], schemas[1]), schemas[2]),
+                         merge(schemas[0], merge(schemas[1], schemas[2])))
+        self.assertEqual(infer_schema(records), merge(merge(schemas[0], schemas[1]), schemas[2]))
+
+    def test_errors(self):
+        with ThreadPoolExecutor(2) as executor:
+            with self.assertRaises(NotImplementedError):
+                MetaClass.from_json_parallel(self.class_name, '[]', executor=executor)
+            with self.assertRaises(NotImplementedError):
+                MetaClass.from_json_parallel(self.class_name, '[{"id": 1}, {"id": "one"}]', executor=executor,
+                                             chunk_size=1)
+            with self.assertRaises(NotImplementedError):
+                MetaClass.from_jsonl_parallel(self.class_name, ['{"id": 1}', '[1]'], executor=executor)
+            with self.assertRaises(NotImplementedError):
+                MetaClass.from_jsonl_parallel(self.class_name, ['', ''], executor=executor)
+        self.assertEqual(["id"], list(MetaClass.from_json_parallel(self.class_name, '{"id": 1}').fields))
+
+
+class TestSketches(TestCase):
+    class_name = "Event"
+
+    @staticmethod
+    def node_sketches():
+        nodes = [
+            [{"id": 1, "kind": "click", "meta": {"x": 3}}, {"id": 2, "kind": "view", "tags": ["a"]}],
+            [{"kind": "purchase", "id": 3000000000, "amount": 9.99, "meta": {"x": 1.5, "y": 2}}],
+            [{"id": 4, "user": {"name": "Ann"}, "tags": ["b", "c", "d"]}, {"id": 5, "kind": "view"}],
+        ]
+        return [MetaClass.from_jsonl(TestSketches.class_name, map(json.dumps, records), retain_values='none')
+                .to_sketch() for records in nodes]
+
+    def test_sketches_are_versioned_json(self):
+        sketch = self.node_sketches()[0]
+        self.assertEqual(SKETCH_VERSION, sketch["version"])
+        self.assertEqual(sketch, json.loads(json.dumps(sketch)))
+        self.assertEqual({"type": "integer", "count": 2, "min": 1, "max": 2, "position": 0},
+                         {k: v for k, v in sketch["schema"]["fields"]["id"].items() if k != "statistics"})
+        self.assertEqual(2, MetaClass.from_sketches([sketch]).fields["id"].statistics.distinct_count)
+
+    def test_merge_does_not_depend_on_order(self):
+        a, b, c = self.node_sketches()
+        expected = merge_sketches([a, b, c])
+        for sketches in ([c, b, a], [b, a, c], [merge_sketches([c, a]), b], [a, merge_sketches([b, c])]):
+            self.assertEqual(expected, merge_sketches(sketches))
+        for language in ('python', 'java', 'go', 'c'):
+            self.assertEqual(getattr(MetaClass.from_sketches([a, b, c]), f"generate_{language}")(),
+                             getattr(MetaClass.from_sketches([c, a, b]), f"generate_{language}")(), language)
+
+    def test_merged_class(self):
+        meta_class = MetaClass.from_sketches(self.node_sketches())
+        self.assertEqual("Event", meta_class.name)
+        self.assertEqual(["id", "kind", "user", "amount", "meta", "tags"], list(meta_class.fields))
+        self.assertEqual(5, meta_class.samples)
+        self.assertEqual(3000000000, meta_class.fields["id"].max_value)
+        self.assertEqual('long', meta_class.fields["id"].to_java)
+        self.assertEqual(3, meta_class.fields["tags"].length)
+        self.assertEqual(4, meta_class.fields["kind"].count)
+        meta = meta_class.fields["meta"].object_class
+        self.assertEqual(("double", True), (meta.fields["x"].to_java, meta.is_optional(meta.fields["y"])))
+
+    def test_context_given_keeps_its_retained_values(self):
+        context = GenerationContext(enum_limit=3)
+        meta_class = MetaClass.from_sketches(self.node_sketches(), context=context)
+        self.assertFalse(meta_class.context.retain_values.keeps_any)
+        self.assertTrue(context.retain_values.keeps_all)
+
+    def test_reads_files(self):
+        files = []
+        for sketch in self.node_sketches():
+            files.append(io.StringIO())
+            json.dump(sketch, files[-1])
+            files[-1].seek(0)
+        self.assertEqual(merge_sketches(self.node_sketches()), merge_sketches(files))
+
+    def test_errors(self):
+        sketch = self.node_sketches()[0]
+        for invalid in ({**sketch, "version": SKETCH_VERSION + 1}, {**sketch, "format": "other"},
+                        {**sketch, "name": "Other"}):
+            with self.assertRaises(ValueError):
+                merge_sketches([sketch, invalid])
+        with self.assertRaises(ValueError):
+            MetaClass.from_sketches([])
+
+
+class TestStatistics(TestCase):
+    class_name = "Request"
+
+    @staticmethod
+    def records(count: int):
+        # One path in a thousand is much longer than the rest
+        for i in range(count):
+            record = {"path": "/" + "x" * (i % 20) if i % 1000 else "/" + "x" * 5000, "status": 200 + i % 5 * 100,
+                      "tags": ["a"] * (i % 8 + 1)}
+            if i % 4:
+                record["user"] = f"user{i % 300}"
+            yield json.dumps(record)
+
+    def test_collects_field_statistics(self):
+        meta_class = MetaClass.from_jsonl(self.class_name, self.records(10000))
+        path, status, tags, user = (meta_class.fields[field] for field in ("path", "status", "tags", "user"))
+        self.assertEqual(5001, path.length)
+        self.assertEqual(20, path.capacity)
+        self.assertEqual(11, path.statistics.length_percentile(50))
+        self.assertEqual(8, tags.capacity)
+        self.assertEqual(5, status.statistics.distinct_count)
+        # Records without a user are the ones whose user would have been a multiple of 4
+        self.assertAlmostEqual(225, user.statistics.distinct_count, delta=15)
+        self.assertEqual(0.25, meta_class.absent_rate(user))
+        self.assertEqual(0, meta_class.absent_rate(path))
+
+    def test_distinct_count_estimates(self):
+        for count in (1, 10, 100, 1000, 100000):
+            statistics = MetaClass.from_dict(self.class_name, {"ids": list(range(count))}).fields["ids"]\
+                .item_type.statistics
+            self.assertAlmostEqual(count, statistics.distinct_count, delta=max(1, count * 0.1))
+        values = MetaClass.from_dict(self.class_name, {"values": [1, 2.0, 2, 1.0, 3.5]}).fields["values"]
+        self.assertEqual(3, values.item_type.statistics.distinct_count)
+
+    def test_constant_memory_per_field(self):
+        def schema_size(count: int) -> int:
+            return len(json.dumps(MetaClass.from_jsonl(self.class_name, self.records(count)).to_schema()))
+
+        self.assertLess(schema_size(20000), 1.2 * schema_size(5000))
+
+    def test_statistics_merge_like_types(self):
+        records = list(self.records(3000))
+        serial = MetaClass.from_jsonl(self.class_name, records).to_schema()
+        sketches = [MetaClass.from_jsonl(self.class_name, records[i:i + 1000]).to_sketch()
+                    for i in range(0, 3000, 1000)]
+        self.assertEqual(serial, MetaClass.from_sketches(reversed(sketches)).to_schema())
+
+    def test_schemas_do_not_contain_hashes_of_values(self):
+        schema = json.dumps(MetaClass.from_dict(self.class_name, {"pin": 1234, "password": "hunter2"}).to_schema())
+        self.assertNotIn(str(stable_hash(1234)), schema)
+        self.assertNotIn(str(stable_hash("hunter2")), schema)
+
+
+class TestDefaultOutput(TestCase):
+    records = [{"name": "Molecule Man", "age": 29, "status": "active", "powers": ["Radiation resistance"],
+                "friends": [{"nick": "Jane"}], "owner": {"id": 1}}] * 2
+    # Each option with the language it changes, and text which that language only holds when the option is on
+    options = [({"enum_limit": 4}, "python", ("(Enum)",)),
+               ({"compact_numbers": True}, "c", ("uint8_t",)),
+               ({"c_arena": True}, "c", ("Arena", "Hero_new_in")),
+               ({"c_parser": True}, "c", ("_from_json", "StringView")),
+               ({"go_json": True}, "go", ("MarshalJSON", "import")),
+               ({"java_json": True}, "java", ("fromJson", "java.io")),
+               ({"python_slots": True}, "python", ("__slots__",)),
+               ({"python_columns": True}, "python", ("Columns",)),
+               ({"python_lazy": True}, "python", ("_NOT_BUILT",))]
+
+    def generate(self, language: str, **kwargs) -> str:
+        meta_class = MetaClass.from_jsonl("Hero", map(json.dumps, self.records), context=GenerationContext(**kwargs))
+        return getattr(meta_class, f"generate_{language}")()
+
+    def test_options_are_off_by_default(self):
+        defaults = {language: self.generate(language) for language in ("python", "java", "go", "c")}
+        for kwargs, language, texts in self.options:
+            with self.subTest(**kwargs):
+                enabled = self.generate(language, **kwargs)
+                for text in texts:
+                    self.assertNotIn(text, defaults[language])
+                    self.assertIn(text, enabled)
+        # Structs are allocated on their own unless they are built in an arena
+        self.assertIn("    Hero_free(hero);\n", defaults["c"])
+
+
+class TestEnums(TestCase):
+    class_name = "Order"
+
+    @staticmethod
+    def records(count: int):
+        return [{"id": i, "status": ("active", "done", "in-progress")[i % 3], "name": f"customer{i}",
+                 "tags": ["a", "b"][i % 2:], "address": {"region": ("eu", "us")[i % 2]}} for i in range(count)]
+
+    def meta_class(self, records, enum_limit: int = 4, retain_values: str = 'all') -> MetaClass:
+        return MetaClass.from_jsonl(self.class_name, map(json.dumps, records),
+                                    context=GenerationContext(enum_limit=enum_limit), retain_values=retain_values)
+
+    def test_low_cardinality_strings_become_enums(self):
+        meta_class = self.meta_class(self.records(100))
+        status, name, tags = (meta_class.fields[field] for field in ("status", "name", "tags"))
+        self.assertEqual("OrderStatus", status.to_java)
+        self.assertEqual({"active": "ACTIVE", "done": "DONE", "in-progress": "IN_PROGRESS"}, status.members)
+        self.assertEqual("String", name.to_java)
+        self.assertEqual("OrderTag[]", tags.to_java)
+        self.assertEqual("AddressRegion", meta_class.fields["address"].object_class.fields["region"].to_go)
+        # Too many distinct values, or values which were never repeated
+        self.assertEqual("String", self.meta_class(self.records(100), enum_limit=2).fields["status"].to_java)
+        self.assertEqual("String", self.meta_class(self.records(3)).fields["status"].to_java)
+
+    def test_named_after_unique_class_names(self):
+        records = [{"a": {"person": {"kind": kind}}, "b": {"person": {"kind": kind, "age": 1}}} for kind in "xyxy"]
+        meta_class = self.meta_class(records)
+        people = [meta_class.fields[field].object_class.fields["person"].object_class for field in ("a", "b")]
+        self.assertEqual(["PersonKind", "Person2Kind"], [person.fields["kind"].to_java for person in people])
+
+    def test_schemas_list_values_only_when_enabled(self):
+        default = MetaClass.from_jsonl(self.class_name, map(json.dumps, self.records(100)))
+        self.assertNotIn("values", json.dumps(default.to_schema()))
+        enums = self.meta_class(self.records(100))
+        self.assertIn('"values": ["active", "done", "in-progress"]', json.dumps(enums.to_schema()))
+        with self.assertRaises(ValueError):
+            GenerationContext(enum_limit=-1)
+
+    def test_generated_python_keeps_unknown_values(self):
+        module = {}
+        exec(self.meta_class(self.records(100)).generate_python(), module)
+        record = {"id": 1, "status": "in-progress", "name": "x", "tags": ["b"], "address": {"region": "eu"}}
+        order = module["Order"].from_dict(record)
+        self.assertIs(module["OrderStatus"].IN_PROGRESS, order.status)
+        self.assertEqual(record, order.to_dict())
+        # Values never seen are read as UNKNOWN, but keep the string so that they are written back as they were
+        unknown = {**record, "status": "cancelled", "tags": ["z", "a"]}
+        order = module["Order"].from_dict(unknown)
+        self.assertEqual(("UNKNOWN", "cancelled"), (order.status.name, order.status.value))
+        self.assertEqual([("UNKNOWN", "z"), ("A", "a")], [(tag.name, tag.value) for tag in order.tags])
+        self.assertEqual(unknown, order.to_dict())
+        self.assertEqual(unknown, json.loads(order.to_json()))
+        self.assertIs(module["OrderStatus"].UNKNOWN, module["OrderStatus"](None))
+
+    def test_generated_code_for_other_languages(self):
+        meta_class = self.meta_class(self.records(100))
+        self.assertIn('case "in-progress": return IN_PROGRESS;', meta_class.generate_java())
+        self.assertIn("OrderStatusUnknown OrderStatus = iota", meta_class.generate_go())
+        self.assertIn("Status OrderStatus `json:\"status\"`", meta_class.generate_go())
+        c_source = meta_class.generate_c()
+        self.assertIn("OrderStatus status;", c_source)
+        self.assertIn("return ORDER_STATUS_UNKNOWN;", c_source)
+        self.assertIn('Order_new(0, ORDER_STATUS_ACTIVE, "customer0", (OrderTag[]) {ORDER_TAG_A, ORDER_TAG_B}',
+                      c_source)
+
+    def test_parallel_inference_and_sketches_keep_enums(self):
+        records = self.records(100)
+        serial = self.meta_class(records, retain_values='none')
+        with ThreadPoolExecutor(2) as executor:
+            parallel = MetaClass.from_jsonl_parallel(self.class_name, map(json.dumps, records), executor=executor,
+                                                     chunk_size=10, context=GenerationContext(enum_limit=4))
+        self.assertEqual(serial.generate_python(), parallel.generate_python())
+        sketches = [self.meta_class(records[i:i + 50], retain_values='none').to_sketch() for i in (0, 50)]
+        self.assertEqual(serial.generate_go(), MetaClass.from_sketches(sketches).generate_go())
+
+
+class TestCompactNumbers(TestCase):
+    class_name = "Counter"
+    data = {"small": 5, "negative": -3, "medium": 40000, "large": -2**40, "counts": [1, 2, 255],
+            "nested": {"wide": 70000}}
+
+    def meta_class(self, compact_numbers: bool = True) -> MetaClass:
+        return MetaClass.from_dict(self.class_name, self.data,
+                                   context=GenerationContext(compact_numbers=compact_numbers))
+
+    def test_narrowest_types(self):
+        fields = self.meta_class().fields
+        types = {field: (t.to_c, t.to_go, t.to_java) for field, t in fields.items()}
+        self.assertEqual(("uint8_t", "uint8", "byte"), types["small"])
+        self.assertEqual(("int8_t", "int8", "byte"), types["negative"])
+        self.assertEqual(("uint16_t", "uint16", "int"), types["medium"])
+        self.assertEqual(("int64_t", "int64", "long"), types["large"])
+        self.assertEqual(("uint8_t", "[]uint8", "short[]"), types["counts"])
+        self.assertEqual("uint32_t", fields["nested"].object_class.fields["wide"].to_c)
+
+    def test_literals_and_formats(self):
+        meta_class = self.meta_class()
+        java_source = meta_class.generate_java()
+        self.assertIn("new Counter((byte) 5, (byte) -3, 40000, -1099511627776L, new short[]{(short) 1,", java_source)
+        c_source = meta_class.generate_c()
+        self.assertIn("#include <stdint.h>", c_source)
+        self.assertIn("    Counter_json_write_unsigned(writer, p->small);\n", c_source)
+        self.assertIn("    Counter_json_write_integer(writer, p->negative);\n", c_source)
+        self.assertIn("Counter_new(5, -3, 40000, -1099511627776, (uint8_t[]) {1, 2, 255}", c_source)
+
+
+class TestMinimizePadding(TestCase):
+    class_name = "Record"
+    data = {"active": True, "score": 1.5, "flag": False, "count": 3, "name": "x", "ok": True, "tags": [1, 2],
+            "nested": {"a": True, "b": 2.0, "c": False}}
+
+    def meta_class(self, minimize_padding: bool = True) -> MetaClass:
+        return MetaClass.from_dict(self.class_name, self.data,
+                                   context=GenerationContext(minimize_padding=minimize_padding))
+
+    def test_fields_are_ordered_by_alignment(self):
+        meta_class = self.meta_class()
+        self.assertEqual(["score", "name", "tags", "nested", "count", "active", "flag", "ok"],
+                         list(meta_class.get_c_struct_fields()))
+        self.assertEqual(["Score", "Count", "Name", "Tags", "Nested", "Active", "Flag", "Ok"],
+                         list(meta_class.get_go_struct_fields()))
+        self.assertEqual(((56, 8), (80, 8)), (meta_class.c_layout, meta_class.go_layout))
+        self.assertEqual(((80, 8), (104, 8)), (self.meta_class(False).c_layout, self.meta_class(False).go_layout))
+
+    def test_tags_and_constructors_keep_json_order(self):
+        c_source = self.meta_class().generate_c()
+        self.assertIn("// Fields ordered to minimize padding: sizeof(Record) is 56 bytes, 72 in JSON order", c_source)
+        self.assertIn("Record* Record_new(bool active, double score, bool flag, int count,", c_source)
+        go_source = self.meta_class().generate_go()
+        self.assertIn("    Score float64 `json:\"score\"`\n    Count int `json:\"count\"`", go_source)
+        self.assertIn("func NewRecord(active bool, score float64, flag bool, count int,", go_source)
+        self.assertNotIn("minimize padding", self.meta_class(False).generate_c())
+
+    def test_sizes_match_compiler(self):
+        meta_class = self.meta_class()
+        nested_class = meta_class.fields["nested"].object_class
+        source = "\n".join(["#include <stdbool.h>", "#include <stddef.h>", *nested_class.generate_c_struct_lines(),
+                            *meta_class.generate_c_struct_lines(),
+                            f"_Static_assert(sizeof(Record) == {meta_class.c_layout[0]}, \"Record\");",
+                            f"_Static_assert(sizeof(Nested) == {nested_class.c_layout[0]}, \"Nested\");"])
+        subprocess.run([GCC_BINARY_PATH, '-fsyntax-only', '-x', 'c', '-'], input=source.encode(), check=True)
+
+
+class TestInlineArrays(TestCase):
+    class_name = "Hero"
+    data = {"name": "Molecule Man", "age": 29, "powers": ["Radiation resistance", "Turning tiny"],
+            "scores": [1.5, 2.5, 3.0], "friends": [{"nick": "Jane", "ids": [1, 2]}], "matrix": [[1, 2], [3]]}
+
+    def meta_class(self) -> MetaClass:
+        return MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(inline_arrays=True))
+
+    def tearDown(self):
+        for fp in ("inline_arrays.c", "inline_arrays"):
+            if os.path.exists(fp):
+                os.remove(fp)
+
+    def test_declarations(self):
+        c_source = self.meta_class().generate_c()
+        for declaration in ("char name[13];", "size_t powers_count;", "char powers[2][21];", "double scores[3];",
+                            "Friend friends[1];", "char nick[5];", "int ids[2];"):
+            self.assertIn(f"    {declaration}\n", c_source)
+        # Arrays of arrays are left behind pointers, with each item a struct of its count and items
+        self.assertIn("    size_t matrix_count;\n    HeroMatrixItem * matrix;\n", c_source)
+        self.assertIn("struct HeroMatrixItem {\n    size_t count;\n    int * items;\n};\n", c_source)
+        self.assertIn("Hero* Hero_new(const char * name, int age, const char * powers[], size_t powers_count, "
+                      "double scores[], size_t scores_count, Friend friends[], size_t friends_count, "
+                      "HeroMatrixItem matrix[], size_t matrix_count)", c_source)
+        self.assertIn('(const char *[]) {"Radiation resistance", "Turning tiny"}, 2, (double[]) {1.5, 2.5, 3.0}, 3',
+                      c_source)
+
+    def test_strings_are_sized_in_utf8_bytes(self):
+        context = GenerationContext(inline_arrays=True)
+        name = MetaClass.from_dict(self.class_name, {"name": "Zo\u00eb \u2603"}, context=context).fields["name"]
+        self.assertEqual(8, name.length)
+        self.assertEqual(["char name[9];"], name.c_declarations("name"))
+
+    def test_capacity_ignores_outliers(self):
+        data = {"rows": [{"ids": [1] * (100 if i == 0 else i % 4 + 1)} for i in range(2000)]}
+        rows = MetaClass.from_dict(self.class_name, data, context=GenerationContext(inline_arrays=True)).fields["rows"]
+        ids = rows.item_type.object_class.fields["ids"]
+        self.assertEqual(["size_t ids_count;", "int ids[4];"], ids.c_declarations("ids"))
+
+    def test_c_copies_values_into_a_single_allocation(self):
+        meta_class = self.meta_class()
+        sizes = ''.join(f'    printf("%d ", (int) sizeof({name}) == {size});\n'
+                        for name, size in (("Hero", meta_class.c_layout[0]),
+                                           ("Friend", meta_class.fields["friends"].item_type.c_layout[0])))
+        source = meta_class.generate_c().replace("    return 0;", sizes + """\
+    char power[] = "Turning tiny";
+    Hero * copy = Hero_new("A name longer than the capacity", 1, (const char *[]) {power}, 1, (double[]) {1, 2, 3, 4},
+                           4, (Friend[]) {}, 0, (HeroMatrixItem[]) {}, 0);
+    power[0] = 'B';
+    printf("%s %s %d %f", copy->name, copy->powers[0], (int) copy->scores_count, copy->scores[2]);
+    Hero * accented = Hero_new("A name long\u00e9r", 1, (const char *[]) {}, 0, (double[]) {}, 0, (Friend[]) {}, 0,
+                               (HeroMatrixItem[]) {}, 0);
+    printf(" %s", accented->name);
+    return 0;""")
+        with open("inline_arrays.c", "w") as f:
+            f.write(source)
+        subprocess.check_output([GCC_BINARY_PATH, "-Dprintf_s=printf", "inline_arrays.c", "-o", "inline_arrays"])
+        output = subprocess.check_output([os.path.abspath("inline_arrays")]).decode()
+        self.assertTrue(output.endswith("1 1 A name longe Turning tiny 3 3.000000 A name long"), output)
+
+
+class TestCArena(TestCase):
+    class_name = "Hero"
+    data = {"name": "Molecule Man", "age": 29, "friends": [{"nick": "Jane"}], "owner": {"id": 1}}
+
+    def tearDown(self):
+        for fp in ("arena.c", "arena", "free.c", "free"):
+            if os.path.exists(fp):
+                os.remove(fp)
+
+    def test_c_frees_what_it_allocates(self):
+        c_source = MetaClass.from_dict(self.class_name, self.data).generate_c()
+        with open("free.c", "w") as f:
+            f.write(c_source)
+        try:
+            subprocess.check_output([GCC_BINARY_PATH, "-Dprintf_s=printf", "-fsanitize=address", "free.c", "-o",
+                                     "free"])
+        except subprocess.CalledProcessError:
+            self.skipTest("gcc cannot build with the address sanitizer")
+        # The leak checker makes the program fail if anything allocated is never freed
+        output = subprocess.check_output([os.path.abspath("free")], stderr=subprocess.STDOUT).decode()
+        self.assertTrue(output.endswith('"owner":{"id":1}}'), output)
+
+    def test_generated_functions(self):
+        c_source = MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(c_arena=True)).generate_c()
+        for line in ("void Hero_arena_init(HeroArena * arena, size_t block_size) {",
+                     "void Hero_arena_reset(HeroArena * arena) {", "void Hero_arena_free(HeroArena * arena) {",
+                     "Friend* Friend_new_in(HeroArena * arena, char nick[]) {", "Owner Owner_make(int id) {",
+                     "    Hero * hero = Hero_new_in(&arena, \"Molecule Man\", 29, "
+                     "(Friend[]) {Friend_make(\"Jane\")}, 1, Owner_make(1));"):
+            self.assertIn(line + "\n", c_source)
+        # Structs built in the arena are only freed with it
+        self.assertNotIn("Hero_free(hero)", c_source)
+
+    def test_c_builds_records_in_a_few_blocks(self):
+        c_source = MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(c_arena=True)).generate_c()
+        with open("arena.c", "w") as f:
+            f.write(c_source.replace("    Hero_arena_free(&arena);", """\
+    Hero_free(Hero_new("Name", 1, NULL, 0, hero->owner));
+    for (int round = 0; round < 3; round++) {
+        Hero_arena_reset(&arena);
+        for (int i = 0; i < 100000; i++) {
+            Hero_new_in(&arena, "Name", i, NULL, 0, Owner_make(i));
+        }
+        int blocks = 0;
+        for (HeroArenaBlock * block = arena.blocks; block != NULL; block = block->next) {
+            blocks++;
+        }
+        printf(" %d", blocks);
+    }
+    Hero_arena_free(&arena);"""))
+        subprocess.check_output([GCC_BINARY_PATH, "-Dprintf_s=printf", "arena.c", "-o", "arena"])
+        output = subprocess.check_output([os.path.abspath("arena")]).decode()
+        # 100000 records of 40 bytes holding their owners, 48 once aligned, in blocks of 64KB, and no more after each
+        # reset
+        self.assertTrue(output.endswith(" 74 74 74"), output)
+
+    def test_c_constructors_fail_when_allocation_does(self):
+        c_source = MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(c_arena=True)).generate_c()
+        for allocation in ("malloc(sizeof(Hero))", "Hero_arena_alloc(arena, sizeof(Hero))"):
+            self.assertIn(f"    Hero* p = {allocation};\n    if (p == NULL) {{\n        return NULL;\n    }}\n",
+                          c_source)
+        with open("arena.c", "w") as f:
+            f.write(c_source.replace("    Hero_arena_free(&arena);", """\
+    // No block this size can be allocated
+    HeroArena huge;
+    Hero_arena_init(&huge, (size_t) 1 << 62);
+    printf(" %d", Hero_new_in(&huge, "Name", 1, NULL, 0, hero->owner) == NULL);
+    Hero_arena_free(&arena);"""))
+        subprocess.check_output([GCC_BINARY_PATH, "-Dprintf_s=printf", "arena.c", "-o", "arena"])
+        output = subprocess.check_output([os.path.abspath("arena")]).decode()
+        self.assertTrue(output.endswith(" 1"), output)
+
+
+class TestCParser(TestCase):
+    class_name = "Hero"
+    data = {"name": "Molecule Man", "age": 29, "active": True, "powers": ["Radiation resistance", "Turning tiny"],
+            "friends": [{"nick": "Jane", "tags": [1, 2]}], "owner": {"id": 1}}
+
+    def tearDown(self):
+        for fp in ("parser.c", "parser"):
+            if os.path.exists(fp):
+                os.remove(fp)
+
+    def compile_and_run(self, c_source: str) -> str:
+        with open("parser.c", "w") as f:
+            f.write(c_source)
+        subprocess.check_output([GCC_BINARY_PATH, "-Dprintf_s=printf", "parser.c", "-o", "parser"])
+        return subprocess.check_output([os.path.abspath("parser")]).decode()
+
+    def test_generated_functions(self):
+        meta_class = MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(c_parser=True))
+        c_source = meta_class.generate_c()
+        for line in ("struct HeroStringView {", "int Hero_json_skip_value(HeroJsonParser * parser) {",
+                     "int Friend_parse_json_object(HeroJsonParser * parser, Friend * out) {",
+                     "int Hero_from_json(const char * json, size_t length, Hero * out) {",
+                     "    HeroStringView name;", "    HeroStringView powers[2];",
+                     "        if (key.length == 4 && memcmp(key.data, \"name\", 4) == 0) {"):
+            self.assertIn(line + "\n", c_source)
+
+    def test_c_round_trip(self):
+        meta_class = MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(c_parser=True))
+        c_source = meta_class.generate_c()
+        printed, parsed = self.compile_and_run(c_source).split("\n")
+        self.assertEqual(printed, parsed)
+        self.assertIn('"name":"Molecule Man"', parsed)
+
+    def test_c_skips_unknown_fields_and_rejects_invalid_json(self):
+        meta_class = MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(c_parser=True))
+        c_source = meta_class.generate_c()
+        head, _, tail = c_source.rpartition("    return 0;\n}")
+        c_source = head + """\
+    const char * inputs[] = {
+        "{\\"extra\\": {\\"a\\": [1, \\"]\\"]}, \\"owner\\": {\\"id\\": 7}, \\"name\\": \\"Hi\\"}",
+        "{\\"name\\": \\"Hi\\"",
+        "{\\"age\\": \\"29\\"}",
+        "{} []",
+    };
+    for (int i = 0; i < 4; i++) {
+        Hero hero;
+        int result = Hero_from_json(inputs[i], strlen(inputs[i]), &hero);
+        printf("\\n%d %d %d", result, hero.owner.id, hero.name.data == inputs[i] + strlen(inputs[i]) - 4);
+    }
+    return 0;
+}""" + tail
+        output = self.compile_and_run(c_source).split("\n")[2:]
+        # The view of the name points into the input instead of a copy of it
+        self.assertEqual("0 7 1", output[0])
+        self.assertEqual(["-1", "-1", "-1"], [line.split()[0] for line in output[1:]])
+
+    def test_c_rejects_integers_which_do_not_fit(self):
+        data = {"small": 1, "negative": -1, "count": 2**40}
+        context = GenerationContext(c_parser=True, compact_numbers=True)
+        c_source = MetaClass.from_dict("Numbers", data, context=context).generate_c()
+        for line in ("    uint8_t small;", "    int8_t negative;", "    uint64_t count;"):
+            self.assertIn(line + "\n", c_source)
+        inputs = ['{"small": 255, "negative": -128, "count": 18446744073709551615}', '{"small": -0, "negative": 0}',
+                  '{"small": 256}', '{"small": -1}', '{"negative": -129}', '{"negative": 128}',
+                  '{"count": 18446744073709551616}', '{"count": 99999999999999999999}', '{"small": 012}']
+        head, _, tail = c_source.rpartition("    return 0;\n}")
+        c_source = head + f"""\
+    const char * inputs[] = {{{", ".join(json.dumps(input) for input in inputs)}}};
+    for (int i = 0; i < {len(inputs)}; i++) {{
+        Numbers numbers;
+        int result = Numbers_from_json(inputs[i], strlen(inputs[i]), &numbers);
+        printf("\\n%d %d %d %llu", result, numbers.small, numbers.negative, (unsigned long long) numbers.count);
+    }}
+    return 0;
+}}""" + tail
+        output = self.compile_and_run(c_source).split("\n")[2:]
+        self.assertEqual(["0 255 -128 18446744073709551615", "0 0 0 0"], output[:2])
+        # Rather than wrapping around into the narrower fields, or reading the invalid leading zero
+        self.assertEqual(["-1"] * 7, [line.split()[0] for line in output[2:]])
+
+    def test_c_checks_skipped_values_and_numbers_are_valid(self):
+        c_source = MetaClass.from_dict("Score", {"score": 1.5}, context=GenerationContext(c_parser=True)).generate_c()
+        valid = ['{"extra": [true, false, null, -1.5e3, 0, {"a": {}}, [], "\\u00e9\\""], "score": 2.5E+1}',
+                 '{"extra": {"a": [1, "]}"], "b": {"c": [[]]}}, "score": -0.5}',
+                 '{"extra": ' + "[" * 100 + "]" * 100 + '}']
+        invalid = ['{"extra": tru}', '{"extra": nul}', '{"extra": 1x}', '{"extra": +1}', '{"extra": .5}',
+                   '{"extra": 01}', '{"extra": 1.}', '{"extra": 1e}', '{"extra": [1}', '{"extra": {"a": 1]}',
+                   '{"extra": {"a"}}', '{"extra": {1: 2}}', '{"extra": [1,]}', '{"extra": [1 2]}',
+                   '{"extra": "\\q"}', '{"extra": "\\u12"}', '{"extra": "\n"}', '{"extra": "\\',
+                   '{"extra": ' + "[" * 200 + "]" * 200 + '}', '{"score": 1.}', '{"score": +1}', '{"score": 0x1}']
+        head, _, tail = c_source.rpartition("    return 0;\n}")
+        c_source = head + f"""\
+    const char * inputs[] = {{{", ".join(json.dumps(input) for input in valid + invalid)}}};
+    for (int i = 0; i < {len(valid + invalid)}; i++) {{
+        Score score;
+        int result = Score_from_json(inputs[i], strlen(inputs[i]), &score);
+        printf("\\n%d %g", result, score.score);
+    }}
+    return 0;
+}}""" + tail
+        output = self.compile_and_run(c_source).split("\n")[2:]
+        self.assertEqual(["0 25", "0 -0.5", "0 0"], output[:len(valid)])
+        self.assertEqual(["-1"] * len(invalid), [line.split()[0] for line in output[len(valid):]])
+
+    def test_c_reports_values_which_do_not_fit(self):
+        data = {"powers": ["Radiation resistance", "Turning tiny"], "grid": [[1, 2], [3]]}
+        c_source = MetaClass.from_dict(self.class_name, data, context=GenerationContext(c_parser=True)).generate_c()
+        self.assertIn("    HeroStringView powers[2];\n", c_source)
+        inputs = ['{"powers": ["a", "b"], "grid": []}', '{"powers": ["a", "b", "c"]}', '{"grid": [[1, 2], [3]]}',
+                  '{"grid": [[1], ]}']
+        head, _, tail = c_source.rpartition("    return 0;\n}")
+        c_source = head + f"""\
+    const char * inputs[] = {{{", ".join(json.dumps(input) for input in inputs)}}};
+    for (int i = 0; i < {len(inputs)}; i++) {{
+        Hero hero;
+        int result = Hero_from_json(inputs[i], strlen(inputs[i]), &hero);
+        printf("\\n%d %zu %zu", result, hero.powers_count, hero.grid_count);
+    }}
+    return 0;
+}}""" + tail
+        output = self.compile_and_run(c_source).split("\n")[2:]
+        # Valid JSON the struct cannot hold all of is read as far as it fits, but not reported as success
+        self.assertEqual(["0 2 0", "1 2 0", "1 0 0"], output[:3])
+        self.assertEqual("-1", output[3].split()[0])
+
+
+class TestCJsonWriter(TestCase):
+    class_name = "Hero"
+    data = {"name": "Molecule \"Man\"\n\u00e9", "age": -29, "score": 0.1, "active": True,
+            "powers": ["Radiation resistance", "Turning tiny"], "friends": [{"nick": "Jane", "tags": [1, 2]}],
+            "owner": {"id": 4000000000}}
+
+    def tearDown(self):
+        for fp in ("writer.c", "writer"):
+            if os.path.exists(fp):
+                os.remove(fp)
+
+    def compile_and_run(self, c_source: str) -> str:
+        with open("writer.c", "w") as f:
+            f.write(c_source)
+        subprocess.check_output([GCC_BINARY_PATH, "writer.c", "-o", "writer"])
+        return subprocess.check_output([os.path.abspath("writer")]).decode()
+
+    def test_generated_functions(self):
+        c_source = MetaClass.from_dict(self.class_name, self.data).generate_c()
+        self.assertNotIn("printf_s", c_source)
+        for line in ("void Hero_json_write_string(HeroJsonWriter * writer, const char * data, size_t length) {",
+                     "void Friend_write_json(HeroJsonWriter * writer, const Friend * p) {",
+                     "size_t Hero_to_json(const Hero * p, char * buffer, size_t capacity) {",
+                     '    Hero_json_write(writer, ",\\"age\\":", 7);', "    Owner_write_json(writer, &p->owner);",
+                     "    Hero_to_json(hero, buffer, sizeof(buffer));"):
+            self.assertIn(line + "\n", c_source)
+
+    def test_c_writes_the_example_as_json(self):
+        context = GenerationContext(inline_arrays=True, compact_numbers=True)
+        c_source = MetaClass.from_dict(self.class_name, self.data, context=context).generate_c()
+        self.assertEqual(self.data, json.loads(self.compile_and_run(c_source)))
+
+    def test_c_writes_arrays_behind_pointers(self):
+        data = {**self.data, "matrix": [[1, 2], [3]], "cube": [[["a"], ["b", "c"]]]}
+        c_source = MetaClass.from_dict(self.class_name, data).generate_c()
+        self.assertIn("struct HeroCubeItemItem {\n    size_t count;\n    char * * items;\n};\n", c_source)
+        self.assertEqual(data, json.loads(self.compile_and_run(c_source)))
+
+    def test_c_parsed_json_is_written_back_as_it_was(self):
+        meta_class = MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(c_parser=True))
+        c_source = meta_class.generate_c()
+        written, parsed = self.compile_and_run(c_source).split("\n")
+        self.assertEqual(written, parsed)
+        self.assertEqual(self.data["name"], json.loads(parsed)["name"])
+
+    def test_c_returns_the_length_needed(self):
+        context = GenerationContext(inline_arrays=True)
+        c_source = MetaClass.from_dict(self.class_name, self.data, context=context).generate_c()
+        output = self.compile_and_run(c_source.replace("    Hero_free(hero);", """\
+    char small[8];
+    size_t length = Hero_to_json(hero, small, sizeof(small));
+    printf("\\n%s %d", small, length == Hero_to_json(hero, NULL, 0) && length == strlen(buffer));
+    Hero_free(hero);"""))
+        self.assertEqual('{"name" 1', output.split("\n")[1])
+
+
+class TestGoJson(TestCase):
+    class_name = "Hero"
+    data = {"name": "Molecule \"Man\"\né\U0001F600", "age": -29, "score": -1.5e-9, "active": True,
+            "powers": ["Radiation resistance", "Turning tiny"], "friends": [{"nick": "Jane", "tags": [1, 2]}],
+            "owner": {"id": 1}, "matrix": [[1, 2], [3]]}
+    files = ("go_json.go", "go_json_test.go", "go_json_extra_test.go")
+
+    def tearDown(self):
+        for fp in self.files:
+            if os.path.exists(fp):
+                os.remove(fp)
+
+    def meta_class(self, **kwargs) -> MetaClass:
+        return MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(go_json=True, **kwargs))
+
+    def go_test(self, meta_class: MetaClass, extra_test: str = "") -> str:
+        sources = (meta_class.generate_go(), meta_class.generate_go_test(), f"package main\n\n{extra_test}")
+        for fp, source in zip(self.files, sources):
+            with open(fp, "w") as f:
+                f.write(source)
+        return subprocess.check_output([GO_BINARY_PATH, "test", "-bench", ".", "-benchtime", "1x", *self.files],
+                                       stderr=subprocess.STDOUT).decode()
+
+    def test_generated_methods(self):
+        go_source = self.meta_class().generate_go()
+        for line in ("func (x Hero) MarshalJSON() ([]byte, error) {",
+                     "func (x *Friend) UnmarshalJSON(data []byte) error {",
+                     "func heroAppendJSONString(buf []byte, s string) []byte {",
+                     '    buf = append(buf, ",\\"age\\":"...)', "    buf = x.Owner.appendJSON(buf)",
+                     "        x.Matrix[len(x.Matrix)-1] = append(x.Matrix[len(x.Matrix)-1], *new(int))"):
+            self.assertIn(line + "\n", go_source)
+
+    def test_go_matches_encoding_json(self):
+        for kwargs in ({}, {"compact_numbers": True, "minimize_padding": True}):
+            output = self.go_test(self.meta_class(**kwargs))
+            self.assertIn("BenchmarkHeroUnmarshalEncodingJSON", output)
+            self.assertIn("PASS", output)
+
+    def test_go_skips_unknown_fields_and_rejects_invalid_json(self):
+        self.go_test(self.meta_class(), """\
+import "testing"
+
+func TestReader(t *testing.T) {
+    var hero Hero
+    valid := `{"extra": {"a": [1, "]"]}, "owner": {"id": 7}, "name": "\\u00e9\\ud83d\\ude00", "age": null}`
+    if err := hero.UnmarshalJSON([]byte(valid)); err != nil || hero.Owner.Id != 7 || hero.Name != "é\U0001F600" {
+        t.Errorf("%v %v", hero, err)
+    }
+    for _, invalid := range []string{`{"name": "Hi"`, `{"age": "29"}`, `{"age": 1.5}`, `{} []`} {
+        if err := hero.UnmarshalJSON([]byte(invalid)); err == nil {
+            t.Errorf("%s was read", invalid)
+        }
+    }
+}
+""")
+
+
+class TestJavaJson(TestCase):
+    class_name = "Hero"
+    data = {"name": "Molecule \"Man\"\n\u00e9\U0001F600", "age": -29, "score": -1.5e-9, "active": True,
+            "powers": ["Radiation resistance", "Turning tiny"], "friends": [{"nick": "Jane", "tags": [1, 2]}],
+            "owner": {"id": 1}, "matrix": [[1, 2], [3]], "ratios": [0.5, 2.0]}
+    directory = "java_json"
+
+    def tearDown(self):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+    def meta_class(self, **kwargs) -> MetaClass:
+        return MetaClass.from_dict(self.class_name, self.data, context=GenerationContext(java_json=True, **kwargs))
+
+    def test_generated_methods(self):
+        java_source = self.meta_class().generate_java()
+        for line in ("    public static Hero fromJson(Reader reader) throws IOException {",
+                     "    static Friend readJson(HeroJson json) throws IOException {",
+                     "    public void toJson(Appendable out) throws IOException {",
+                     "final class HeroJson {",
+                     '        out.append(",\\"age\\":");',
+                     "                        value.owner = Owner.readJson(json);",
+                     # Primitive arrays are read into arrays of primitives, never boxed
+                     "                            double[] items0 = new double[2];",
+                     "                                        int[] items1 = new int[2];",
+                     "        benchmarkJson(hero);"):
+            self.assertIn(line + "\n", java_source)
+        self.assertNotIn("Integer[]", java_source)
+        self.assertNotIn("Double[]", java_source)
+
+    def test_optional_fields_are_left_out_when_null(self):
+        lines = ['{"id": 1, "tag": "a"}', '{"id": 2}']
+        meta_class = MetaClass.from_jsonl("Record", lines, context=GenerationContext(java_json=True))
+        java_source = meta_class.generate_java()
+        self.assertIn('        if (this.tag != null) {\n'
+                      '            out.append(separator).append("\\"tag\\":");\n', java_source)
+        self.assertIn('        out.append(separator).append("\\"id\\":");\n', java_source)
+
+    @skipUnless(shutil.which(JAVAC_BINARY_PATH) and shutil.which(JAVA_BINARY_PATH), "needs a JDK")
+    def test_java_reads_and_writes_json(self):
+        os.makedirs(self.directory, exist_ok=True)
+        java_file_name = os.path.join(self.directory, f"{self.class_name}.java")
+        for kwargs in ({}, {"compact_numbers": True}):
+            with open(java_file_name, "w", encoding="utf-8") as f:
+                f.write(self.meta_class(**kwargs).generate_java())
+            subprocess.check_output([JAVAC_BINARY_PATH, "-encoding", "UTF-8", java_file_name])
+            output = subprocess.check_output([JAVA_BINARY_PATH, "-Dfile.encoding=UTF-8", "-Dstdout.encoding=UTF-8",
+                                              "-cp", self.directory, self.class_name]).decode()
+            lines = output.splitlines()
+            # main writes the example as JSON, then how many times a second it was read and written
+            self.assertEqual(self.data, json.loads(lines[-3]))
+            self.assertRegex(lines[-2], r"^fromJson: [1-9][0-9]* records/sec$")
+            self.assertRegex(lines[-1], r"^toJson: [1-9][0-9]* records/sec$")
+
+
+class TestPythonSlots(TestCase):
+    data = {"name": "Molecule Man", "age": 29, "class": "Hero", "powers": ["Radiation resistance"],
+            "friends": [{"nick": "Jane", "tags": [1, 2]}], "owner": {"id": 1}, "empty": {}}
+
+    def python_module(self, meta_class: MetaClass, **kwargs):
+        module = module_from_spec(spec_from_loader("slots", loader=None))
+        exec(meta_class.generate_python(GenerationContext(**kwargs)), module.__dict__)
+        return module
+
+    def test_every_class_has_slots(self):
+        module = self.python_module(MetaClass.from_dict("Hero", self.data), python_slots=True)
+        for name, fields in (("Hero", ('name', 'age', 'class_field', 'powers', 'friends', 'owner', 'empty')),
+                             ("Friend", ('nick', 'tags')), ("Owner", ('id_field',)), ("Empty", ())):
+            self.assertEqual(fields, getattr(module, name).__slots__)
+        hero = module.Hero.from_dict(self.data)
+        self.assertFalse(hasattr(hero, "__dict__"))
+        self.assertFalse(hasattr(hero.friends[0], "__dict__"))
+        self.assertEqual(self.data, hero.to_dict())
+        self.assertEqual(self.data, json.loads(hero.to_json()))
+        self.assertTrue(repr(hero).startswith("Hero(name='Molecule Man', age=29, class_field='Hero'"))
+        module.main()
+
+    def test_misspelled_attributes_are_rejected(self):
+        for kwargs in ({}, {"python_lazy": True}):
+            module = self.python_module(MetaClass.from_dict("Hero", self.data), python_slots=True, **kwargs)
+            hero = module.Hero.from_dict(self.data)
+            hero.age = 30
+            # Without slots the value would silently go into a new attribute, leaving age unchanged
+            with self.assertRaises(AttributeError):
+                hero.aeg = 31
+            self.assertEqual({**self.data, "age": 30}, hero.to_dict())
+
+    def test_slots_take_less_memory(self):
+        records = [{"id": i, "name": f"user{i}", "score": i / 3, "address": {"zip": i}} for i in range(2000)]
+        self.assertLess(python_instance_bytes(records, slots=True), python_instance_bytes(records, slots=False))
+
+
+class TestPythonColumns(TestCase):
+    records = [{"id": 1, "delta": -5, "big": 2**40, "huge": 2**70, "score": 0.5, "name": "a", "active": True,
+                "owner": {"id": 300}, "tags": [1]},
+               {"id": 200, "delta": 70000, "big": 0, "huge": 0, "score": 2, "name": "b", "active": False,
+                "owner": {"id": 3}, "tags": [2, 3], "note": "optional"}]
+
+    def python_module(self, **kwargs):
+        meta_class = MetaClass.from_jsonl("Record", [json.dumps(record) for record in self.records],
+                                          context=GenerationContext(enum_limit=1))
+        module = module_from_spec(spec_from_loader("columns", loader=None))
+        exec(meta_class.generate_python(GenerationContext(python_columns=True, **kwargs)), module.__dict__)
+        return module
+
+    def test_numbers_are_held_in_arrays_of_the_narrowest_type(self):
+        columns = self.python_module().RecordColumns.from_records(self.records)
+        for field, typecode in (("id_field", "B"), ("delta", "i"), ("big", "Q"), ("score", "d")):
+            self.assertIsInstance(getattr(columns, field), array.array)
+            self.assertEqual(typecode, getattr(columns, field).typecode)
+        # Too large for any array, optional, or not numbers
+        for field in ("huge", "note", "name", "active", "owner", "tags"):
+            self.assertIsInstance(getattr(columns, field), list)
+        self.assertEqual("H", self.python_module().OwnerColumns.from_records([{"id": 300}]).id_field.typecode)
+        self.assertEqual(1, memoryview(columns.id_field).itemsize)
+
+    def test_rows_and_records(self):
+        for kwargs in ({}, {"python_slots": True}):
+            module = self.python_module(**kwargs)
+            columns = module.RecordColumns.from_records(iter(self.records))
+            self.assertEqual(2, len(columns))
+            self.assertEqual(self.records, columns.to_records())
+            row = columns[-1]
+            self.assertEqual((200, "optional", "b", 3), (row.id_field, row.note, row.name, row.owner.id_field))
+            self.assertEqual(self.records[1], json.loads(row.to_json()))
+            self.assertTrue(repr(row).startswith("RecordRow(id_field=200, delta=70000"))
+            self.assertEqual([1, 200], [row.id_field for row in columns])
+            with self.assertRaises(IndexError):
+                columns[2]
+            self.assertEqual(0, len(module.RecordColumns.from_records([])))
+            module.main()
+
+    def test_numbers_outside_the_types_seen_are_rejected(self):
+        module = self.python_module()
+        # Numbers are never wrapped or cut to fit the typecode picked from the records seen when generating
+        for id_field in (256, -1):
+            with self.assertRaises(OverflowError):
+                module.RecordColumns.from_records([{**self.records[0], "id": id_field}])
+        with self.assertRaises(OverflowError):
+            module.RecordColumns.from_records([{**self.records[0], "big": 2**64}])
+        # Columns held in lists take any value
+        record = {**self.records[0], "huge": 2**100}
+        self.assertEqual([record], module.RecordColumns.from_records([record]).to_records())
+
+
+class TestPythonLazy(TestCase):
+    records = [{"name": "Molecule Man", "owner": {"id": 1}, "friends": [{"nick": "Jane"}], "tags": [1, 2],
+                "matrix": [[1], [2, 3]]},
+               {"name": "Madame Uppercut", "owner": {"id": 2}, "friends": [{"nick": "Ace"}], "tags": [3],
+                "matrix": [[4]], "sidekick": {"nick": "Kid"}}]
+
+    def python_module(self, **kwargs):
+        meta_class = MetaClass.from_jsonl("Hero", [json.dumps(record) for record in self.records[::-1]])
+        module = module_from_spec(spec_from_loader("lazy", loader=None))
+        exec(meta_class.generate_python(GenerationContext(python_lazy=True, **kwargs)), module.__dict__)
+        return module
+
+    def test_nested_values_are_built_on_first_access(self):
+        for kwargs in ({}, {"python_slots": True}, {"python_columns": True}):
+            module = self.python_module(**kwargs)
+            for record in self.records:
+                hero = module.Hero.from_dict(record)
+                self.assertIs(module._NOT_BUILT, hero._owner_value)
+                self.assertEqual(record["name"], hero.name)
+                # Values never read are the raw values themselves
+                self.assertIs(record["owner"], hero.to_dict()["owner"])
+                self.assertIs(record["friends"], hero.to_dict()["friends"])
+                self.assertEqual(record, hero.to_dict())
+                owner = hero.owner
+                self.assertIsInstance(owner, module.Owner)
+                self.assertIs(owner, hero.owner)
+                self.assertEqual(record["owner"], hero.to_dict()["owner"])
+                self.assertEqual(record, json.loads(hero.to_json()))
+            module.main()
+
+    def test_changes_to_built_values_are_written(self):
+        module = self.python_module()
+        record = json.loads(json.dumps(self.records[1]))
+        hero = module.Hero.from_dict(record)
+        hero.owner.id_field = 9
+        hero.friends.append(module.Friend(nick="Kid"))
+        hero.sidekick.nick = "Ace"
+        expected = {**self.records[1], "owner": {"id": 9}, "friends": [{"nick": "Ace"}, {"nick": "Kid"}],
+                    "sidekick": {"nick": "Ace"}}
+        self.assertEqual(expected, hero.to_dict())
+        # Building objects and lists of objects never changes the dict they were read from
+        self.assertEqual(self.records[1], record)
+
+    def test_optional_nested_values(self):
+        module = self.python_module()
+        self.assertIsNone(module.Hero.from_dict(self.records[0]).sidekick)
+        self.assertNotIn("sidekick", module.Hero.from_dict(self.records[0]).to_dict())
+        hero = module.Hero.from_dict(self.records[1])
+        self.assertEqual("Kid", hero.sidekick.nick)
+        hero.sidekick = None
+        self.assertNotIn("sidekick", hero.to_dict())
+
+    def test_setters_and_constructor(self):
+        module = self.python_module()
+        hero = module.Hero.from_dict(self.records[0])
+        hero.owner = module.Owner(id_field=7)
+        self.assertEqual({"id": 7}, hero.to_dict()["owner"])
+        hero = module.Hero(name="A", owner=module.Owner(id_field=3), friends=[], tags=[], matrix=[], sidekick=None)
+        self.assertEqual({"name": "A", "owner": {"id": 3}, "friends": [], "tags": [], "matrix": []}, hero.to_dict())
+        self.assertTrue(repr(hero).startswith("Hero(name='A', owner=Owner(id_field=3)"))
+
+    def test_values_are_built_from_the_given_source(self):
+        fields = MetaClass.from_dict("Hero", self.records[1]).fields
+        self.assertEqual("Owner.from_dict(d['owner'])", fields["owner"].to_python_from_dict_value())
+        self.assertEqual("Owner.from_dict(self._raw['owner'])",
+                         fields["owner"].to_python_from_dict_value("self._raw['owner']"))
+        self.assertEqual("[Friend.from_dict(o) for o in raw]", fields["friends"].to_python_from_dict_value("raw"))
+        self.assertEqual("[o for o in raw]", fields["matrix"].to_python_from_dict_value("raw"))
+
+
+class TestBuildPythonModule(TestCase):
+    records = [{"name": "Molecule Man", "age": 29, "powers": ["Radiation blast"], "team": {"id": 1, "hq": "Tower"}},
+               {"name": "Eternal Flame", "age": 1000, "powers": ["Immortality", "Heat"],
+                "team": {"id": 2, "hq": "Sun"}}]
+
+    def setUp(self):
+        clear_memory_cache()
+
+    def test_module_holds_the_classes(self):
+        module = MetaClass.from_dict("Hero", self.records[0]).build_python_module()
+        self.assertNotIn("main", module.__dict__)
+        for record in self.records:
+            self.assertEqual(record, module.Hero.from_dict(record).to_dict())
+        module = MetaClass.from_dict("Hero", self.records[0]).build_python_module(GenerationContext(python_slots=True))
+        self.assertFalse(hasattr(module.Hero.from_dict(self.records[0]), "__dict__"))
+
+    def test_same_schema_is_not_generated_again(self):
+        first = MetaClass.from_dict("Hero", self.records[0])
+        first.build_python_module()
+        # The examples are not part of the fingerprint, only the schema
+        second = MetaClass.from_dict("Hero", self.records[1])
+        self.assertEqual(python_fingerprint(first, first.context), python_fingerprint(second, second.context))
+        # Unless columns store the integers in arrays sized for them
+        columns = GenerationContext(python_columns=True)
+        self.assertNotEqual(python_fingerprint(first, columns), python_fingerprint(second, columns))
+        with mock.patch.object(MetaClass, "generate_python", side_effect=AssertionError) as generate_python:
+            module = second.build_python_module()
+        generate_python.assert_not_called()
+        self.assertEqual(self.records[1], module.Hero.from_dict(self.records[1]).to_dict())
+        # Every build is a new module, so classes are never shared between them
+        self.assertIsNot(module.Hero, second.build_python_module().Hero)
+
+    def test_different_schemas_have_different_fingerprints(self):
+        meta_class = MetaClass.from_dict("Hero", self.records[0])
+        fingerprint = python_fingerprint(meta_class, meta_class.context)
+        for other in (MetaClass.from_dict("Villain", self.records[0]),
+                      MetaClass.from_dict("Hero", {**self.records[0], "age": 1.5}),
+                      MetaClass.from_dict("Hero", {**self.records[0], "team": {"id": 1}}),
+                      MetaClass.from_jsonl("Hero", [json.dumps(record) for record in self.records[:1] + [{}]])):
+            self.assertNotEqual(fingerprint, python_fingerprint(other, other.context))
+        self.assertNotEqual(fingerprint, python_fingerprint(meta_class, GenerationContext(python_lazy=True)))
+        with mock.patch("constructor.runtime.PYTHON_GENERATOR_VERSION", -1):
+            self.assertNotEqual(fingerprint, python_fingerprint(meta_class, meta_class.context))
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            MetaClass.from_dict("Hero", self.records[0]).build_python_module(cache_dir=cache_dir)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            self.assertTrue(os.listdir(cache_dir)[0].endswith(".marshal"))
+            # As if the process was restarted
+            clear_memory_cache()
+            with mock.patch.object(MetaClass, "generate_python", side_effect=AssertionError):
+                module = MetaClass.from_dict("Hero", self.records[1]).build_python_module(cache_dir=cache_dir)
+            self.assertEqual(self.records[1], module.Hero.from_dict(self.records[1]).to_dict())
+
+    def test_unreadable_disk_cache_is_replaced(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            meta_class = MetaClass.from_dict("Hero", self.records[0])
+            fingerprint = python_fingerprint(meta_class, GenerationContext(python_main=False))
+            path = os.path.join(cache_dir, fingerprint + ".marshal")
+            with open(path, "wb") as f:
+                f.write(b"not marshalled code")
+            module = meta_class.build_python_module(cache_dir=cache_dir)
+            self.assertEqual(self.records[0], module.Hero.from_dict(self.records[0]).to_dict())
+            with open(path, "rb") as f:
+                self.assertNotEqual(b"not marshalled code", f.read())
+
+    def test_memory_cache_drops_least_recently_used(self):
+        hero, villain = MetaClass.from_dict("Hero", self.records[0]), MetaClass.from_dict("Villain", self.records[0])
+        with mock.patch("constructor.runtime.MEMORY_CACHE_SIZE", 1):
+            hero.build_python_module()
+            villain.build_python_module()
+            with mock.patch.object(MetaClass, "generate_python", side_effect=AssertionError):
+                villain.build_python_module()
+                with self.assertRaises(AssertionError):
+                    hero.build_python_module()
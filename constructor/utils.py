@@ -1,20 +1,18 @@
 import keyword
-from typing import Union
+from functools import lru_cache
+from typing import Union, Iterable, Iterator, TextIO, Optional, Tuple
 
 from inflection import singularize
 
 from constructor import field_types
+from constructor.context import GenerationContext
+from constructor.statistics import utf8_length
 
-UNIQUE_CLASSNAMES = set()
-CLASS_SIGNATURES_TO_NAME = dict()
 
-
-def cleanup():
-    from constructor.main import PRINTED_SIGNATURES
-
-    UNIQUE_CLASSNAMES.clear()
-    CLASS_SIGNATURES_TO_NAME.clear()
-    PRINTED_SIGNATURES.clear()
+# singularize runs through dozens of regular expressions, and the same field names come up over and over again
+@lru_cache(maxsize=4096)
+def singular(word: str) -> str:
+    return singularize(word)
 
 
 def any_to_upper_camel(name: str) -> str:
@@ -52,10 +50,61 @@ def indent(i: int) -> str:
     return ' ' * i * 4
 
 
-def primitive_to_type(primitive: Union[str, bool, int, list, dict], field_name: str) -> field_types.Type:
+def struct_layout(layouts: Iterable[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Return the size and alignment of a struct with fields of the given sizes and alignments, in order, including the
+    padding needed to align each field and the end of the struct
+    """
+    size, alignment = 0, 1
+    for field_size, field_alignment in layouts:
+        size += -size % field_alignment + field_size
+        alignment = max(alignment, field_alignment)
+    return size + -size % alignment, alignment
+
+
+def pad_lines(lines: Iterable[str], before: bool = False, after: bool = False) -> Iterator[str]:
+    """
+    Yield the given lines surrounded by blank lines, or nothing at all if there are no lines
+    """
+    empty = True
+    for line in lines:
+        if empty and before:
+            yield ''
+        empty = False
+        yield line
+    if not empty and after:
+        yield ''
+
+
+def write_lines(fp: TextIO, lines: Iterable[str]):
+    """
+    Write lines to a text stream one at a time, equivalent to fp.write('\\n'.join(lines))
+    """
+    for i, line in enumerate(lines):
+        if i:
+            fp.write('\n')
+        fp.write(line)
+
+
+def primitive_to_type(primitive: Union[str, bool, int, list, dict], field_name: str,
+                      context: GenerationContext) -> field_types.Type:
+    t = infer_primitive_type(primitive, field_name, context)
+    if isinstance(t, field_types.Array):
+        t.statistics.add_length(len(primitive))
+    elif not isinstance(t, field_types.Object):
+        t.statistics.add(primitive)
+        if context.enum_limit and isinstance(t, field_types.String):
+            t.track_values((primitive,), context.enum_limit)
+    if not context.retain_values.keeps_any:
+        t.value = None
+    return t
+
+
+def infer_primitive_type(primitive: Union[str, bool, int, list, dict], field_name: str,
+                         context: GenerationContext) -> field_types.Type:
     # Strings
     if isinstance(primitive, str):
-        return field_types.String(value=primitive, original_name=field_name, length=len(primitive))
+        return field_types.String(value=primitive, original_name=field_name, length=utf8_length(primitive))
 
     # Booleans
     if isinstance(primitive, bool):
@@ -73,52 +122,30 @@ def primitive_to_type(primitive: Union[str, bool, int, list, dict], field_name:
     if isinstance(primitive, list):
         if len(primitive) == 0:
             raise NotImplementedError("Empty lists are not supported.")
-        primitive_type = None
-        for subprimative in primitive:
-            subprimative_type = primitive_to_type(subprimative, field_name=field_name)
-            new_primitive_type = field_types.Array(value=primitive, original_name=field_name,
-                                                   item_type=subprimative_type, length=len(primitive))
-            if primitive_type is None:
-                primitive_type = new_primitive_type
-            else:
-                # TODO: Something less arbitrary than using Java to check
-                if new_primitive_type.to_java != primitive_type.to_java:
-                    raise NotImplementedError(f"Arrays cannot contain different types ("
-                                              f"{primitive_type.to_java} vs {new_primitive_type.to_java})")
-                # We want the maximum length seen for the array size
-                primitive_type.length = max(primitive_type.length, len(primitive))
-                if isinstance(subprimative_type, field_types.Integer):
-                    new_primitive_type.item_type.max_value = max(new_primitive_type.item_type.max_value,
-                                                                 subprimative_type.value)
-                    new_primitive_type.item_type.min_value = min(new_primitive_type.item_type.min_value,
-                                                                 subprimative_type.value)
-                elif isinstance(subprimative_type, field_types.Double):
-                    new_primitive_type.item_type.max_value = max(new_primitive_type.item_type.max_value,
-                                                                 subprimative_type.value)
-                    new_primitive_type.item_type.min_value = min(new_primitive_type.item_type.min_value,
-                                                                 subprimative_type.value)
-        return primitive_type
+        if context.retain_values.keeps_all:
+            item_type = merge_types(primitive_to_type(item, field_name=field_name, context=context)
+                                    for item in primitive)
+            return field_types.Array(value=primitive, original_name=field_name, item_type=item_type,
+                                     length=len(primitive))
+        # Only keep the values of a sample of the items
+        reservoir = context.retain_values.reservoir(context.random)
+        item_type = None
+        for item in primitive:
+            t = primitive_to_type(item, field_name=field_name, context=context)
+            reservoir.add(t.value)
+            item_type = t if item_type is None else item_type.merge(t)
+        return field_types.Array(value=reservoir.items, original_name=field_name, item_type=item_type,
+                                 length=len(primitive))
 
     # Objects
     if isinstance(primitive, dict):
         from constructor.main import MetaClass
 
-        field_name = singularize(field_name)
-        primitive_class = MetaClass.from_dict(field_name, primitive)
-        signature = primitive_class.get_name_and_field_signature()
-        if signature in CLASS_SIGNATURES_TO_NAME:
-            primitive_class.name = CLASS_SIGNATURES_TO_NAME[signature]
-        else:
-            if field_name not in UNIQUE_CLASSNAMES:
-                UNIQUE_CLASSNAMES.add(field_name)
-            else:
-                i = 2
-                while f"{field_name}{i}" in UNIQUE_CLASSNAMES:
-                    i += 1
-                primitive_class.name = f"{any_to_upper_camel(field_name)}{i}"
-                UNIQUE_CLASSNAMES.add(f"{field_name}{i}")
-            CLASS_SIGNATURES_TO_NAME[signature] = primitive_class.name
-        return field_types.Object(value=primitive, original_name=field_name, object_class=primitive_class)
+        # Classes are given unique names once the whole payload has been inferred
+        fields = MetaClass.infer_fields(primitive, skip_fields_with_errors=False, context=context)
+        primitive_class = MetaClass(singular(field_name), fields, context=context)
+        value = primitive if context.retain_values.keeps_all else {key: t.value for key, t in fields.items()}
+        return field_types.Object(value=value, original_name=field_name, object_class=primitive_class)
 
     # Other (None/null not yet supported)
     raise NotImplementedError(f"{primitive!r} (type={type(primitive)}) is not supported!")
@@ -157,3 +184,13 @@ def add_suffix_to_reserved_python_words(field_name: str, suffix: str) -> str:
     if keyword.iskeyword(field_name):
         return field_name + suffix
     return field_name
+
+
+def merge_types(types: Iterable[field_types.Type]) -> Optional[field_types.Type]:
+    """
+    Merge several samples of the same field into one type, or return None if there were no samples
+    """
+    merged = None
+    for t in types:
+        merged = t if merged is None else merged.merge(t)
+    return merged